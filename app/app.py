@@ -5,11 +5,34 @@ import plotly.express as px
 import io
 from datetime import datetime
 
+from data_store import PAGE_COLUMNS, period_labels
+from filters import apply_filters
+from segmentation import add_segments
+from olap_cube import query_overview, overview_from_rows
+from clv_engine import clv_distribution, clv_grid
+from profiling import stage
+from registry import source_version
+from products import TOP_K, product_leaderboards, products_from_rows, query_products
+from basket import basket_products, frequently_bought_together, top_rules
+from exports import EXPORT_FORMATS, build_export, export_filename, get_export
+from streaming import STREAMING
 from utils import (
-    load_data,
+    load_filter_index,
+    load_overview_cube,
+    load_product_cube,
+    load_basket,
+    load_basket_pairs,
+    exact_counts_toggle,
+    load_rfm,
+    load_customer_segments,
+    compute_customer_table,
+    load_customer_table,
+    load_stream_summary,
     compute_avg_purchase_frequency,
     compute_customer_lifespan,
-    calculate_clv,
+    RFM_PATH,
+    begin_profile,
+    end_profile,
 )
 
 # ------------------------------------------------
@@ -154,24 +177,27 @@ def tooltip(label, text):
     </span>
     """
 
-def compute_clv_safe(aov, freq, lifespan):
-    try:
-        return calculate_clv(aov, freq, lifespan)
-    except Exception:
-        return aov * freq * lifespan
-
-
 # ------------------------------------------------
-# EXPORT CSV
+# EXPORT DES DONNÉES FILTRÉES
 # ------------------------------------------------
-def export_filtered_csv(df_filtered):
-    csv_buffer = io.StringIO()
-    df_filtered.to_csv(csv_buffer, index=False, sep=";")
+def export_filtered_data(df_filtered, export_key):
+    """Export à la demande : le fichier n'est écrit (par blocs) qu'au clic sur « Préparer »,
+    puis gardé en cache tant que les filtres et les données ne changent pas"""
+    fmt = st.radio("Format", list(EXPORT_FORMATS), horizontal=True,
+                   format_func=lambda f: EXPORT_FORMATS[f]["label"])
+    data = get_export(export_key, fmt)
+    if data is None:
+        if not st.button(f"📦 Préparer l'export ({len(df_filtered):,} lignes)", key=f"prepare_export_{fmt}"):
+            return
+        with st.spinner("Écriture du fichier..."):
+            data = build_export(export_key, df_filtered, fmt)
+
     st.download_button(
-        label="📥 Export CSV (filtré)",
-        data=csv_buffer.getvalue(),
-        file_name=f"online_retail_export_{datetime.now().strftime('%Y-%m-%d')}.csv",
-        mime="text/csv"
+        label=f"📥 Télécharger ({len(data) / 1024 ** 2:,.1f} Mo)",
+        data=data,
+        file_name=export_filename("online_retail_export", fmt, datetime.now()),
+        mime=EXPORT_FORMATS[fmt]["mime"],
+        key=f"download_export_{fmt}",
     )
 
 # ------------------------------------------------
@@ -207,28 +233,18 @@ def show_dashboard():
         unsafe_allow_html=True,
     )
 
-    df = load_data()
-    if df.empty:
+    # Index de filtrage partagé : le frame trié par date n'est jamais modifié ici
+    # (Month / Quarter sont déjà des codes de périodes calculés au chargement)
+    filter_index = load_filter_index(PAGE_COLUMNS["overview"])
+    if filter_index is None:
         st.error("Impossible de charger les données.")
         return
+    df = filter_index["frame"]
 
-    # Dates
-    df["InvoiceDate"] = pd.to_datetime(df["InvoiceDate"])
-    df["Month"] = df["InvoiceDate"].dt.to_period("M").astype(str)
-    df["Quarter"] = df["InvoiceDate"].dt.to_period("Q").astype(str)
-
-    # Chargement RFM
-    df_rfm = pd.read_csv("data/processed/df_rfm_resultat.csv")
+    # Chargement RFM (registre partagé)
+    df_rfm = load_rfm()
 
-    def label_rfm(percent):
-        if percent >= 400: return "Champions"
-        elif percent >= 300: return "Fidèles"
-        elif percent >= 200: return "Potentiels"
-        elif percent >= 120: return "À Risque"
-        elif percent >= 100: return "Perdus"
-        else: return "Perdus"
-
-    df_rfm["RFM_Label"] = df_rfm["RFM_Pourcentage"].apply(label_rfm)
+    df_rfm = add_segments(df_rfm, segment_col="RFM_Label", priority_col=None)
 
     # ------------------------------------------------
     # 🎛 SIDEBAR — Tous les filtres
@@ -249,32 +265,46 @@ def show_dashboard():
         rfm_types = ["Tous"] + sorted(df_rfm["RFM_Label"].unique())
         rfm_choice = st.selectbox("Type de client (RFM)", rfm_types)
 
+    exact_counts = exact_counts_toggle()
+
     # ------------------------------------------------
     # Application des filtres
     # ------------------------------------------------
-    df_f = df[
-        (df["InvoiceDate"].dt.date >= start_date) &
-        (df["InvoiceDate"].dt.date <= end_date)
-    ].copy()
-
-    if country_choice != "Tous":
-        df_f = df_f[df_f["Country"] == country_choice]
-
-    df_f = df_f[(df_f["TotalPrice"] >= threshold) | (df_f["Quantity"] < 0)]
+    with stage("apply_filters"):
+        df_f = apply_filters(
+            filter_index,
+            start_date,
+            end_date,
+            country=country_choice,
+            threshold=threshold,
+            returns_mode=returns_mode,
+            segment=rfm_choice,
+        )
 
     if returns_mode == "Exclure":
-        df_f = df_f[df_f["Quantity"] > 0]
         st.markdown("<span class='filter-badge'>Retours exclus</span>", unsafe_allow_html=True)
 
-    if returns_mode == "Neutraliser":
-        df_f.loc[df_f["Quantity"] < 0, "TotalPrice"] = 0
-
-    # ⭐ Filtre RFM
     if rfm_choice != "Tous":
-        selected_ids = df_rfm[df_rfm["RFM_Label"] == rfm_choice]["Customer ID"].unique()
-        df_f = df_f[df_f["CustomerID"].isin(selected_ids)]
         st.markdown(f"<span class='filter-badge'>Segment client : {rfm_choice}</span>", unsafe_allow_html=True)
 
+    # KPIs et tendance servis par le cube (comptages distincts approchés) ;
+    # repli exact si demandé ou si le seuil ne tombe pas sur une tranche
+    overview = None
+    if not exact_counts:
+        with stage("query_overview"):
+            overview = query_overview(
+                load_overview_cube(PAGE_COLUMNS["overview"]),
+                start_date,
+                end_date,
+                country=country_choice,
+                threshold=threshold,
+                returns_mode=returns_mode,
+                segment=rfm_choice,
+            )
+    if overview is None:
+        with stage("overview_from_rows"):
+            overview = overview_from_rows(df_f)
+
     # ------------------------------------------------
     # KPIs PRINCIPAUX (TOP)
     # ------------------------------------------------
@@ -289,9 +319,9 @@ def show_dashboard():
         unsafe_allow_html=True,
     )
 
-    total_revenue = df_f["TotalPrice"].sum()
-    n_customers = df_f["CustomerID"].nunique()
-    n_tx = len(df_f)
+    total_revenue = overview["total_revenue"]
+    n_customers = overview["n_customers"]
+    n_tx = overview["n_tx"]
     avg_order_value = total_revenue / max(n_tx, 1)
 
     c1, c2, c3, c4 = st.columns(4)
@@ -317,14 +347,22 @@ def show_dashboard():
     )
 
     # Recalcul propre des métriques
-    rev_acquisition = df[df["CohortIndex"] == 0]["TotalPrice"].sum()
-    rev_retention = df[df["CohortIndex"] > 0]["TotalPrice"].sum()
-    share_retention = (rev_retention / total_revenue) * 100 if total_revenue > 0 else 0
-
-    avg_freq = compute_avg_purchase_frequency(df_f)
-    avg_lifespan = compute_customer_lifespan(df_f)
-    clv_baseline = compute_clv_safe(avg_order_value, avg_freq, avg_lifespan)
-    north_star = df_f.groupby("Month")["InvoiceNo"].nunique().mean()
+    with stage("kpis_retention"):
+        rev_acquisition = df[df["CohortIndex"] == 0]["TotalPrice"].sum()
+        rev_retention = df[df["CohortIndex"] > 0]["TotalPrice"].sum()
+        share_retention = (rev_retention / total_revenue) * 100 if total_revenue > 0 else 0
+
+    # Une seule table par client pour la fréquence, la durée de vie et la distribution de la CLV
+    with stage("clv"):
+        # Sans filtre actif, la table par client vient du feature store : aucun groupby sur les lignes
+        if len(df_f) == len(df) and returns_mode != "Neutraliser":
+            customers = load_customer_table()
+        else:
+            customers = compute_customer_table(df_f)
+        avg_freq = compute_avg_purchase_frequency(df_f, customers)
+        avg_lifespan = compute_customer_lifespan(df_f, customers)
+        clv_baseline = float(clv_grid(avg_order_value, avg_freq, avg_lifespan))
+    north_star = overview["north_star"]
 
     t_seg = "Nombre de segments RFM identifiés."
     t_clv = (
@@ -353,6 +391,17 @@ def show_dashboard():
     col6.markdown(_kpi(tooltip("North Star", t_ns),
                        f"{north_star:,.0f}"), unsafe_allow_html=True)
 
+    if customers is not None and not customers.empty:
+        with st.expander("Distribution de la CLV par client", expanded=False), stage("clv_distribution"):
+            by_segment, by_cohort = st.columns(2)
+            by_segment.markdown("**Par segment RFM**")
+            by_segment.dataframe(clv_distribution(customers, load_customer_segments()).round(0),
+                                 use_container_width=True)
+            by_cohort.markdown("**Par cohorte d'acquisition (trimestre)**")
+            customers["Cohorte"] = customers["first"].dt.to_period("Q")
+            by_cohort.dataframe(clv_distribution(customers, "Cohorte").round(0),
+                                use_container_width=True)
+
     st.markdown("</div>", unsafe_allow_html=True)
 
     # ------------------------------------------------
@@ -370,7 +419,8 @@ def show_dashboard():
     )
 
     time_col = "Month" if time_unit == "Mois" else "Quarter"
-    rev_time = df_f.groupby(time_col)["TotalPrice"].sum().reset_index()
+    rev_time = overview["revenue_by_month" if time_col == "Month" else "revenue_by_quarter"].rename("TotalPrice").reset_index()
+    rev_time[time_col] = period_labels(rev_time[time_col], "M" if time_col == "Month" else "Q")
 
     fig = px.line(rev_time, x=time_col, y="TotalPrice", markers=True)
     fig.update_traces(text=rev_time["TotalPrice"].round(0))
@@ -391,8 +441,10 @@ def show_dashboard():
         title_font_size=14
     )
     
-    st.plotly_chart(fig, use_container_width=True)
-    export_png_plot(fig, title="tendance_CA")
+    with stage("trend_chart"):
+        st.plotly_chart(fig, use_container_width=True)
+    with stage("export_png_plot"):
+        export_png_plot(fig, title="tendance_CA")
 
     st.markdown("</div>", unsafe_allow_html=True)
 
@@ -418,7 +470,8 @@ def show_dashboard():
         ]
     ]
 
-    st.dataframe(rfm_display, use_container_width=True)
+    with stage("rfm_table"):
+        st.dataframe(rfm_display, use_container_width=True)
     st.markdown("</div>", unsafe_allow_html=True)
 
     # ------------------------------------------------
@@ -435,14 +488,79 @@ def show_dashboard():
         unsafe_allow_html=True,
     )
 
-    top_sales = df_f.groupby("Description")["Quantity"].sum().sort_values(ascending=False).head(10)
-    top_returns = df_f[df_f["Quantity"] < 0].groupby("Description")["Quantity"].sum().sort_values().head(10)
+    k_col, by_col = st.columns(2)
+    k = k_col.slider("Nombre de produits", 5, 50, TOP_K, 5)
+    ranking = by_col.radio("Classer les ventes par", ["Quantité", "CA"], horizontal=True)
+
+    # Totaux par produit servis par le cube produits (quantités exactes) ; repli sur les lignes filtrées
+    # si le seuil ne tombe pas sur une tranche
+    with stage("top_products"):
+        product_cube = load_product_cube(PAGE_COLUMNS["overview"])
+        totals = query_products(
+            product_cube,
+            start_date,
+            end_date,
+            country=country_choice,
+            threshold=threshold,
+            returns_mode=returns_mode,
+            segment=rfm_choice,
+        )
+        if totals is None:
+            totals = products_from_rows(product_cube, df_f)
+        boards = product_leaderboards(product_cube, totals, k, by="revenue" if ranking == "CA" else "quantity")
 
-    col1, col2 = st.columns(2)
+    col1, col2, col3 = st.columns(3)
     col1.write("### Produits les plus vendus")
-    col1.dataframe(top_sales)
+    col1.dataframe(boards["sales"].round(2), hide_index=True)
     col2.write("### Produits les plus retournés")
-    col2.dataframe(top_returns)
+    col2.dataframe(boards["returns"], hide_index=True)
+    col3.write("### Taux de retour les plus élevés")
+    col3.dataframe(boards["return_rate"].style.format({"Taux de retour": "{:.1%}"}), hide_index=True)
+
+    st.markdown("</div>", unsafe_allow_html=True)
+
+    # ------------------------------------------------
+    # SOUVENT ACHETÉS ENSEMBLE
+    # ------------------------------------------------
+    st.markdown(
+        """
+        <div class="section-bubble">
+            <div class="section-header">
+                <div class="section-pill">Paniers</div>
+                <div class="section-title">🛒 Souvent achetés ensemble</div>
+            </div>
+        """,
+        unsafe_allow_html=True,
+    )
+
+    # Règles calculées sur tout l'historique des ventes, pour le segment RFM choisi
+    with stage("basket"):
+        basket = load_basket(PAGE_COLUMNS["overview"])
+        pairs = load_basket_pairs(PAGE_COLUMNS["overview"], None if rfm_choice == "Tous" else rfm_choice)
+
+    if pairs.empty:
+        st.info("Aucune paire de produits n'atteint le support minimal pour ce segment.")
+    else:
+        product_col, metric_col = st.columns([3, 1])
+        product = product_col.selectbox(
+            "Produit",
+            basket_products(basket, pairs),
+            format_func=lambda code: f"{basket['stock_codes'][code]} — {basket['descriptions'][code]}",
+        )
+        metric = metric_col.radio("Classer par", ["Lift", "Confiance"], horizontal=True)
+        by = "lift" if metric == "Lift" else "confidence"
+
+        with stage("basket_rules"):
+            partners = frequently_bought_together(basket, pairs, product, k, by=by)
+            rules = top_rules(basket, pairs, k, by=by)
+
+        col1, col2 = st.columns(2)
+        col1.write("### Achetés avec ce produit")
+        col1.dataframe(partners.style.format({"Support": "{:.2%}", "Confiance": "{:.1%}", "Lift": "{:.2f}"}),
+                       hide_index=True)
+        col2.write("### Règles les plus fortes")
+        col2.dataframe(rules.style.format({"Support": "{:.2%}", "Confiance": "{:.1%}", "Lift": "{:.2f}"}),
+                       hide_index=True)
 
     st.markdown("</div>", unsafe_allow_html=True)
 
@@ -460,9 +578,19 @@ def show_dashboard():
         unsafe_allow_html=True,
     )
 
-    export_filtered_csv(df_f)
+    # Clé de l'export : versions des sources + filtres actifs
+    export_key = (
+        source_version("transactions"), source_version(RFM_PATH),
+        str(start_date), str(end_date), country_choice, threshold, returns_mode, rfm_choice,
+    )
+    with stage("export_filtered_data"):
+        export_filtered_data(df_f, export_key)
     st.markdown("</div>", unsafe_allow_html=True)
 
+    show_navigation()
+
+
+def show_navigation():
     # ------------------------------------------------
     # NAVIGATION EN BAS
     # ------------------------------------------------
@@ -503,9 +631,133 @@ def show_dashboard():
     st.markdown("</div>", unsafe_allow_html=True)  # Fin navigation
 
 
+def show_streaming_dashboard():
+    """Vue d'ensemble du mode hors mémoire : tout vient du résumé calculé bloc par bloc,
+    les transactions ne sont jamais chargées en entier (pas de filtres ni d'export ligne à ligne)"""
+    st.markdown(
+        "<h1>📊 Tableau de Bord Marketing</h1>"
+        "<p style='color:#9ca3af;'>Suivi global des performances e-commerce, RFM et rétention.</p>",
+        unsafe_allow_html=True,
+    )
+    st.info(
+        "Mode hors mémoire (RETAIL_STREAMING=1) : KPIs sur tout l'historique, calculés bloc par bloc. "
+        "Les filtres, le top produits, le panier et l'export demandent le mode en mémoire."
+    )
+
+    with stage("stream_summary"):
+        summary = load_stream_summary()
+    overview = summary["overview"]
+    df_rfm = add_segments(load_rfm(), segment_col="RFM_Label", priority_col=None)
+
+    with st.sidebar:
+        st.header("🎛 Affichage")
+        time_unit = st.radio("Unité", ["Mois", "Trimestre"])
+
+    # ------------------------------------------------
+    # KPIs PRINCIPAUX (TOP)
+    # ------------------------------------------------
+    st.markdown(
+        """
+        <div class="section-bubble">
+            <div class="section-header">
+                <div class="section-pill">Vue globale</div>
+                <div class="section-title">📌 KPIs principaux</div>
+            </div>
+        """,
+        unsafe_allow_html=True,
+    )
+
+    total_revenue = overview["total_revenue"]
+    n_customers = overview["n_customers"]
+    n_tx = overview["n_tx"]
+    avg_order_value = total_revenue / max(n_tx, 1)
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.markdown(_kpi("Clients actifs", f"{n_customers:,}"), unsafe_allow_html=True)
+    c2.markdown(_kpi("CA total", f"{total_revenue:,.0f} €"), unsafe_allow_html=True)
+    c3.markdown(_kpi("Panier moyen", f"{avg_order_value:,.2f} €"), unsafe_allow_html=True)
+    c4.markdown(_kpi("Transactions", f"{n_tx:,}"), unsafe_allow_html=True)
+
+    st.markdown("</div>", unsafe_allow_html=True)
+
+    # ------------------------------------------------
+    # KPIs RÉTENTION & CLV
+    # ------------------------------------------------
+    st.markdown(
+        """
+        <div class="section-bubble">
+            <div class="section-header">
+                <div class="section-pill">Rétention & Valeur client</div>
+                <div class="section-title">🌟 KPIs – Rétention & CLV</div>
+            </div>
+        """,
+        unsafe_allow_html=True,
+    )
+
+    rev_acquisition = overview["revenue_acquisition"]
+    rev_retention = overview["revenue_retention"]
+    share_retention = (rev_retention / total_revenue) * 100 if total_revenue > 0 else 0
+
+    with stage("clv"):
+        customers = load_customer_table()
+        avg_freq = compute_avg_purchase_frequency(None, customers)
+        avg_lifespan = compute_customer_lifespan(None, customers)
+        clv_baseline = float(clv_grid(avg_order_value, avg_freq, avg_lifespan))
+
+    col1, col2, col3, col4, col5, col6 = st.columns(6)
+    col1.markdown(_kpi(tooltip("Clients actifs", "Clients avec ≥ 1 achat"), f"{n_customers:,}"),
+                  unsafe_allow_html=True)
+    col2.markdown(_kpi(tooltip("CA Acquisition", "Clients nouveaux – Cohorte 0"),
+                       f"{rev_acquisition:,.0f} €"), unsafe_allow_html=True)
+    col3.markdown(_kpi(tooltip("CA Rétention", f"{share_retention:.1f}% du CA total"),
+                       f"{rev_retention:,.0f} €"), unsafe_allow_html=True)
+    col4.markdown(_kpi(tooltip("Segments RFM", "Nombre de segments RFM identifiés."),
+                       df_rfm["RFM_Label"].nunique()), unsafe_allow_html=True)
+    col5.markdown(_kpi(tooltip("CLV Baseline", "CLV = Panier moyen × Fréquence × Durée de vie."),
+                       f"{clv_baseline:,.0f} €"), unsafe_allow_html=True)
+    col6.markdown(_kpi(tooltip("North Star", "Nombre moyen de commandes uniques par mois."),
+                       f"{overview['north_star']:,.0f}"), unsafe_allow_html=True)
+
+    st.markdown("</div>", unsafe_allow_html=True)
+
+    # ------------------------------------------------
+    # TENDANCE DU CA
+    # ------------------------------------------------
+    st.markdown(
+        """
+        <div class="section-bubble">
+            <div class="section-header">
+                <div class="section-pill">Performance</div>
+                <div class="section-title">📈 Tendances du chiffre d’affaires</div>
+            </div>
+        """,
+        unsafe_allow_html=True,
+    )
+
+    time_col = "Month" if time_unit == "Mois" else "Quarter"
+    rev_time = overview["revenue_by_month" if time_col == "Month" else "revenue_by_quarter"].rename("TotalPrice").reset_index()
+    rev_time[time_col] = period_labels(rev_time[time_col], "M" if time_col == "Month" else "Q")
+
+    fig = px.line(rev_time, x=time_col, y="TotalPrice", markers=True)
+    fig.update_layout(title=f"Tendance du CA (tout l'historique, {summary['batches']} blocs lus)", title_font_size=14)
+    with stage("trend_chart"):
+        st.plotly_chart(fig, use_container_width=True)
+    with stage("export_png_plot"):
+        export_png_plot(fig, title="tendance_CA")
+
+    st.markdown("</div>", unsafe_allow_html=True)
+
+    show_navigation()
+
+
 # ------------------------------------------------
 # RUN APP
 # ------------------------------------------------
 if __name__ == "__main__":
-    show_dashboard()
+    begin_profile("app")
+    if STREAMING:
+        show_streaming_dashboard()
+    else:
+        show_dashboard()
+    end_profile()
 
@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from products import product_descriptions
+
+# Support minimal (part des factures) d'un produit puis d'une paire : élagage avant le produit matriciel
+MIN_SUPPORT = 0.005
+# Colonnes de X traitées à la fois dans X.T @ X : borne la mémoire des co-occurrences
+BLOCK_PRODUCTS = 512
+TOP_PARTNERS = 10
+
+
+# ============================
+# 📌 MATRICE FACTURES × PRODUITS
+# ============================
+def build_basket(df, customer_segments=None):
+    """Matrice creuse binaire (facture × produit) des ventes, codes StockCode en colonnes.
+    Les factures d'avoir (quantités négatives) sont écartées."""
+    sales = df[df["Quantity"].to_numpy() > 0]
+    # Codes entiers des factures (dictionnaire du parquet), sans passer par les chaînes
+    invoices = pd.Categorical(sales["InvoiceNo"]).remove_unused_categories()
+    stock_codes = sales["StockCode"].astype("category")
+    products = stock_codes.cat.codes.to_numpy().astype(np.int32)
+
+    matrix = sp.csr_matrix(
+        (np.ones(len(sales), dtype=np.int32), (invoices.codes, products)),
+        shape=(len(invoices.categories), len(stock_codes.cat.categories)),
+    )
+    # Une facture compte une fois par produit, quel que soit le nombre de lignes
+    matrix.data[:] = 1
+
+    # Segment RFM de chaque facture (celui de son client)
+    first_line = np.unique(invoices.codes, return_index=True)[1]
+    if customer_segments is not None:
+        segment = customer_segments.reindex(sales["CustomerID"].to_numpy()[first_line]).to_numpy(dtype=object)
+    else:
+        segment = np.full(len(first_line), None, dtype=object)
+
+    return {
+        "matrix": matrix,
+        "segment": segment,
+        "stock_codes": np.asarray(stock_codes.cat.categories, dtype=object),
+        "descriptions": product_descriptions(products, sales["Description"], len(stock_codes.cat.categories)),
+    }
+
+
+# ============================
+# 📌 RÈGLES D'ASSOCIATION
+# ============================
+def mine_pairs(matrix, min_support=MIN_SUPPORT, block=BLOCK_PRODUCTS):
+    """Paires de produits achetés ensemble : support, confiance (A -> B) et lift.
+    Élagage a priori : seuls les produits fréquents entrent dans X.T @ X, calculé par blocs de colonnes
+    et filtré au support minimal avant d'être gardé."""
+    n_invoices = matrix.shape[0]
+    empty = pd.DataFrame({"a": pd.Series(dtype=np.int32), "b": pd.Series(dtype=np.int32),
+                          "count": pd.Series(dtype=np.int64), "support": pd.Series(dtype=float),
+                          "confidence": pd.Series(dtype=float), "lift": pd.Series(dtype=float)})
+    if n_invoices == 0:
+        return empty
+    min_count = max(int(np.ceil(min_support * n_invoices)), 1)
+
+    item_count = np.asarray(matrix.sum(axis=0)).ravel()
+    frequent = np.flatnonzero(item_count >= min_count)
+    if len(frequent) < 2:
+        return empty
+    X = matrix[:, frequent].tocsc()
+    XT = X.T.tocsr()
+
+    a_parts, b_parts, count_parts = [], [], []
+    for lo in range(0, len(frequent), block):
+        co = (XT @ X[:, lo:lo + block]).tocoo()
+        a, b = co.row, co.col + lo
+        keep = (a < b) & (co.data >= min_count)
+        a_parts.append(a[keep])
+        b_parts.append(b[keep])
+        count_parts.append(co.data[keep])
+
+    a = frequent[np.concatenate(a_parts)]
+    b = frequent[np.concatenate(b_parts)]
+    count = np.concatenate(count_parts).astype(np.int64)
+    if len(count) == 0:
+        return empty
+
+    # Les deux sens de chaque paire : la confiance n'est pas symétrique
+    a, b = np.concatenate([a, b]), np.concatenate([b, a])
+    count = np.concatenate([count, count])
+    support = count / n_invoices
+    confidence = count / item_count[a]
+    lift = confidence / (item_count[b] / n_invoices)
+    return pd.DataFrame({"a": a.astype(np.int32), "b": b.astype(np.int32), "count": count,
+                         "support": support, "confidence": confidence, "lift": lift})
+
+
+def segment_rows(basket, segment=None):
+    """Factures d'un segment RFM (toutes si segment est None)"""
+    if segment is None:
+        return basket["matrix"]
+    return basket["matrix"][np.flatnonzero(basket["segment"] == segment)]
+
+
+# ============================
+# 📌 « SOUVENT ACHETÉS ENSEMBLE »
+# ============================
+def _label(basket, codes):
+    return pd.DataFrame({"StockCode": basket["stock_codes"][codes], "Description": basket["descriptions"][codes]})
+
+
+def frequently_bought_together(basket, pairs, product, k=TOP_PARTNERS, by="lift"):
+    """Produits les plus associés à `product` (code entier), classés par lift ou confiance"""
+    partners = pairs[pairs["a"].to_numpy() == product].nlargest(k, [by, "count"])
+    table = _label(basket, partners["b"].to_numpy())
+    table["Factures communes"] = partners["count"].to_numpy()
+    table["Support"] = partners["support"].to_numpy()
+    table["Confiance"] = partners["confidence"].to_numpy()
+    table["Lift"] = partners["lift"].to_numpy()
+    return table
+
+
+def top_rules(basket, pairs, k=TOP_PARTNERS, by="lift"):
+    """Règles A -> B les plus fortes"""
+    best = pairs.nlargest(k, [by, "count"])
+    a = _label(basket, best["a"].to_numpy()).add_suffix(" (A)")
+    b = _label(basket, best["b"].to_numpy()).add_suffix(" (B)")
+    return pd.concat([a, b], axis=1).assign(
+        Support=best["support"].to_numpy(), Confiance=best["confidence"].to_numpy(), Lift=best["lift"].to_numpy())
+
+
+def basket_products(basket, pairs):
+    """Produits présents dans au moins une paire, du plus fréquent au moins fréquent (choix de l'UI)"""
+    counts = pairs.groupby("a")["count"].sum().sort_values(ascending=False)
+    return counts.index.to_numpy()
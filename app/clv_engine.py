@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+
+from parallel_agg import map_partitions, merge_aggregates, month_partitions, use_parallel
+
+
+# ============================
+# 📌 AGRÉGATS PAR SEGMENT
+# ============================
+def segment_aggregates(df_rfm, segment_col, today=None):
+    """Sommes par segment (clients, dépense, commandes, ancienneté en jours) :
+    toute sélection de segments se résout ensuite sans refiltrer les clients"""
+    today = pd.Timestamp.today() if today is None else today
+    sums = pd.DataFrame({
+        "n": 1,
+        "monetary": df_rfm["Monetaire_Total_Depense"].to_numpy(),
+        "frequency": df_rfm["Frequence_Nb_Commandes"].to_numpy(),
+        "lifespan_days": (today - df_rfm["Date_Premier_Achat"]).dt.days.to_numpy(),
+    })
+    return sums.groupby(df_rfm[segment_col].to_numpy(), sort=False).sum()
+
+
+def _means(sums):
+    n = sums["n"]
+    return {
+        "aov": sums["monetary"] / n,
+        "freq": sums["frequency"] / n,
+        "lifespan": sums["lifespan_days"] / n / 365,
+    }
+
+
+def pooled_means(aggregates, segments=None):
+    """AOV, fréquence et durée de vie (années) moyennes d'une sélection de segments"""
+    if segments is not None:
+        aggregates = aggregates.loc[aggregates.index.isin(list(segments))]
+    return {key: float(value) for key, value in _means(aggregates.sum()).items()}
+
+
+def segment_means(aggregates):
+    """Mêmes moyennes, un tableau par segment (axe segment des grilles)"""
+    return {key: value.to_numpy() for key, value in _means(aggregates).items()}
+
+
+# ============================
+# 📌 CLV VECTORISÉE
+# ============================
+def annuity_factor(rate, years):
+    """Facteur d'actualisation moyen sur `years` années (1 quand le taux est nul)"""
+    rate, years = np.broadcast_arrays(np.asarray(rate, dtype=np.float64), np.asarray(years, dtype=np.float64))
+    ry = rate * years
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factor = (1 - (1 + rate) ** -years) / ry
+    return np.where(ry > 0, factor, 1.0)
+
+
+def clv_grid(aov, freq, lifespan, margin=1.0, discount=0.0, retention=1.0, rate=0.0):
+    """CLV = AOV × (1 - remise) × marge × fréquence × durée de vie × rétention, actualisée.
+    Tous les arguments (fractions) sont diffusés : tableaux de n'importe quelle forme compatible.
+    Avec marge = 1 et taux = 0, on retrouve la formule historique de la page scénarios."""
+    years = np.asarray(lifespan, dtype=np.float64) * retention
+    return np.asarray(aov) * (1 - np.asarray(discount)) * margin * np.asarray(freq) * years * annuity_factor(rate, years)
+
+
+def sensitivity_grid(means, axes, **fixed):
+    """Évalue la CLV sur le produit cartésien de `axes` (dict paramètre -> valeurs) en une passe.
+    Une dimension par axe, dans l'ordre du dict, précédée de l'axe segment si `means`
+    vient de segment_means ; les autres paramètres sont fixés."""
+    names = list(axes)
+    shape = tuple(len(axes[name]) for name in names)
+    n_segments = np.shape(means["aov"])
+    params = {key: np.reshape(value, n_segments + (1,) * len(names)) for key, value in means.items()}
+    params.update(fixed)
+    for i, name in enumerate(names):
+        axis_shape = [1] * (len(n_segments) + len(names))
+        axis_shape[len(n_segments) + i] = -1
+        params[name] = np.asarray(axes[name], dtype=np.float64).reshape(axis_shape)
+    return np.broadcast_to(clv_grid(**params), n_segments + shape)
+
+
+def tornado(means, ranges, **fixed):
+    """Impact de chaque paramètre pris à ses bornes basse/haute, les autres à leur valeur de base.
+    ranges : dict paramètre -> (bas, haut) ; renvoie (écarts triés par amplitude, CLV de base)"""
+    names = list(ranges)
+    params = {name: np.full(2 * len(names) + 1, fixed[name], dtype=np.float64) for name in names}
+    for i, name in enumerate(names):
+        params[name][2 * i], params[name][2 * i + 1] = ranges[name]
+    values = clv_grid(**{**means, **fixed, **params})
+    base = values[-1]
+    table = pd.DataFrame({
+        "Paramètre": names,
+        "Bas": values[0:-1:2] - base,
+        "Haut": values[1:-1:2] - base,
+    })
+    table["Amplitude"] = (table["Haut"] - table["Bas"]).abs()
+    return table.sort_values("Amplitude").reset_index(drop=True), base
+
+
+# ============================
+# 📌 CLV PAR CLIENT
+# ============================
+CLV_PERCENTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+
+
+def _customer_part(df):
+    return df.groupby("CustomerID", observed=True, sort=False).agg(
+        first=("InvoiceDate", "min"),
+        last=("InvoiceDate", "max"),
+        lines=("InvoiceDate", "count"),
+        revenue=("TotalPrice", "sum"),
+    )
+
+
+def customer_clv_table(df, margin=1.0, discount=0.0, retention=1.0, rate=0.0, parallel=None):
+    """Une ligne par client, en un seul groupby sur les transactions :
+    panier moyen, fréquence mensuelle, durée de vie (années) et CLV (marge, remise, actualisation).
+    En parallèle : partitions de mois, premier / dernier achat fusionnés par min / max, le reste sommé."""
+    if use_parallel(len(df), parallel):
+        parts = map_partitions(_customer_part, month_partitions(df[["CustomerID", "InvoiceDate", "TotalPrice"]]))
+        customers = merge_aggregates(parts, {"first": "min", "last": "max", "lines": "sum", "revenue": "sum"})
+    else:
+        customers = _customer_part(df)
+    return _add_clv(customers, margin, discount, retention, rate)
+
+
+def features_clv_table(features, margin=1.0, discount=0.0, retention=1.0, rate=0.0):
+    """Même table, déduite du feature store client (aucun groupby sur les transactions)"""
+    customers = features[["first", "last", "lines", "revenue"]].rename_axis("CustomerID")
+    return _add_clv(customers, margin, discount, retention, rate)
+
+
+def _add_clv(customers, margin, discount, retention, rate):
+    span = customers["last"] - customers["first"]
+    active_months = (span / np.timedelta64(30, "D")).clip(lower=1)
+
+    customers["aov"] = customers["revenue"] / customers["lines"]
+    customers["freq"] = customers["lines"] / active_months
+    customers["lifespan"] = span.dt.days.clip(lower=1) / 365
+    customers["clv"] = clv_grid(customers["aov"].to_numpy(), customers["freq"].to_numpy(),
+                                customers["lifespan"].to_numpy(), margin, discount, retention, rate)
+    return customers
+
+
+def clv_distribution(customers, by, percentiles=CLV_PERCENTILES):
+    """Distribution de la CLV par groupe (segment, cohorte...) : effectif, moyenne et percentiles.
+    by : Series indexée par client (ex. segment RFM) ou nom de colonne de la table"""
+    keys = customers[by] if isinstance(by, str) else by.reindex(customers.index)
+    grouped = customers["clv"].groupby(keys, observed=True)
+    table = grouped.quantile(percentiles).unstack()
+    table.columns = [f"P{round(p * 100)}" for p in percentiles]
+    return pd.concat([grouped.agg(["count", "mean"]).rename(columns={"count": "Clients", "mean": "Moyenne"}), table], axis=1)
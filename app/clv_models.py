@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+from scipy.special import gammaln, betaln, hyp2f1
+
+# Paramètres ajustés, mis en cache sur disque par empreinte des données
+PARAMS_PATH = "data/processed/clv_model_params.json"
+# Unité de temps des modèles : la semaine
+DAYS_PER_PERIOD = 7.0
+WEEKS_PER_MONTH = 365.25 / 12 / 7
+PENALIZER = 1e-4
+
+
+# ============================
+# 📌 RÉSUMÉ PAR CLIENT
+# ============================
+def daily_purchases(df):
+    """Achats par (client, jour distinct) : somme des lignes vendues, comme lifetimes"""
+    sales = df[df["TotalPrice"].to_numpy() > 0]
+    days = sales["InvoiceDate"].to_numpy().astype("datetime64[D]").astype(np.int64)
+    return pd.DataFrame({"CustomerID": sales["CustomerID"].to_numpy(), "day": days,
+                         "value": sales["TotalPrice"].to_numpy()}) \
+        .groupby(["CustomerID", "day"], sort=True)["value"].sum()
+
+
+def rfm_summary(df, observation_end=None):
+    """Fréquence (achats répétés, jours distincts), récence t_x, ancienneté T (semaines)
+    et valeur moyenne des achats répétés, à partir des transactions"""
+    return summary_from_daily(daily_purchases(df), observation_end)
+
+
+def summary_from_daily(daily, observation_end=None):
+    """Même résumé à partir des achats par (client, jour), éventuellement cumulés bloc par bloc"""
+    daily = daily.reset_index()
+    if observation_end is None:
+        observation_end = int(daily["day"].max()) if len(daily) else 0
+    else:
+        observation_end = int(np.datetime64(observation_end, "D").astype(np.int64))
+
+    per_customer = daily.groupby("CustomerID", sort=False).agg(
+        first=("day", "min"), last=("day", "max"), n=("day", "size"),
+        total=("value", "sum"), first_value=("value", "first"))
+
+    frequency = per_customer["n"] - 1
+    repeat_total = per_customer["total"] - per_customer["first_value"]
+    return pd.DataFrame({
+        "frequency": frequency.astype(np.int64),
+        "recency": (per_customer["last"] - per_customer["first"]) / DAYS_PER_PERIOD,
+        "T": (observation_end - per_customer["first"]) / DAYS_PER_PERIOD,
+        "monetary": np.where(frequency > 0, repeat_total / frequency.clip(lower=1), 0.0),
+    })
+
+
+def summary_hash(summary):
+    """Empreinte des données d'ajustement (clé du cache disque des paramètres)"""
+    digest = hashlib.blake2b(digest_size=16)
+    for column in ["frequency", "recency", "T", "monetary"]:
+        digest.update(np.ascontiguousarray(summary[column].to_numpy(dtype=np.float64)).tobytes())
+    return digest.hexdigest()
+
+
+def _compress(columns):
+    """Regroupe les clients identiques : la vraisemblance se calcule une fois par profil, pondérée"""
+    return pd.DataFrame(columns).value_counts(sort=False).reset_index(name="weight")
+
+
+# ============================
+# 📌 BG/NBD (nombre d'achats)
+# ============================
+def bgnbd_log_likelihood(params, x, t_x, T):
+    """Log-vraisemblance BG/NBD de chaque client (vectorisée)"""
+    r, alpha, a, b = params
+    a1 = gammaln(r + x) - gammaln(r) + r * np.log(alpha)
+    a2 = betaln(a, b + x) - betaln(a, b)
+    a3 = -(r + x) * np.log(alpha + T)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        a4 = np.where(x > 0,
+                      np.log(a) - np.log(np.maximum(b + x - 1, 1e-12)) - (r + x) * np.log(alpha + t_x),
+                      -np.inf)
+    return a1 + a2 + np.logaddexp(a3, a4)
+
+
+def fit_bgnbd(summary, penalizer=PENALIZER):
+    """Ajuste (r, alpha, a, b) par maximum de vraisemblance (paramètres en log)"""
+    profiles = _compress({"x": summary["frequency"], "t_x": summary["recency"], "T": summary["T"]})
+    x, t_x, T, w = (profiles[c].to_numpy(dtype=np.float64) for c in ["x", "t_x", "T", "weight"])
+    scale = 1 / max(T.max(), 1.0)
+
+    def objective(log_params):
+        params = np.exp(log_params)
+        ll = bgnbd_log_likelihood(params, x, t_x * scale, T * scale)
+        return -(w @ ll) / w.sum() + penalizer * np.sum(params ** 2)
+
+    result = minimize(objective, np.zeros(4), method="L-BFGS-B")
+    r, alpha, a, b = np.exp(result.x)
+    # alpha est une échelle de temps : on revient en semaines
+    return {"r": r, "alpha": alpha / scale, "a": a, "b": b}
+
+
+def conditional_expected_purchases(params, t, x, t_x, T):
+    """Nombre d'achats attendus sur les t prochaines semaines, sachant (x, t_x, T)"""
+    r, alpha, a, b = params["r"], params["alpha"], params["a"], params["b"]
+    t = np.asarray(t, dtype=np.float64)
+    ratio = (alpha + T) / (alpha + T + t)
+    hyp = hyp2f1(r + x, b + x, a + b + x - 1, t / (alpha + T + t))
+    numerator = (a + b + x - 1) / (a - 1) * (1 - ratio ** (r + x) * hyp)
+    return numerator / (1 + (x > 0) * a / np.maximum(b + x - 1, 1e-12) * ((alpha + T) / (alpha + t_x)) ** (r + x))
+
+
+def probability_alive(params, x, t_x, T):
+    r, alpha, a, b = params["r"], params["alpha"], params["a"], params["b"]
+    return 1 / (1 + (x > 0) * a / np.maximum(b + x - 1, 1e-12) * ((alpha + T) / (alpha + t_x)) ** (r + x))
+
+
+# ============================
+# 📌 GAMMA-GAMMA (panier)
+# ============================
+def gamma_gamma_log_likelihood(params, x, m):
+    """Log-vraisemblance Gamma-Gamma des clients ayant au moins un achat répété"""
+    p, q, v = params
+    px = p * x
+    return (gammaln(px + q) - gammaln(px) - gammaln(q) + q * np.log(v)
+            + (px - 1) * np.log(m) + px * np.log(x) - (px + q) * np.log(x * m + v))
+
+
+def fit_gamma_gamma(summary, penalizer=PENALIZER):
+    """Ajuste (p, q, v) sur les clients à achats répétés et panier positif"""
+    repeat = summary[(summary["frequency"] > 0) & (summary["monetary"] > 0)]
+    profiles = _compress({"x": repeat["frequency"], "m": repeat["monetary"]})
+    x, m, w = (profiles[c].to_numpy(dtype=np.float64) for c in ["x", "m", "weight"])
+    scale = 1 / max(np.median(m), 1e-9)
+
+    def objective(log_params):
+        params = np.exp(log_params)
+        ll = gamma_gamma_log_likelihood(params, x, m * scale)
+        return -(w @ ll) / w.sum() + penalizer * np.sum(params ** 2)
+
+    result = minimize(objective, np.zeros(3), method="L-BFGS-B")
+    p, q, v = np.exp(result.x)
+    # v est une échelle monétaire : on revient en euros
+    return {"p": p, "q": q, "v": v / scale}
+
+
+def expected_average_value(params, x, m):
+    """Panier moyen attendu (moyenne de population pour les clients sans achat répété)"""
+    p, q, v = params["p"], params["q"], params["v"]
+    return (p * (v + x * m)) / (p * x + q - 1)
+
+
+# ============================
+# 📌 AJUSTEMENT (cache disque) + SCORING
+# ============================
+def _read_params(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def fit_clv_models(summary, path=PARAMS_PATH, refresh=False):
+    """Paramètres BG/NBD + Gamma-Gamma, relus depuis le disque si les données n'ont pas changé"""
+    key = summary_hash(summary)
+    cache = _read_params(path)
+    if key in cache and not refresh:
+        return cache[key]
+
+    params = {
+        "bgnbd": {k: float(v) for k, v in fit_bgnbd(summary).items()},
+        "gamma_gamma": {k: float(v) for k, v in fit_gamma_gamma(summary).items()},
+        "n_customers": int(len(summary)),
+    }
+    cache[key] = params
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2)
+    return params
+
+
+def score_customers(summary, params, months=12, margin=1.0, rate=0.0):
+    """CLV prédictive par client : achats attendus mois par mois × panier attendu × marge, actualisés.
+    Vectorisé sur les profils (x, t_x, T) distincts, par blocs pour tenir en mémoire à grande échelle."""
+    grouped = summary.groupby(["frequency", "recency", "T"], sort=False)
+    codes = grouped.ngroup().to_numpy()
+    profiles = grouped.size().index.to_frame(index=False)
+    x = profiles["frequency"].to_numpy(dtype=np.float64)
+    t_x = profiles["recency"].to_numpy(dtype=np.float64)
+    T = profiles["T"].to_numpy(dtype=np.float64)
+
+    horizon = np.arange(months + 1) * WEEKS_PER_MONTH
+    discount = (1 + rate) ** -(np.arange(1, months + 1) / 12)
+    expected = np.empty(len(x))
+    discounted = np.empty(len(x))
+    for lo in range(0, len(x), 500_000):
+        hi = lo + 500_000
+        cumulative = conditional_expected_purchases(
+            params["bgnbd"], horizon[None, :], x[lo:hi, None], t_x[lo:hi, None], T[lo:hi, None])
+        expected[lo:hi] = cumulative[:, -1]
+        discounted[lo:hi] = np.diff(cumulative, axis=1) @ discount
+
+    value = expected_average_value(params["gamma_gamma"], summary["frequency"].to_numpy(dtype=np.float64),
+                                   summary["monetary"].to_numpy(dtype=np.float64))
+    return pd.DataFrame({
+        "p_alive": probability_alive(params["bgnbd"], x, t_x, T)[codes],
+        "expected_purchases": expected[codes],
+        "expected_value": value,
+        "clv": discounted[codes] * value * margin,
+    }, index=summary.index)
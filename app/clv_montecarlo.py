@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+
+import parallel_agg
+from clv_engine import clv_grid
+
+# Taille fixe des blocs de simulations : les résultats ne dépendent pas du nombre de processus
+CHUNK_SIZE = 20_000
+# En dessous, on simule dans le processus courant (lancer un pool coûte plus cher).
+# Le pool est celui des agrégations (parallel_agg, RETAIL_AGG_WORKERS) : un seul pool par processus
+PARALLEL_THRESHOLD = 200_000
+N_BOOTSTRAP = 2_000
+# Indices tirés par bloc de rééchantillonnages (int64) : mémoire bornée quel que soit le segment
+BOOTSTRAP_BLOCK_DRAWS = 4_000_000
+INTERVAL = (0.025, 0.975)
+
+# Lois disponibles pour les paramètres incertains : (loi, centre, dispersion), fractions
+LAWS = ["normale", "uniforme", "triangulaire"]
+
+
+# ============================
+# 📌 BOOTSTRAP DES CLIENTS
+# ============================
+def bootstrap_means(df_rfm, segment_col, n_bootstrap=N_BOOTSTRAP, seed=0):
+    """Moyennes (panier, fréquence) de rééchantillonnages des clients de chaque segment.
+    Renvoie {"groups": segments, "aov": (S, B), "freq": (S, B)} ; calcul unique, réutilisé
+    par toutes les simulations (bootstrap à deux niveaux)."""
+    rng = np.random.default_rng(np.random.SeedSequence([seed, 0]))
+    segments = df_rfm[segment_col].to_numpy()
+    groups = [g for g in pd.unique(segments) if not pd.isna(g)]
+    monetary = df_rfm["Monetaire_Total_Depense"].to_numpy(dtype=np.float64)
+    frequency = df_rfm["Frequence_Nb_Commandes"].to_numpy(dtype=np.float64)
+
+    aov = np.empty((len(groups), n_bootstrap))
+    freq = np.empty((len(groups), n_bootstrap))
+    for i, group in enumerate(groups):
+        rows = np.flatnonzero(segments == group)
+        group_monetary, group_frequency = monetary[rows], frequency[rows]
+        # Blocs tirés à la suite dans le même générateur : mêmes résultats qu'un tirage unique
+        block = max(1, BOOTSTRAP_BLOCK_DRAWS // len(rows))
+        for lo in range(0, n_bootstrap, block):
+            hi = min(lo + block, n_bootstrap)
+            picks = rng.integers(0, len(rows), size=(hi - lo, len(rows)))
+            aov[i, lo:hi] = group_monetary[picks].mean(axis=1)
+            freq[i, lo:hi] = group_frequency[picks].mean(axis=1)
+    return {"groups": groups, "aov": aov, "freq": freq}
+
+
+# ============================
+# 📌 TIRAGES DES PARAMÈTRES
+# ============================
+def sample_parameter(rng, spec, size):
+    """Tirages d'un paramètre (fraction dans [0, 1]) selon (loi, centre, dispersion)"""
+    law, center, spread = spec
+    if spread <= 0:
+        return np.full(size, center)
+    if law == "normale":
+        values = rng.normal(center, spread, size)
+    elif law == "uniforme":
+        values = rng.uniform(center - spread, center + spread, size)
+    elif law == "triangulaire":
+        values = rng.triangular(center - spread, center, center + spread, size)
+    else:
+        raise ValueError(f"Loi inconnue : {law}")
+    return np.clip(values, 0.0, 1.0)
+
+
+def _simulate_chunk(seed, size, boot_aov, boot_freq, lifespan, retention, margin, discount, rate):
+    """Un bloc de simulations pour tous les segments : réplique bootstrap + paramètres tirés"""
+    rng = np.random.default_rng(seed)
+    n_groups, n_bootstrap = boot_aov.shape
+    shape = (n_groups, size)
+    pick = rng.integers(0, n_bootstrap, size=shape)
+    rows = np.arange(n_groups)[:, None]
+    return clv_grid(
+        boot_aov[rows, pick],
+        boot_freq[rows, pick],
+        lifespan,
+        margin=sample_parameter(rng, margin, shape),
+        discount=sample_parameter(rng, discount, shape),
+        retention=sample_parameter(rng, retention, shape),
+        rate=rate,
+    )
+
+
+def _simulate_part(part):
+    """Bloc (graine, taille, arguments) : forme attendue par parallel_agg.map_partitions"""
+    return _simulate_chunk(*part)
+
+
+# ============================
+# 📌 SIMULATION MONTE CARLO
+# ============================
+def simulate_clv(boot, lifespan, retention, margin, discount, rate=0.0,
+                 n_simulations=100_000, seed=0, parallel=None):
+    """Simulations de la CLV nette par segment ; (S, n) valeurs reproductibles pour une graine.
+    Les blocs ont chacun leur graine (SeedSequence.spawn) : même résultat en série ou en parallèle."""
+    sizes = [CHUNK_SIZE] * (n_simulations // CHUNK_SIZE)
+    if n_simulations % CHUNK_SIZE:
+        sizes.append(n_simulations % CHUNK_SIZE)
+    seeds = np.random.SeedSequence([seed, 1]).spawn(len(sizes))
+    args = (boot["aov"], boot["freq"], lifespan, retention, margin, discount, rate)
+
+    if parallel is None:
+        parallel = n_simulations >= PARALLEL_THRESHOLD and parallel_agg.MAX_WORKERS > 1
+    parts = [(s, n) + args for s, n in zip(seeds, sizes)]
+    return np.concatenate(parallel_agg.map_partitions(_simulate_part, parts, parallel), axis=1)
+
+
+def clv_intervals(boot, simulations, interval=INTERVAL):
+    """Moyenne, médiane et intervalle de confiance de la CLV simulée, par segment"""
+    low, median, high = np.quantile(simulations, [interval[0], 0.5, interval[1]], axis=1)
+    return pd.DataFrame({
+        "Segment": boot["groups"],
+        "CLV moyenne": simulations.mean(axis=1),
+        "Médiane": median,
+        f"IC {interval[0]:.1%}": low,
+        f"IC {interval[1]:.1%}": high,
+    })
@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+
+from data_store import NUMERIC_DTYPES, period_codes, period_index
+from parallel_agg import customer_partitions, map_partitions, merge_sums, use_parallel
+
+# Un couple (client, mois) est encodé dans un seul int64 : client << 20 | mois
+_MONTH_BITS = 20
+_MONTH_MASK = (1 << _MONTH_BITS) - 1
+
+
+# ============================
+# 📌 ÉTAT DES COHORTES
+# ============================
+def empty_cohort_state():
+    """État vide : couples (client, mois) actifs, cohorte par client, effectifs par cellule"""
+    return {
+        "pairs": np.empty(0, dtype=np.int64),
+        "first_month": pd.Series(dtype=np.int64),
+        "cells": pd.Series(dtype=np.int64, index=pd.MultiIndex.from_arrays(
+            [np.empty(0, dtype=np.int64), np.empty(0, dtype=NUMERIC_DTYPES['CohortIndex'])],
+            names=['Cohort', 'CohortIndex'])),
+    }
+
+
+def _customer_months(df):
+    """Clients et mois d'achat (ordinaux) d'un lot, quel que soit son format"""
+    customers = (df['CustomerID'] if 'CustomerID' in df.columns else df['Customer ID']).to_numpy().astype(np.int64)
+    if 'Month' in df.columns:
+        months = df['Month'].to_numpy().astype(np.int64)
+    elif 'Cohort' in df.columns and 'CohortIndex' in df.columns and pd.api.types.is_integer_dtype(df['Cohort']):
+        months = df['Cohort'].to_numpy().astype(np.int64) + df['CohortIndex'].to_numpy().astype(np.int64)
+    else:
+        months = period_codes(pd.to_datetime(df['InvoiceDate']), "M").astype(np.int64)
+    return customers, months
+
+
+def _cell_counts(customers, months, first_month):
+    cohorts = first_month.reindex(customers).to_numpy()
+    offsets = (months - cohorts).astype(NUMERIC_DTYPES['CohortIndex'])
+    return pd.Series(1, index=pd.MultiIndex.from_arrays(
+        [cohorts, offsets], names=['Cohort', 'CohortIndex'])).groupby(level=[0, 1]).sum()
+
+
+def fold_cohort_transactions(state, batch):
+    """Met à jour uniquement les cellules touchées par un lot de transactions"""
+    if batch.empty:
+        return state
+
+    customers, months = _customer_months(batch)
+    keys = np.unique((customers << _MONTH_BITS) | months)
+    keys = keys[~np.isin(keys, state["pairs"], assume_unique=True)]
+    if len(keys) == 0:
+        return state
+
+    new_customers = keys >> _MONTH_BITS
+    new_months = keys & _MONTH_MASK
+    batch_first = pd.Series(new_months).groupby(new_customers).min()
+
+    old_first = state["first_month"]
+    known = old_first.reindex(batch_first.index)
+    moved = batch_first.index[(known.notna() & (batch_first < known)).to_numpy()]
+
+    cells = state["cells"]
+    add_keys = keys
+    if len(moved):
+        # Clients dont la cohorte recule (historique arrivé en retard) : on retire leurs anciennes cellules
+        old_pairs = state["pairs"][np.isin(state["pairs"] >> _MONTH_BITS, moved.to_numpy())]
+        old_counts = _cell_counts(old_pairs >> _MONTH_BITS, old_pairs & _MONTH_MASK, old_first)
+        cells = cells.sub(old_counts, fill_value=0)
+        add_keys = np.concatenate([keys, old_pairs])
+
+    first_month = pd.concat([old_first, batch_first]).groupby(level=0).min()
+    added = _cell_counts(add_keys >> _MONTH_BITS, add_keys & _MONTH_MASK, first_month)
+    cells = cells.add(added, fill_value=0)
+    cells = cells[cells > 0].astype(np.int64)
+
+    return {
+        "pairs": np.union1d(state["pairs"], keys),
+        "first_month": first_month,
+        "cells": cells,
+    }
+
+
+def build_cohort_state(df):
+    return fold_cohort_transactions(empty_cohort_state(), df)
+
+
+def _partition_cells(df):
+    return build_cohort_state(df)["cells"]
+
+
+def cohort_cells(df, parallel=None):
+    """Effectifs par (Cohort, CohortIndex). En parallèle : partitions par client (la cohorte d'un
+    client ne dépend que de ses lignes), puis somme des effectifs de chaque cellule."""
+    if not use_parallel(len(df), parallel):
+        return _partition_cells(df)
+    columns = [c for c in ('CustomerID', 'Customer ID', 'Month', 'Cohort', 'CohortIndex', 'InvoiceDate') if c in df.columns]
+    return merge_sums(map_partitions(_partition_cells, customer_partitions(df[columns]))).astype(np.int64)
+
+
+# ============================
+# 📌 PIVOT DE RÉTENTION
+# ============================
+def cohort_pivot(state):
+    """Pivot de rétention calculé sur les cellules (et non sur les transactions)"""
+    return retention_pivot(state["cells"])
+
+
+def retention_pivot(cell_counts):
+    """Pivot de rétention à partir des effectifs par (Cohort, CohortIndex), exacts ou estimés"""
+    cohort_counts_df = cell_counts.to_frame('Total Customers').sort_values(by='Total Customers', ascending=False)
+    cohort_counts_df['retention_rate'] = cohort_counts_df['Total Customers'] / cohort_counts_df.groupby(['Cohort'])['Total Customers'].transform('max')
+    cohorts_pivot = cohort_counts_df.pivot_table(index='Cohort', columns='CohortIndex', values='retention_rate')
+    cohorts_pivot.index = period_index(cohorts_pivot.index, "M", name='Cohort')
+    return cohorts_pivot
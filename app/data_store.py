@@ -0,0 +1,218 @@
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+DATA_PATH = "data/processed/online_retail_clean.parquet"
+
+# Noms du notebook -> noms utilisés par le dashboard
+RENAME_COLUMNS = {
+    'Customer ID': 'CustomerID',
+    'Price': 'UnitPrice',
+    'Invoice': 'InvoiceNo',
+}
+
+# Colonnes texte stockées en dictionnaire (category) plutôt qu'en objets Python
+CATEGORICAL_COLUMNS = ['InvoiceNo', 'StockCode', 'Description', 'Country']
+
+# Colonnes de périodes stockées en codes entiers (ordinaux pandas des Period)
+PERIOD_COLUMNS = {'Month': 'M', 'Quarter': 'Q', 'Cohort': 'M'}
+
+# Types numériques réduits (TotalPrice reste en float64 : base de tous les cumuls de CA)
+NUMERIC_DTYPES = {
+    'CustomerID': np.int32,
+    'Quantity': np.int32,
+    'CohortIndex': np.int16,
+    'UnitPrice': np.float32,
+}
+
+# Colonnes redondantes écrites par le notebook (déjà couvertes par Month)
+DROPPED_COLUMNS = ['MonthYear', 'InvoiceMonth']
+
+# Lignes par bloc en lecture hors mémoire (iter_transactions)
+STREAM_BATCH_ROWS = 500_000
+
+# Projection des colonnes utiles par page
+PAGE_COLUMNS = {
+    "overview": (
+        'InvoiceNo', 'StockCode', 'Description', 'Quantity', 'InvoiceDate',
+        'UnitPrice', 'CustomerID', 'Country', 'TotalPrice', 'CohortIndex',
+        'Month', 'Quarter',
+    ),
+    "cohortes": (
+        'InvoiceNo', 'Description', 'Quantity', 'InvoiceDate', 'CustomerID',
+        'Country', 'TotalPrice', 'Cohort', 'CohortIndex',
+    ),
+}
+
+
+# ============================
+# 📌 CODES DE PÉRIODES
+# ============================
+def period_codes(dates, freq="M"):
+    """Convertit une série de dates en ordinaux de périodes (int32)"""
+    years = dates.dt.year.to_numpy(dtype=np.int32) - 1970
+    months = dates.dt.month.to_numpy(dtype=np.int32) - 1
+    if freq == "Q":
+        return years * 4 + months // 3
+    return years * 12 + months
+
+
+def period_labels(codes, freq="M"):
+    """Retrouve les libellés ('2010-01', '2010Q1') à partir des codes"""
+    codes = np.asarray(codes, dtype=np.int64)
+    return pd.PeriodIndex.from_ordinals(codes, freq=freq).astype(str)
+
+
+def period_index(codes, freq="M", name=None):
+    """Retrouve un PeriodIndex à partir des codes (pour les index de pivots)"""
+    codes = np.asarray(codes, dtype=np.int64)
+    return pd.PeriodIndex.from_ordinals(codes, freq=freq).rename(name)
+
+
+def period_categories(df):
+    """Codes de périodes distincts (triés) de chaque colonne de période du frame"""
+    return {col: np.unique(df[col].to_numpy()) for col in PERIOD_COLUMNS if col in df.columns}
+
+
+def decode_periods(df, categories=None):
+    """Copie d'affichage où les codes de périodes redeviennent lisibles.
+    Un libellé par période distincte (catégories), pas une chaîne par ligne.
+    categories : codes fixés par colonne (period_categories du frame complet), pour que des blocs
+    du même frame partagent exactement les mêmes catégories."""
+    out = df.copy()
+    for col, freq in PERIOD_COLUMNS.items():
+        if col in out.columns:
+            values = out[col].to_numpy()
+            if categories is not None and col in categories:
+                codes = categories[col]
+                inverse = np.searchsorted(codes, values)
+            else:
+                codes, inverse = np.unique(values, return_inverse=True)
+            out[col] = pd.Categorical.from_codes(inverse, categories=period_labels(codes, freq))
+    return out
+
+
+def _to_period_codes(series, freq="M"):
+    """Normalise une colonne de cohorte (Period, date ou texte) en codes"""
+    if isinstance(series.dtype, pd.PeriodDtype):
+        return series.array.asi8.astype(np.int32)
+    if not pd.api.types.is_datetime64_any_dtype(series):
+        series = pd.to_datetime(series.astype(str))
+    return period_codes(series, freq)
+
+
+# ============================
+# 📌 CHARGEMENT COMPACT
+# ============================
+def _physical_columns(path, columns):
+    """Colonnes à lire dans le parquet pour servir la projection demandée"""
+    available = pq.read_schema(path).names
+    wanted = set()
+    for col in columns:
+        if col in ('Month', 'Quarter'):
+            wanted.add('InvoiceDate')
+        else:
+            wanted.add(col)
+
+    physical = []
+    for name in available:
+        if name in DROPPED_COLUMNS:
+            continue
+        if RENAME_COLUMNS.get(name, name) in wanted:
+            physical.append(name)
+    return physical
+
+
+def _resolve_columns(path, columns):
+    if columns is None:
+        columns = [RENAME_COLUMNS.get(c, c) for c in pq.read_schema(path).names
+                   if c not in DROPPED_COLUMNS] + ['Month', 'Quarter']
+    return list(columns)
+
+
+def _text_columns(physical):
+    return [c for c in physical if RENAME_COLUMNS.get(c, c) in CATEGORICAL_COLUMNS]
+
+
+def _normalize(df, columns):
+    """Noms du dashboard, codes de périodes et types réduits (frame complet ou bloc)"""
+    df = df.rename(columns=RENAME_COLUMNS)
+
+    if 'InvoiceDate' in df.columns:
+        df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'])
+    if 'Month' in columns:
+        df['Month'] = period_codes(df['InvoiceDate'], "M")
+    if 'Quarter' in columns:
+        df['Quarter'] = period_codes(df['InvoiceDate'], "Q")
+    if 'Cohort' in df.columns:
+        df['Cohort'] = _to_period_codes(df['Cohort'], "M")
+
+    return compact_frame(df)[[c for c in columns if c in df.columns]]
+
+
+def read_transactions(path=DATA_PATH, columns=None):
+    """Lit les transactions avec projection, dictionnaires et types réduits"""
+    columns = _resolve_columns(path, columns)
+    physical = _physical_columns(path, columns)
+
+    table = pq.read_table(path, columns=physical, read_dictionary=_text_columns(physical))
+    # Un bloc par colonne et libération des buffers Arrow au fil de la conversion : pas de pic x2
+    df = table.to_pandas(split_blocks=True, self_destruct=True)
+    del table
+    return _normalize(df, columns)
+
+
+def iter_transactions(path=DATA_PATH, columns=None, batch_rows=STREAM_BATCH_ROWS):
+    """Mêmes colonnes et types que read_transactions, un bloc de lignes à la fois :
+    la mémoire dépend de batch_rows, pas de la taille du fichier"""
+    columns = _resolve_columns(path, columns)
+    physical = _physical_columns(path, columns)
+
+    parquet = pq.ParquetFile(path, read_dictionary=_text_columns(physical))
+    for batch in parquet.iter_batches(batch_size=batch_rows, columns=physical):
+        yield _normalize(batch.to_pandas(), columns)
+
+
+def compact_frame(df):
+    """Réduit les types : category pour le texte, entiers/flottants plus courts"""
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(str).astype('category')
+
+    # Types fixes (et non un downcast au plus juste) pour que des lots successifs restent concaténables
+    for col, dtype in NUMERIC_DTYPES.items():
+        if col in df.columns:
+            df[col] = df[col].astype(dtype)
+    for col in PERIOD_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype(np.int32)
+    return df
+
+
+# ============================
+# 📌 RAPPORT MÉMOIRE
+# ============================
+def read_legacy_frame(path=DATA_PATH):
+    """Reproduit l'ancien chargement (objets Python + Month/Quarter en texte)"""
+    df = pd.read_parquet(path)
+    df = df.rename(columns=RENAME_COLUMNS)
+    df['RFM_Segment'] = 'Aucun segment'
+    df["InvoiceDate"] = pd.to_datetime(df["InvoiceDate"])
+    df["Month"] = df["InvoiceDate"].dt.to_period("M").astype(str)
+    df["Quarter"] = df["InvoiceDate"].dt.to_period("Q").astype(str)
+    return df
+
+
+def memory_report(path=DATA_PATH, columns=None):
+    """Compare colonne par colonne l'empreinte mémoire ancienne et compacte"""
+    legacy = read_legacy_frame(path).memory_usage(deep=True, index=False)
+    compact = read_transactions(path, columns).memory_usage(deep=True, index=False)
+
+    report = pd.DataFrame({'Ancien (Mo)': legacy, 'Compact (Mo)': compact}).fillna(0) / 1024 ** 2
+    report.loc['TOTAL'] = report.sum()
+    report['Gain (%)'] = (1 - report['Compact (Mo)'] / report['Ancien (Mo)']) * 100
+    return report.round(2)
+
+
+if __name__ == "__main__":
+    print(memory_report())
@@ -0,0 +1,87 @@
+import numpy as np
+
+# Grille fixe de TotalPrice : même fenêtre (0, 75) que l'ancien graphique seaborn
+DENSITY_RANGE = (0.0, 75.0)
+DENSITY_BINS = 1024
+
+
+# ============================
+# 📌 HISTOGRAMMES PAR ÂGE
+# ============================
+def build_density_bins(df, value_col='TotalPrice', group_col='CohortIndex',
+                       value_range=DENSITY_RANGE, n_bins=DENSITY_BINS):
+    """Comptages par (âge de cohorte, case de la grille) sur 100 % des lignes,
+    avec les sommes nécessaires à la largeur de bande de Scott"""
+    lo, hi = value_range
+    values = df[value_col].to_numpy(dtype=np.float64)
+    groups = df[group_col].to_numpy()
+    keep = (values > lo) & (values < hi)
+    values, groups = values[keep], groups[keep]
+
+    ages, group_codes = np.unique(groups, return_inverse=True)
+    bin_width = (hi - lo) / n_bins
+    bins = np.minimum(((values - lo) / bin_width).astype(np.int64), n_bins - 1)
+    counts = np.bincount(group_codes * n_bins + bins, minlength=len(ages) * n_bins).reshape(len(ages), n_bins)
+
+    return {
+        "ages": ages,
+        "counts": counts,
+        "n": np.bincount(group_codes, minlength=len(ages)),
+        "sum": np.bincount(group_codes, weights=values, minlength=len(ages)),
+        "sum_sq": np.bincount(group_codes, weights=values * values, minlength=len(ages)),
+        "grid": lo + bin_width * (np.arange(n_bins) + 0.5),
+        "bin_width": bin_width,
+    }
+
+
+def merge_density_bins(a, b):
+    """Additionne deux jeux d'histogrammes (même grille, âges réunis) : construction par blocs"""
+    ages = np.union1d(a["ages"], b["ages"])
+    merged = {"ages": ages, "grid": a["grid"], "bin_width": a["bin_width"]}
+    for key in ("counts", "n", "sum", "sum_sq"):
+        total = np.zeros((len(ages),) + a[key].shape[1:], dtype=np.result_type(a[key], b[key]))
+        total[np.searchsorted(ages, a["ages"])] += a[key]
+        total[np.searchsorted(ages, b["ages"])] += b[key]
+        merged[key] = total
+    return merged
+
+
+def scott_bandwidth(bins, age, bw_adjust=1.0):
+    """Largeur de bande de Scott (celle de seaborn) calculée sur toutes les lignes d'un âge"""
+    i = int(np.searchsorted(bins["ages"], age))
+    n = bins["n"][i]
+    if n < 2:
+        return 0.0
+    variance = (bins["sum_sq"][i] - bins["sum"][i] ** 2 / n) / (n - 1)
+    return float(np.sqrt(max(variance, 0.0)) * n ** (-1 / 5) * bw_adjust)
+
+
+# ============================
+# 📌 KDE PAR CONVOLUTION FFT
+# ============================
+def _gaussian_kernel(bandwidth, bin_width, n_bins):
+    half = int(min(np.ceil(4 * bandwidth / bin_width), n_bins))
+    offsets = np.arange(-half, half + 1) * bin_width
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2)
+    return kernel / kernel.sum()
+
+
+def kde_from_bins(bins, age, bw_adjust=1.0):
+    """Densité d'un âge : histogramme normalisé convolué (FFT) par un noyau gaussien"""
+    i = int(np.searchsorted(bins["ages"], age))
+    if i >= len(bins["ages"]) or bins["ages"][i] != age or bins["n"][i] == 0:
+        return np.zeros_like(bins["grid"])
+
+    counts = bins["counts"][i].astype(np.float64)
+    density = counts / (bins["n"][i] * bins["bin_width"])
+    bandwidth = scott_bandwidth(bins, age, bw_adjust)
+    if bandwidth <= 0:
+        return density
+
+    kernel = _gaussian_kernel(bandwidth, bins["bin_width"], len(counts))
+    # Remplissage de zéros pour une convolution linéaire (pas circulaire)
+    size = len(counts) + len(kernel) - 1
+    fft_size = 1 << int(np.ceil(np.log2(size)))
+    smoothed = np.fft.irfft(np.fft.rfft(density, fft_size) * np.fft.rfft(kernel, fft_size), fft_size)
+    half = len(kernel) // 2
+    return np.clip(smoothed[half:half + len(counts)], 0.0, None)
@@ -0,0 +1,131 @@
+import gzip
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from data_store import decode_periods, period_categories
+
+# Budget mémoire des fichiers d'export gardés en cache, en Mo
+EXPORT_BUDGET = int(os.environ.get("RETAIL_EXPORT_BUDGET_MB", 128)) * 1024 ** 2
+# Lignes converties à la fois : borne la mémoire de l'écriture, quel que soit le filtre
+CHUNK_ROWS = 100_000
+# gzip rapide : l'essentiel du gain de taille pour une fraction du temps de compression
+GZIP_LEVEL = 1
+
+# Formats proposés (le premier est celui par défaut)
+EXPORT_FORMATS = {
+    "csv.gz": {"label": "CSV compressé (gzip)", "mime": "application/gzip"},
+    "parquet": {"label": "Parquet", "mime": "application/vnd.apache.parquet"},
+    "arrow": {"label": "Arrow IPC", "mime": "application/vnd.apache.arrow.file"},
+    "csv": {"label": "CSV (;)", "mime": "text/csv"},
+}
+
+_LOCK = threading.RLock()
+_EXPORTS = OrderedDict()
+_STATS = {"hits": 0, "builds": 0, "evictions": 0}
+
+
+# ============================
+# 📌 ÉCRITURE PAR BLOCS
+# ============================
+def iter_chunks(df, chunk_rows=CHUNK_ROWS):
+    """Blocs du frame filtré, périodes décodées en libellés ('2010-01'), un bloc à la fois.
+    Les catégories de périodes sont celles du frame complet : un fichier Arrow IPC
+    refuse qu'un dictionnaire change d'un bloc à l'autre."""
+    categories = period_categories(df)
+    for start in range(0, len(df), chunk_rows):
+        yield decode_periods(df.iloc[start:start + chunk_rows], categories)
+
+
+def _write_csv(df, dest, chunk_rows):
+    for i, chunk in enumerate(iter_chunks(df, chunk_rows)):
+        dest.write(chunk.to_csv(index=False, sep=";", header=i == 0).encode("utf-8"))
+
+
+def _write_arrow_chunks(df, chunk_rows, open_writer):
+    writer = None
+    schema = None
+    try:
+        for chunk in iter_chunks(df, chunk_rows):
+            if schema is None:
+                schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+                writer = open_writer(schema)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write_export(df, fmt, dest, chunk_rows=CHUNK_ROWS):
+    """Écrit le frame dans le fichier binaire `dest`, bloc par bloc, au format demandé"""
+    if fmt == "csv":
+        _write_csv(df, dest, chunk_rows)
+    elif fmt == "csv.gz":
+        with gzip.GzipFile(fileobj=dest, mode="wb", compresslevel=GZIP_LEVEL) as gz:
+            _write_csv(df, gz, chunk_rows)
+    elif fmt == "parquet":
+        _write_arrow_chunks(df, chunk_rows, lambda schema: pq.ParquetWriter(dest, schema, compression="zstd"))
+    elif fmt == "arrow":
+        options = pa.ipc.IpcWriteOptions(compression="zstd")
+        _write_arrow_chunks(df, chunk_rows, lambda schema: pa.ipc.new_file(dest, schema, options=options))
+    else:
+        raise ValueError(f"Format d'export inconnu : {fmt}")
+
+
+# ============================
+# 📌 EXPORTS À LA DEMANDE (cache)
+# ============================
+def _evict(keep):
+    total = sum(len(data) for data in _EXPORTS.values())
+    for key in list(_EXPORTS):
+        if total <= EXPORT_BUDGET:
+            break
+        if key == keep:
+            continue
+        total -= len(_EXPORTS.pop(key))
+        _STATS["evictions"] += 1
+
+
+def get_export(key, fmt):
+    """Fichier d'export déjà construit pour ces filtres et ce format, sinon None"""
+    with _LOCK:
+        data = _EXPORTS.get((key, fmt))
+        if data is not None:
+            _EXPORTS.move_to_end((key, fmt))
+            _STATS["hits"] += 1
+        return data
+
+
+def build_export(key, df, fmt, chunk_rows=CHUNK_ROWS):
+    """Construit le fichier (écriture par blocs dans un fichier temporaire) et le garde en cache.
+    Seul le fichier final, compressé, est chargé en mémoire pour le téléchargement."""
+    data = get_export(key, fmt)
+    if data is not None:
+        return data
+    with tempfile.TemporaryFile() as tmp:
+        write_export(df, fmt, tmp, chunk_rows)
+        tmp.seek(0)
+        data = tmp.read()
+    with _LOCK:
+        _STATS["builds"] += 1
+        _EXPORTS[(key, fmt)] = data
+        _EXPORTS.move_to_end((key, fmt))
+        _evict(keep=(key, fmt))
+    return data
+
+
+def export_filename(prefix, fmt, date):
+    return f"{prefix}_{date.strftime('%Y-%m-%d')}.{fmt}"
+
+
+def export_stats():
+    """Compteurs du cache d'export + occupation mémoire"""
+    with _LOCK:
+        return dict(_STATS,
+                    exports=len(_EXPORTS),
+                    export_mb=sum(len(data) for data in _EXPORTS.values()) / 1024 ** 2,
+                    budget_mb=EXPORT_BUDGET / 1024 ** 2)
@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+ALL = "Tous"
+RETURNS_MODES = ["Inclure", "Exclure", "Neutraliser"]
+
+
+# ============================
+# 📌 BITMAPS
+# ============================
+def _bitmap(mask):
+    """Compresse un masque booléen (1 bit par ligne)"""
+    return np.packbits(mask)
+
+
+def _bitmap_slice(bits, lo, hi):
+    """Décompresse uniquement les lignes [lo, hi) d'un bitmap"""
+    start = lo // 8
+    chunk = np.unpackbits(bits[start:(hi + 7) // 8])
+    offset = lo - start * 8
+    return chunk[offset:offset + hi - lo].view(bool)
+
+
+def _bitmaps_by_value(codes, n_values):
+    return [_bitmap(codes == code) for code in range(n_values)]
+
+
+# ============================
+# 📌 INDEX DE FILTRAGE
+# ============================
+def build_filter_index(df, customer_segments=None):
+    """Prépare les filtres de la sidebar une fois pour toutes :
+    tri par date, clés jour entières, bitmaps pays et segments RFM"""
+    if df["InvoiceDate"].is_monotonic_increasing:
+        # Parquet du pipeline déjà trié par date : vue sur le frame du registre (copy-on-write), pas de copie
+        frame = df.reset_index(drop=True)
+    else:
+        order = np.argsort(df["InvoiceDate"].to_numpy(), kind="stable")
+        frame = df.take(order).reset_index(drop=True)
+
+    day_keys = frame["InvoiceDate"].to_numpy().astype("datetime64[D]").astype(np.int32)
+
+    countries = frame["Country"].astype("category")
+    country_bits = dict(zip(countries.cat.categories,
+                            _bitmaps_by_value(countries.cat.codes.to_numpy(), len(countries.cat.categories))))
+
+    segment_bits = {}
+    if customer_segments is not None:
+        segments = pd.Categorical(customer_segments.reindex(frame["CustomerID"].to_numpy()))
+        segment_bits = dict(zip(segments.categories,
+                                _bitmaps_by_value(segments.codes, len(segments.categories))))
+
+    return {
+        "frame": frame,
+        "day_keys": day_keys,
+        "country_bits": country_bits,
+        "segment_bits": segment_bits,
+        "total_price": frame["TotalPrice"].to_numpy(),
+        "quantity": frame["Quantity"].to_numpy(),
+    }
+
+
+def _day_key(date):
+    return np.datetime64(date, "D").astype(np.int32)
+
+
+def filter_mask(index, start_date, end_date, country=ALL, threshold=0.0,
+                returns_mode="Inclure", segment=ALL):
+    """Tranche de dates [lo, hi) + masque booléen des lignes retenues dans la tranche"""
+    day_keys = index["day_keys"]
+    lo = int(np.searchsorted(day_keys, _day_key(start_date), side="left"))
+    hi = int(np.searchsorted(day_keys, _day_key(end_date), side="right"))
+
+    quantity = index["quantity"][lo:hi]
+    mask = (index["total_price"][lo:hi] >= threshold) | (quantity < 0)
+
+    if country != ALL:
+        bits = index["country_bits"].get(country)
+        if bits is None:
+            mask[:] = False
+        else:
+            mask &= _bitmap_slice(bits, lo, hi)
+
+    if returns_mode == "Exclure":
+        mask &= quantity > 0
+
+    if segment != ALL:
+        bits = index["segment_bits"].get(segment)
+        if bits is None:
+            mask[:] = False
+        else:
+            mask &= _bitmap_slice(bits, lo, hi)
+
+    return lo, hi, mask
+
+
+def apply_filters(index, start_date, end_date, country=ALL, threshold=0.0,
+                  returns_mode="Inclure", segment=ALL):
+    """Mêmes règles que les filtres du dashboard, en une seule extraction de lignes"""
+    lo, hi, mask = filter_mask(index, start_date, end_date, country, threshold, returns_mode, segment)
+    rows = lo + np.flatnonzero(mask)
+    df_f = index["frame"].take(rows)
+
+    if returns_mode == "Neutraliser":
+        # Les retours restent visibles mais ne pèsent plus dans le CA
+        df_f["TotalPrice"] = np.where(df_f["Quantity"].to_numpy() < 0, 0.0, df_f["TotalPrice"].to_numpy())
+
+    return df_f
@@ -0,0 +1,201 @@
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from filters import ALL
+from parallel_agg import map_partitions, merge_disjoint, merge_distinct, month_partitions, use_parallel
+from sketches import DEFAULT_PRECISION, sketch_table, dense_registers, estimate, estimate_by
+
+# Bornes des tranches de TotalPrice : un seuil égal à une borne se sert depuis le cube
+PRICE_EDGES = np.array([0, 1, 2, 3, 5, 10, 15, 20, 25, 30, 40, 50, 75, 100, 200, 500], dtype=np.float64)
+
+CUBE_DIMENSIONS = ['day', 'country', 'segment', 'sign', 'bucket']
+
+
+# ============================
+# 📌 CONSTRUCTION DU CUBE
+# ============================
+def cube_categories(df, customer_segments=None):
+    """Pays et segments RFM possibles, fixés avant le découpage : mêmes codes dans toutes les partitions"""
+    countries = df["Country"].astype("category").cat.categories
+    if customer_segments is not None:
+        segments = pd.Index(customer_segments.dropna().unique()).sort_values()
+    else:
+        segments = pd.Index([], dtype=object)
+    return countries, segments
+
+
+def segment_codes(df, customer_segments, segments):
+    """Code du segment RFM du client de chaque ligne (-1 sans segment)"""
+    if customer_segments is None:
+        return np.full(len(df), -1, dtype=np.int8)
+    return pd.Categorical(customer_segments.reindex(df["CustomerID"].to_numpy()), categories=segments).codes
+
+
+def _cube_part(df, customer_segments, countries, segments, precision):
+    """Cellules et sketches d'une partition (numéros de cellules locaux)"""
+    day = df["InvoiceDate"].to_numpy().astype("datetime64[D]").astype(np.int32)
+    total_price = df["TotalPrice"].to_numpy()
+
+    keys = pd.DataFrame({
+        'day': day,
+        'country': pd.Categorical(df["Country"], categories=countries).codes,
+        'segment': segment_codes(df, customer_segments, segments),
+        # -1 retour, 0 quantité nulle, 1 vente : les trois modes « Retours » restent exacts
+        'sign': np.sign(df["Quantity"].to_numpy()).astype(np.int8),
+        'bucket': np.searchsorted(PRICE_EDGES, total_price, side='right').astype(np.int8),
+    })
+    grouped = keys.groupby(CUBE_DIMENSIONS, sort=True)
+    cell_id = grouped.ngroup().to_numpy().astype(np.int32)
+
+    cells = pd.DataFrame({'revenue': total_price, 'lines': 1, 'cell': cell_id}).groupby('cell').agg(
+        revenue=('revenue', 'sum'), lines=('lines', 'sum'))
+    cells = pd.concat([grouped.size().reset_index()[CUBE_DIMENSIONS], cells.reset_index(drop=True)], axis=1)
+
+    cell_keys = pd.DataFrame({'cell': cell_id})
+    return {
+        "cells": cells,
+        "customers": sketch_table(cell_keys, df["CustomerID"].to_numpy(), precision),
+        "invoices": sketch_table(cell_keys, df["InvoiceNo"].astype(str).to_numpy(), precision),
+    }
+
+
+def build_cube(df, customer_segments=None, precision=DEFAULT_PRECISION, parallel=None):
+    """Pré-agrège les transactions par (jour, pays, segment RFM, sens, tranche de prix).
+    Sur un gros historique, une partition de mois par processus : les cellules, triées par jour,
+    se recollent dans l'ordre des mois et les sketches suivent le décalage de leurs cellules."""
+    countries, segments = cube_categories(df, customer_segments)
+    build = partial(_cube_part, customer_segments=customer_segments, countries=countries,
+                    segments=segments, precision=precision)
+    if use_parallel(len(df), parallel):
+        columns = ["InvoiceDate", "Country", "CustomerID", "Quantity", "TotalPrice", "InvoiceNo"]
+        parts = map_partitions(build, month_partitions(df[columns])) or [build(df)]
+    else:
+        parts = [build(df)]
+
+    offsets = np.cumsum([0] + [len(part["cells"]) for part in parts[:-1]])
+
+    def _shifted(table):
+        return pd.concat([part[table].assign(cell=part[table]['cell'] + offset)
+                          for part, offset in zip(parts, offsets)], ignore_index=True)
+
+    cells = pd.concat([part["cells"] for part in parts], ignore_index=True)
+    cells['month'] = cells['day'].to_numpy().astype('datetime64[D]').astype('datetime64[M]').astype(np.int32)
+    return {
+        "cells": cells,
+        "countries": list(countries),
+        "segments": list(segments),
+        "customers": _shifted("customers"),
+        "invoices": _shifted("invoices"),
+        "precision": precision,
+    }
+
+
+# ============================
+# 📌 REQUÊTES
+# ============================
+def _day_key(date):
+    return np.datetime64(date, "D").astype(np.int32)
+
+
+def select_cells(cube, start_date, end_date, country=ALL, threshold=0.0,
+                 returns_mode="Inclure", segment=ALL):
+    """Masque des cellules retenues, ou None si un filtre n'est pas servable par le cube"""
+    threshold_bucket = np.flatnonzero(PRICE_EDGES == threshold)
+    if len(threshold_bucket) == 0:
+        return None
+    # Les lignes >= seuil sont celles des tranches au-dessus de la borne
+    min_bucket = threshold_bucket[0] + 1
+
+    cells = cube["cells"]
+    day = cells['day'].to_numpy()
+    sign = cells['sign'].to_numpy()
+    mask = (day >= _day_key(start_date)) & (day <= _day_key(end_date))
+    mask &= (cells['bucket'].to_numpy() >= min_bucket) | (sign < 0)
+
+    if country != ALL:
+        code = cube["countries"].index(country) if country in cube["countries"] else -2
+        mask &= cells['country'].to_numpy() == code
+    if segment != ALL:
+        code = cube["segments"].index(segment) if segment in cube["segments"] else -2
+        mask &= cells['segment'].to_numpy() == code
+    if returns_mode == "Exclure":
+        mask &= sign > 0
+    return mask
+
+
+def query_overview(cube, start_date, end_date, country=ALL, threshold=0.0,
+                   returns_mode="Inclure", segment=ALL):
+    """KPIs de la vue d'ensemble + CA par mois / trimestre, depuis le cube.
+    Renvoie None quand il faut retomber sur les lignes brutes."""
+    mask = select_cells(cube, start_date, end_date, country, threshold, returns_mode, segment)
+    if mask is None:
+        return None
+
+    cells = cube["cells"][mask]
+    revenue = cells['revenue'].where(cells['sign'] >= 0, 0.0) if returns_mode == "Neutraliser" else cells['revenue']
+    selected = cells.index.to_numpy()
+    precision = cube["precision"]
+
+    customers = cube["customers"]
+    customers = customers[np.isin(customers['cell'].to_numpy(), selected)]
+    invoices = cube["invoices"]
+    invoices = invoices[np.isin(invoices['cell'].to_numpy(), selected)]
+    invoices = invoices.assign(month=cube["cells"]['month'].to_numpy()[invoices['cell'].to_numpy()])
+
+    months = cells['month'].to_numpy()
+    by_month = revenue.groupby(months).sum()
+    by_quarter = revenue.groupby(months // 3).sum()
+    invoices_by_month = estimate_by(invoices, 'month', precision) if len(invoices) else pd.Series(dtype=float)
+
+    return {
+        "total_revenue": revenue.sum(),
+        "n_customers": int(round(estimate(dense_registers(customers, precision), precision))),
+        "n_tx": int(cells['lines'].sum()),
+        "revenue_by_month": by_month.rename_axis("Month").rename("TotalPrice"),
+        "revenue_by_quarter": by_quarter.rename_axis("Quarter").rename("TotalPrice"),
+        "north_star": invoices_by_month.mean(),
+    }
+
+
+def _overview_part(df):
+    """KPIs partiels d'une partition de mois (factures en codes entiers)"""
+    return {
+        "revenue_by_month": df.groupby("Month")["TotalPrice"].sum(),
+        "invoices_by_month": df.groupby("Month")["invoice"].nunique(),
+        "customers": np.unique(df["CustomerID"].to_numpy()),
+        "n_tx": len(df),
+    }
+
+
+def overview_from_rows(df_f, parallel=None):
+    """Repli exact sur les lignes filtrées (même format que query_overview).
+    En parallèle : partitions de mois, CA et factures par mois concaténés, clients fusionnés par union."""
+    if not use_parallel(len(df_f), parallel):
+        return {
+            "total_revenue": df_f["TotalPrice"].sum(),
+            "n_customers": df_f["CustomerID"].nunique(),
+            "n_tx": len(df_f),
+            "revenue_by_month": df_f.groupby("Month")["TotalPrice"].sum(),
+            "revenue_by_quarter": df_f.groupby("Quarter")["TotalPrice"].sum(),
+            "north_star": df_f.groupby("Month")["InvoiceNo"].nunique().mean(),
+        }
+
+    frame = pd.DataFrame({
+        "Month": df_f["Month"].to_numpy(),
+        "TotalPrice": df_f["TotalPrice"].to_numpy(),
+        "CustomerID": df_f["CustomerID"].to_numpy(),
+        "invoice": df_f["InvoiceNo"].astype("category").cat.codes.to_numpy(),
+    })
+    parts = map_partitions(_overview_part, month_partitions(frame))
+    by_month = merge_disjoint([part["revenue_by_month"] for part in parts])
+    return {
+        "total_revenue": by_month.sum(),
+        "n_customers": len(merge_distinct([part["customers"] for part in parts])),
+        "n_tx": sum(part["n_tx"] for part in parts),
+        "revenue_by_month": by_month,
+        # Ordinal de trimestre = ordinal de mois // 3
+        "revenue_by_quarter": by_month.groupby(by_month.index // 3).sum().rename_axis("Quarter"),
+        "north_star": merge_disjoint([part["invoices_by_month"] for part in parts]).mean(),
+    }
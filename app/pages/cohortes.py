@@ -5,15 +5,25 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import io
 
+from data_store import PAGE_COLUMNS, decode_periods
 from utils import (
-    compute_cohort_matrix,
+    load_cohort_matrix,
     load_data,
     plot_retention_heatmap,
     densite,
     plot_retention_curves,
     plot_average_retention,
-    add_download_button
+    add_download_button,
+    exact_counts_toggle,
+    load_distinct_sketches,
+    load_customer_features,
+    load_stream_summary,
+    begin_profile,
+    end_profile,
 )
+from sketches import count_from_sketches
+from profiling import stage
+from streaming import STREAMING, preview_transactions
 
 # ------------------------------------------------
 # CONFIG PAGE
@@ -134,7 +144,14 @@ def show_cohort_page():
     # ---------------------------
     # LOAD DATA
     # ---------------------------
-    df = load_data()
+    if STREAMING:
+        # Mode hors mémoire : aperçu lu en tête du parquet, KPIs tirés du résumé par blocs
+        st.info("Mode hors mémoire : agrégats calculés bloc par bloc, comptages exacts.")
+        df = preview_transactions(columns=PAGE_COLUMNS["cohortes"])
+        exact_counts = True
+    else:
+        df = load_data(PAGE_COLUMNS["cohortes"])
+        exact_counts = exact_counts_toggle()
 
     # Bulle Aperçu données + stats de base
     st.markdown(
@@ -148,14 +165,27 @@ def show_cohort_page():
         unsafe_allow_html=True,
     )
 
-    with st.expander("Voir un aperçu des données brutes (100 premières lignes)"):
-        st.dataframe(df.head(100), use_container_width=True)
+    with st.expander("Voir un aperçu des données brutes (100 premières lignes)"), stage("apercu"):
+        st.dataframe(decode_periods(df.head(100)), use_container_width=True)
 
     # Quelques KPIs simples (si les colonnes existent)
     if "CustomerID" in df.columns and "InvoiceNo" in df.columns:
-        n_clients = df["CustomerID"].nunique()
-        n_orders = df["InvoiceNo"].nunique()
-        if "TotalPrice" in df.columns:
+        with stage("kpis_distincts"):
+            if STREAMING:
+                summary = load_stream_summary()
+                n_clients = len(summary["features"])
+                n_orders = summary["n_invoices"]
+            elif exact_counts:
+                # Une ligne par client dans le feature store : pas de nunique sur les clients
+                n_clients = len(load_customer_features())
+                n_orders = df["InvoiceNo"].nunique()
+            else:
+                # Sketches pré-calculés par cohorte, fusionnés à la volée
+                n_clients = count_from_sketches(load_distinct_sketches(PAGE_COLUMNS["cohortes"], "CustomerID", ("Cohort",)))
+                n_orders = count_from_sketches(load_distinct_sketches(PAGE_COLUMNS["cohortes"], "InvoiceNo", ("Cohort",)))
+        if STREAMING:
+            ca_total = load_stream_summary()["overview"]["total_revenue"]
+        elif "TotalPrice" in df.columns:
             ca_total = df["TotalPrice"].sum()
         elif "Total" in df.columns:
             ca_total = df["Total"].sum()
@@ -184,7 +214,7 @@ def show_cohort_page():
         unsafe_allow_html=True,
     )
 
-    cohort_matrix = compute_cohort_matrix(df)
+    cohort_matrix = load_cohort_matrix(PAGE_COLUMNS["cohortes"], exact=exact_counts)
     plot_retention_heatmap(cohort_matrix)
 
     st.markdown("</div>", unsafe_allow_html=True)
@@ -203,7 +233,7 @@ def show_cohort_page():
         unsafe_allow_html=True,
     )
 
-    densite(df)
+    densite(PAGE_COLUMNS["cohortes"])
 
     st.markdown("</div>", unsafe_allow_html=True)
 
@@ -246,4 +276,6 @@ def show_cohort_page():
 
 # Entrée
 if __name__ == "__main__":
+    begin_profile("cohortes")
     show_cohort_page()
+    end_profile()
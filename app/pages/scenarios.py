@@ -2,6 +2,20 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.express as px
+import plotly.graph_objects as go
+
+from clv_engine import clv_grid, pooled_means, segment_means, sensitivity_grid, tornado
+from clv_montecarlo import LAWS, clv_intervals, simulate_clv
+from clv_models import score_customers
+from profiling import stage
+from utils import (
+    load_clv_aggregates,
+    load_clv_bootstrap,
+    load_clv_model,
+    load_customer_segments,
+    begin_profile,
+    end_profile,
+)
 
 # ------------------------------------------------
 # CONFIG PAGE
@@ -98,27 +112,10 @@ def _kpi(label, value):
     """
 
 # ------------------------------------------------
-# LOAD DATA
+# GRILLES DE SENSIBILITÉ
 # ------------------------------------------------
-@st.cache_data
-def load_rfm():
-    df = pd.read_csv("data/processed/df_rfm_resultat.csv")
-    df["Date_Premier_Achat"] = pd.to_datetime(df["Date_Premier_Achat"])
-    return df
-
-def label_rfm(percent):
-    if percent >= 400: return "Champions"
-    elif percent >= 300: return "Fidèles"
-    elif percent >= 200: return "Potentiels"
-    elif percent >= 120: return "À Risque"
-    else: return "Perdus"
-
-def calculate_clv(aov, freq, lifespan_years):
-    return aov * freq * lifespan_years
-
-def compute_lifespan_years(df):
-    days = (pd.Timestamp.today() - df["Date_Premier_Achat"]).dt.days
-    return (days / 365).mean()
+RETENTION_GRID = np.linspace(0.1, 0.99, 90)
+DISCOUNT_GRID = np.linspace(0.0, 0.8, 81)
 
 
 # ------------------------------------------------
@@ -139,17 +136,17 @@ def show_scenarios():
     </div>
     """, unsafe_allow_html=True)
 
-    df = load_rfm()
-    df["Segment_RFM"] = df["RFM_Pourcentage"].apply(label_rfm)
+    # Sommes par segment : chaque sélection / point de grille se calcule sans refiltrer les clients
+    aggregates = load_clv_aggregates()
+    segments = aggregates.index.tolist()
 
     # ---------------------------
     # BASE METRICS
     # ---------------------------
-    aov = df["Monetaire_Total_Depense"].mean()
-    freq = df["Frequence_Nb_Commandes"].mean()
-    lifespan = compute_lifespan_years(df)
+    base = pooled_means(aggregates)
+    lifespan = base["lifespan"]
 
-    clv_baseline = calculate_clv(aov, freq, lifespan)
+    clv_baseline = float(clv_grid(**base))
 
     # ------------------------------------------------
     # SIDEBAR
@@ -164,24 +161,24 @@ def show_scenarios():
 
         segments_selected = st.multiselect(
             "🎯 Segments ciblés",
-            df["Segment_RFM"].unique(),
-            default=df["Segment_RFM"].unique().tolist()
+            segments,
+            default=segments
         )
 
-    df_filtered = df[df["Segment_RFM"].isin(segments_selected)]
-
-    if df_filtered.empty:
+    if not segments_selected:
         st.error("Aucun client dans cette sélection.")
         return
 
     # ------------------------------------------------
     # SCENARIO CALCUL
     # ------------------------------------------------
-    aov_new = df_filtered["Monetaire_Total_Depense"].mean() * (1 - remise/100)
-    freq_new = df_filtered["Frequence_Nb_Commandes"].mean()
+    # AOV / fréquence de la sélection, durée de vie de l'ensemble des clients
+    selection = dict(pooled_means(aggregates, segments_selected), lifespan=lifespan)
+    aov_new = selection["aov"] * (1 - remise/100)
+    freq_new = selection["freq"]
     lifespan_new = lifespan * (retention/100)
 
-    clv_scenario = calculate_clv(aov_new, freq_new, lifespan_new)
+    clv_scenario = float(clv_grid(**selection, discount=remise/100, retention=retention/100))
     impact_pct = ((clv_scenario - clv_baseline) / clv_baseline) * 100
 
     # ------------------------------------------------
@@ -214,10 +211,7 @@ def show_scenarios():
     """, unsafe_allow_html=True)
 
     retention_range = np.linspace(0.1, 0.99, 12)
-    clv_sensitivity = [
-        calculate_clv(aov_new, freq_new, lifespan * r)
-        for r in retention_range
-    ]
+    clv_sensitivity = sensitivity_grid(selection, {"retention": retention_range}, discount=remise/100)
 
     fig = px.line(
         x=retention_range * 100,
@@ -236,6 +230,155 @@ def show_scenarios():
     st.plotly_chart(fig, use_container_width=True)
     st.markdown("</div>", unsafe_allow_html=True)
 
+    # ------------------------------------------------
+    # SENSITIVITY MAPS (grille vectorisée)
+    # ------------------------------------------------
+    st.markdown("""
+    <div class="section-bubble">
+        <div class="section-header">
+            <div class="section-pill">Analyse</div>
+            <div class="section-title">🗺️ Cartes de sensibilité (CLV nette)</div>
+        </div>
+        <p style='color:#9ca3af'>CLV après marge brute et actualisation, sur toute la grille de paramètres.</p>
+    """, unsafe_allow_html=True)
+
+    net = {"margin": marge/100, "rate": taux_actualisation/100}
+    tab_rd, tab_seg, tab_tornado = st.tabs(["Rétention × Remise", "Segment × Rétention", "Tornado"])
+
+    with tab_rd, stage("grille_retention_remise"):
+        grid = sensitivity_grid(selection, {"retention": RETENTION_GRID, "discount": DISCOUNT_GRID}, **net)
+        fig = px.imshow(
+            grid,
+            x=DISCOUNT_GRID * 100,
+            y=RETENTION_GRID * 100,
+            origin="lower",
+            aspect="auto",
+            color_continuous_scale="Blues",
+            labels={"x": "Remise (%)", "y": "Rétention (%)", "color": "CLV (€)"},
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+    with tab_seg, stage("grille_segment_retention"):
+        by_segment = segment_means(aggregates)
+        by_segment["lifespan"] = np.full(len(segments), lifespan)
+        grid = sensitivity_grid(by_segment, {"retention": RETENTION_GRID}, discount=remise/100, **net)
+        fig = px.imshow(
+            grid,
+            x=RETENTION_GRID * 100,
+            y=segments,
+            aspect="auto",
+            color_continuous_scale="Blues",
+            labels={"x": "Rétention (%)", "y": "Segment", "color": "CLV (€)"},
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+    with tab_tornado, stage("tornado"):
+        # ±10 points autour des valeurs de la sidebar
+        current = {"margin": marge/100, "discount": remise/100, "retention": retention/100,
+                   "rate": taux_actualisation/100}
+        ranges = {name: (max(value - 0.1, 0.0), min(value + 0.1, 1.0)) for name, value in current.items()}
+        impacts, clv_net = tornado(selection, ranges, **current)
+        labels = impacts["Paramètre"].map({"margin": "Marge", "discount": "Remise",
+                                           "retention": "Rétention", "rate": "Taux d'actualisation"})
+        fig = go.Figure([
+            go.Bar(y=labels, x=impacts["Bas"], orientation="h", name="-10 pts", marker_color="#f28e2b"),
+            go.Bar(y=labels, x=impacts["Haut"], orientation="h", name="+10 pts", marker_color="#4e79a7"),
+        ])
+        fig.update_layout(barmode="overlay", xaxis_title=f"Écart de CLV nette (€) autour de {clv_net:,.2f} €")
+        st.plotly_chart(fig, use_container_width=True)
+
+    st.markdown("</div>", unsafe_allow_html=True)
+
+    # ------------------------------------------------
+    # MONTE CARLO (incertitude)
+    # ------------------------------------------------
+    st.markdown("""
+    <div class="section-bubble">
+        <div class="section-header">
+            <div class="section-pill">Incertitude</div>
+            <div class="section-title">🎲 CLV nette – intervalles Monte Carlo</div>
+        </div>
+        <p style='color:#9ca3af'>Clients rééchantillonnés par segment, rétention / marge / remise tirées autour des valeurs de la sidebar.</p>
+    """, unsafe_allow_html=True)
+
+    with st.expander("⚙️ Paramètres de simulation", expanded=False):
+        m1, m2, m3 = st.columns(3)
+        law = m1.selectbox("Loi des paramètres", LAWS)
+        n_simulations = m2.select_slider("Simulations", [10_000, 50_000, 100_000, 500_000, 1_000_000], value=100_000)
+        seed = m3.number_input("Graine", min_value=0, value=42, step=1)
+        s1, s2, s3 = st.columns(3)
+        spread_retention = s1.slider("Incertitude rétention (± pts)", 0.0, 20.0, 5.0)
+        spread_margin = s2.slider("Incertitude marge (± pts)", 0.0, 20.0, 5.0)
+        spread_discount = s3.slider("Incertitude remise (± pts)", 0.0, 20.0, 2.0)
+
+    boot = load_clv_bootstrap(seed=int(seed))
+    with stage("simulate_clv"):
+        simulations = simulate_clv(
+            boot,
+            lifespan,
+            retention=(law, retention/100, spread_retention/100),
+            margin=(law, marge/100, spread_margin/100),
+            discount=(law, remise/100, spread_discount/100),
+            rate=taux_actualisation/100,
+            n_simulations=n_simulations,
+            seed=int(seed),
+        )
+        intervals = clv_intervals(boot, simulations)
+    intervals = intervals[intervals["Segment"].isin(segments_selected)]
+
+    low_col, high_col = intervals.columns[-2], intervals.columns[-1]
+    fig = px.bar(
+        intervals,
+        x="Segment",
+        y="CLV moyenne",
+        error_y=intervals[high_col] - intervals["CLV moyenne"],
+        error_y_minus=intervals["CLV moyenne"] - intervals[low_col],
+        labels={"CLV moyenne": "CLV nette (€)"},
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    st.dataframe(intervals.round(2), use_container_width=True, hide_index=True)
+
+    st.markdown("</div>", unsafe_allow_html=True)
+
+    # ------------------------------------------------
+    # CLV PRÉDICTIVE (BG/NBD + Gamma-Gamma)
+    # ------------------------------------------------
+    st.markdown("""
+    <div class="section-bubble">
+        <div class="section-header">
+            <div class="section-pill">Modèle</div>
+            <div class="section-title">🔮 CLV prédictive par client (BG/NBD + Gamma-Gamma)</div>
+        </div>
+        <p style='color:#9ca3af'>Achats futurs et panier attendus ajustés sur l'historique de chaque client, marge et actualisation de la sidebar.</p>
+    """, unsafe_allow_html=True)
+
+    model = load_clv_model()
+    horizon = st.slider("Horizon de prédiction (mois)", 3, 36, 12, 3)
+    with stage("score_customers"):
+        scores = score_customers(model["summary"], model["params"], horizon, marge/100, taux_actualisation/100)
+    scores["Segment"] = load_customer_segments().reindex(scores.index).to_numpy()
+    scores = scores[scores["Segment"].isin(segments_selected)]
+
+    p1, p2, p3 = st.columns(3)
+    p1.markdown(_kpi("CLV prédite moyenne", f"{scores['clv'].mean():,.2f} €"), unsafe_allow_html=True)
+    p2.markdown(_kpi("Achats attendus / client", f"{scores['expected_purchases'].mean():,.2f}"), unsafe_allow_html=True)
+    p3.markdown(_kpi("Probabilité d'activité", f"{scores['p_alive'].mean():.1%}"), unsafe_allow_html=True)
+
+    by_segment = scores.groupby("Segment", observed=True).agg(
+        Clients=("clv", "size"),
+        CLV_predite=("clv", "mean"),
+        CLV_totale=("clv", "sum"),
+        Achats_attendus=("expected_purchases", "mean"),
+        Panier_attendu=("expected_value", "mean"),
+        Proba_active=("p_alive", "mean"),
+    )
+    st.dataframe(by_segment.round(2), use_container_width=True)
+
+    with st.expander("Paramètres ajustés", expanded=False):
+        st.json(model["params"])
+
+    st.markdown("</div>", unsafe_allow_html=True)
+
     # ------------------------------------------------
     # SUMMARY TABLE
     # ------------------------------------------------
@@ -259,4 +402,6 @@ def show_scenarios():
 
 
 # RUN PAGE
+begin_profile("scenarios")
 show_scenarios()
+end_profile()
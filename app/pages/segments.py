@@ -6,8 +6,12 @@ from utils import (
     format_segment_table,
     compute_scenario,
     plot_scenario_chart,
-    export_figure_png
+    show_figure,
+    begin_profile,
+    end_profile,
 )
+from profiling import stage
+from render_cache import data_hash
 
 # ------------------------------------------------
 # CONFIG PAGE
@@ -87,6 +91,7 @@ st.markdown(
 # ------------------------------------------------
 # DATA
 # ------------------------------------------------
+begin_profile("segments")
 df_rfm = load_rfm()
 df_rfm = add_rfm_segment(df_rfm)
 
@@ -133,7 +138,8 @@ part_clients = col_p.slider("Part de clients activés (%)", 0, 100, 50, 5)
 uplift_ca = col_u.slider("Uplift de CA (%)", 0, 200, 20, 5)
 
 seg_row = seg_table[seg_table['Segment'] == segment_cible].iloc[0]
-results = compute_scenario(seg_row, taux_marge, part_clients, uplift_ca)
+with stage("compute_scenario"):
+    results = compute_scenario(seg_row, taux_marge, part_clients, uplift_ca)
 
 # CHART
 st.subheader("Répartition du CA : base + CA additionnel (k€)")
@@ -141,16 +147,13 @@ st.subheader("Répartition du CA : base + CA additionnel (k€)")
 col_l, col_center, col_r = st.columns([1, 2, 1])
 
 with col_center:
-    fig = plot_scenario_chart(results["ca_base"], results["ca_incremental"])
-    st.pyplot(fig)
-
-    # Export
-    buffer = export_figure_png(fig)
-    st.download_button(
-        label="📥 Télécharger le graphique (PNG)",
-        data=buffer,
-        file_name=f"scenario_{segment_cible}.png",
-        mime="image/png"
+    ca_base, ca_incremental = results["ca_base"], results["ca_incremental"]
+    show_figure(
+        "scenario",
+        lambda: plot_scenario_chart(ca_base, ca_incremental),
+        data_hash(ca_base, ca_incremental),
+        filename=f"scenario_{segment_cible}.png",
+        transparent=False,
     )
 
 # KPI
@@ -166,3 +169,5 @@ d1.metric("Marge base", f"{results['marge_base']:,.0f}")
 d2.metric("Marge additionnelle", f"{results['marge_incrementale']:,.0f}")
 
 st.markdown("</div>", unsafe_allow_html=True)
+
+end_profile()
@@ -0,0 +1,107 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from data_store import period_codes
+
+# En dessous, on agrège dans le processus courant (découper et envoyer les partitions coûte plus cher)
+PARALLEL_THRESHOLD = 1_000_000
+MAX_WORKERS = int(os.environ.get("RETAIL_AGG_WORKERS", os.cpu_count() or 1))
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def use_parallel(n_rows, parallel=None):
+    """Décision série / parallèle : explicite, sinon selon la taille et le nombre de cœurs"""
+    if parallel is None:
+        return n_rows >= PARALLEL_THRESHOLD and MAX_WORKERS > 1
+    return parallel
+
+
+# ============================
+# 📌 PARTITIONS
+# ============================
+def _split(df, part, n_parts):
+    """Une partition par numéro, lignes dans l'ordre d'origine ; les partitions vides sont omises"""
+    order = np.argsort(part, kind="stable")
+    bounds = np.searchsorted(part[order], np.arange(n_parts + 1))
+    return [df.take(order[lo:hi]) for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+
+
+def month_partitions(df, n_parts=None):
+    """Mois consécutifs regroupés en n_parts partitions de tailles proches.
+    Tout ce qui est propre à un mois (CA, factures du mois) tombe dans une seule partition."""
+    n_parts = n_parts or MAX_WORKERS
+    months = df["Month"].to_numpy() if "Month" in df.columns else period_codes(df["InvoiceDate"], "M")
+    _, inverse, counts = np.unique(months, return_inverse=True, return_counts=True)
+    rows_before = np.cumsum(counts) - counts
+    month_part = np.minimum(rows_before * n_parts // max(len(df), 1), n_parts - 1)
+    return _split(df, month_part[inverse], n_parts)
+
+
+def customer_partitions(df, n_parts=None):
+    """Partitions par hachage de CustomerID : toutes les lignes d'un client dans une seule partition"""
+    n_parts = n_parts or MAX_WORKERS
+    customers = (df["CustomerID"] if "CustomerID" in df.columns else df["Customer ID"]).to_numpy()
+    return _split(df, customers.astype(np.int64) % n_parts, n_parts)
+
+
+# ============================
+# 📌 EXÉCUTION
+# ============================
+def _pool():
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ProcessPoolExecutor(max_workers=MAX_WORKERS)
+        return _POOL
+
+
+def set_workers(n_workers):
+    """Change le nombre de processus (benchmarks) ; le pool sera recréé à la prochaine utilisation"""
+    global MAX_WORKERS, _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown()
+            _POOL = None
+        MAX_WORKERS = n_workers
+
+
+def map_partitions(func, parts, parallel=True):
+    """Agrégat partiel de chaque partition ; `func` doit être une fonction de module (picklable)"""
+    if parallel and len(parts) > 1:
+        return list(_pool().map(func, parts))
+    return [func(part) for part in parts]
+
+
+# ============================
+# 📌 FUSION DES PARTIELS
+# ============================
+def merge_sums(partials):
+    """Sommes et comptages : addition des partiels, clé par clé"""
+    partials = [p for p in partials if len(p)]
+    if not partials:
+        return pd.Series(dtype=np.int64)
+    merged = pd.concat(partials)
+    return merged.groupby(level=list(range(merged.index.nlevels))).sum()
+
+
+def merge_aggregates(partials, how):
+    """Fusion colonne par colonne de tables indexées par clé ; how : dict colonne -> 'min', 'max' ou 'sum'"""
+    return pd.concat(partials).groupby(level=0).agg(how)
+
+
+def merge_distinct(partials):
+    """Ensembles de valeurs distinctes : union (tableaux triés et uniques)"""
+    if not partials:
+        return np.empty(0)
+    return np.unique(np.concatenate(partials))
+
+
+def merge_disjoint(partials):
+    """Partiels sans clé commune (partitions par client ou par mois) : simple concaténation"""
+    return pd.concat(partials).sort_index()
@@ -0,0 +1,38 @@
+"""Pipeline ETL : Excel brut -> parquet nettoyé + table RFM du dashboard.
+
+Remplace l'exécution manuelle de notebooks/01_exploration.ipynb :
+
+    python -m app.pipeline build
+"""
+from .etl import (
+    read_raw,
+    clean_transactions,
+    add_cohorts,
+    compute_rfm,
+    score_rfm,
+    write_clean_parquet,
+    write_partitions,
+    run_pipeline,
+)
+from .rfm_incremental import (
+    empty_rfm_state,
+    fold_transactions,
+    rfm_table,
+    load_rfm_state,
+    save_rfm_state,
+    update_rfm,
+)
+from .customer_features import (
+    empty_features_state,
+    fold_customer_features,
+    features_table,
+    customer_features,
+    rfm_from_features,
+    load_features_state,
+    save_features_state,
+    update_features,
+)
+from .synthetic import (
+    generate_transactions,
+    write_synthetic,
+)
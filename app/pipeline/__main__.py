@@ -0,0 +1,80 @@
+import argparse
+
+import pandas as pd
+
+from .etl import RAW_XLSX, RAW_CACHE, CLEAN_PATH, RFM_PATH, PARTITIONS_DIR, run_pipeline
+from .rfm_incremental import STATE_DIR, update_rfm
+from .customer_features import FEATURES_PATH, update_features
+from .synthetic import SYNTHETIC_DIR, CHUNK_ROWS, write_synthetic
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.pipeline",
+                                     description="Reconstruit les données du dashboard")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Excel brut -> parquet nettoyé + table RFM")
+    build.add_argument("--xlsx", default=RAW_XLSX)
+    build.add_argument("--cache", default=RAW_CACHE)
+    build.add_argument("--clean", default=CLEAN_PATH)
+    build.add_argument("--rfm", default=RFM_PATH)
+    build.add_argument("--partitions", default=PARTITIONS_DIR)
+    build.add_argument("--no-partitions", action="store_true", help="N'écrit pas la copie partitionnée par mois")
+    build.add_argument("--state", default=STATE_DIR, help="Dossier de l'état incrémental (features et RFM)")
+    build.add_argument("--refresh", action="store_true", help="Relit l'Excel même si le cache parquet est à jour")
+    build.add_argument("--features", default=FEATURES_PATH, help="Table de features par client (parquet)")
+
+    rfm = sub.add_parser("rfm-update", help="Intègre un lot de nouvelles transactions dans la table RFM")
+    rfm.add_argument("batch", help="Parquet de transactions nettoyées (mêmes colonnes que le parquet propre)")
+    rfm.add_argument("--state", default=STATE_DIR)
+    rfm.add_argument("--rfm", default=RFM_PATH)
+    rfm.add_argument("--features", default=FEATURES_PATH)
+
+    features = sub.add_parser("features-update", help="Intègre un lot de nouvelles transactions dans la table de features")
+    features.add_argument("batch", help="Parquet de transactions nettoyées (mêmes colonnes que le parquet propre)")
+    features.add_argument("--state", default=STATE_DIR)
+    features.add_argument("--features", default=FEATURES_PATH)
+
+    synthetic = sub.add_parser("synthetic", help="Génère un jeu de transactions synthétique (tests de charge)")
+    synthetic.add_argument("--rows", type=int, default=10_000_000, help="Nombre de lignes visé (approximatif)")
+    synthetic.add_argument("--seed", type=int, default=0)
+    synthetic.add_argument("--out", default=SYNTHETIC_DIR, help="Dossier partitionné (ou fichier avec --single)")
+    synthetic.add_argument("--single", action="store_true", help="Un seul parquet, lisible tel quel par le dashboard")
+    synthetic.add_argument("--rfm", help="Écrit aussi la table RFM scorée des clients synthétiques")
+    synthetic.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="Lignes par bloc (borne la mémoire)")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        timings = run_pipeline(
+            xlsx_path=args.xlsx,
+            cache_path=args.cache,
+            clean_path=args.clean,
+            rfm_path=args.rfm,
+            partitions_dir=None if args.no_partitions else args.partitions,
+            state_dir=args.state,
+            refresh=args.refresh,
+            features_path=args.features,
+        )
+        for step, seconds in timings.items():
+            print(f"{step:<12} {seconds:8.2f} s")
+        print(f"{'total':<12} {sum(timings.values()):8.2f} s")
+
+    elif args.command == "rfm-update":
+        df_rfm = update_rfm(pd.read_parquet(args.batch), state_dir=args.state, rfm_path=args.rfm,
+                            features_path=args.features)
+        print(f"{len(df_rfm):,} clients scorés -> {args.rfm}")
+
+    elif args.command == "features-update":
+        features = update_features(pd.read_parquet(args.batch), state_dir=args.state, features_path=args.features)
+        print(f"{len(features):,} clients -> {args.features}")
+
+    elif args.command == "synthetic":
+        stats = write_synthetic(args.rows, out=args.out, seed=args.seed, single_file=args.single,
+                                rfm_path=args.rfm, chunk_rows=args.chunk_rows)
+        print(f"{stats['rows']:,} lignes ({stats['returns']:,} retours) en {stats['chunks']} blocs, "
+              f"{stats['files']} fichier(s) -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
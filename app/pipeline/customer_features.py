@@ -0,0 +1,279 @@
+import glob
+import hashlib
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from .etl import RFM_COLUMNS, month_ordinals, score_rfm
+
+FEATURES_PATH = "data/processed/customer_features.parquet"
+FEATURES_STATE_DIR = "data/processed/features_state"
+
+# Compteurs cumulés par client : se fusionnent lot après lot (min / max / sommes / pays du premier achat)
+COUNTER_COLUMNS = ['first', 'last', 'invoices', 'lines', 'revenue', 'returned_lines', 'returned_value',
+                   'active_months', 'country']
+# Colonnes d'un lot qui identifient son contenu (détection d'un lot rejoué)
+FINGERPRINT_COLUMNS = ['Invoice', 'InvoiceDate', 'Customer ID', 'Quantity', 'TotalPrice']
+SUM_COLUMNS = ['invoices', 'lines', 'revenue', 'returned_lines', 'returned_value', 'active_months']
+
+# Un couple (client, mois) est encodé dans un seul int64 : client << 20 | mois (même codage que cohort_state)
+_MONTH_BITS = 20
+# Code d'une facture : lettre de préfixe (avoir « C »...) × 10**12 + numéro
+_INVOICE_DIGITS = 10 ** 12
+# Un couple (client, facture) tient sur deux int64 gros-boutistes, vus comme une clé de 16 octets triable
+_PAIR_DTYPE = np.dtype('V16')
+
+FEATURE_COLUMNS = [
+    'first', 'last', 'invoices', 'lines', 'revenue', 'returned_lines', 'returned_value',
+    'aov', 'tenure_days', 'active_months', 'cohort', 'country',
+]
+
+
+# ============================
+# 📌 ÉTAT CUMULÉ PAR CLIENT
+# ============================
+def empty_features_state():
+    """État vide : compteurs par client, clés triées des couples (client, facture) et (client, mois)
+    déjà vus, empreintes des lots intégrés. Les clés ajoutées depuis la dernière sauvegarde sont gardées
+    à part pour n'écrire que la nouveauté."""
+    customers = pd.DataFrame({
+        'first': pd.Series(dtype='datetime64[ns]'),
+        'last': pd.Series(dtype='datetime64[ns]'),
+        'invoices': pd.Series(dtype='int64'),
+        'lines': pd.Series(dtype='int64'),
+        'revenue': pd.Series(dtype='float64'),
+        'returned_lines': pd.Series(dtype='int64'),
+        'returned_value': pd.Series(dtype='float64'),
+        'active_months': pd.Series(dtype='int64'),
+        'country': pd.Series(dtype='object'),
+    })
+    customers.index = pd.Index([], dtype='int64', name='Customer ID')
+    return {"customers": customers, "invoices": np.empty(0, dtype=_PAIR_DTYPE), "months": np.empty(0, dtype=np.int64),
+            "batches": set(), "pending": {"invoices": [], "months": [], "batches": []}}
+
+
+def invoice_codes(invoices):
+    """Code int64 de chaque facture ('489434' -> 489434, 'C489434' -> ord('C') * 10**12 + 489434).
+    Calculé une fois par numéro distinct ; un numéro hors de ce format passe par un hachage 64 bits
+    (code négatif, disjoint des autres)."""
+    values = pd.Categorical(invoices)
+    labels = pd.Series(values.categories.astype(str))
+    parts = labels.str.extract(r'^([A-Za-z]?)(\d{1,12})$')
+    parsed = parts[1].notna().to_numpy()
+
+    codes = np.zeros(len(labels), dtype=np.int64)
+    codes[parsed] = parts[1][parsed].astype(np.int64).to_numpy()
+    prefixed = parsed & (parts[0].fillna('') != '').to_numpy()
+    codes[prefixed] += np.array([ord(letter) for letter in parts[0][prefixed]], dtype=np.int64) * _INVOICE_DIGITS
+    hashed = pd.util.hash_array(labels[~parsed].to_numpy(dtype=object)).view(np.int64)
+    codes[~parsed] = hashed | np.int64(-2 ** 63)
+    return codes[values.codes]
+
+
+def _pair_keys(customers, invoices):
+    """Clés (client, code de facture) de 16 octets : égales si et seulement si les deux codes le sont"""
+    pairs = np.empty((len(customers), 2), dtype='>i8')
+    pairs[:, 0] = customers
+    pairs[:, 1] = invoices
+    return pairs.view(_PAIR_DTYPE).ravel()
+
+
+def batch_fingerprint(batch):
+    """Empreinte du contenu d'un lot (colonnes qui entrent dans les compteurs, indépendante de l'index)"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(pd.util.hash_pandas_object(batch[FINGERPRINT_COLUMNS], index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _batch_partials(batch, customer_id):
+    """Agrégats partiels d'un lot, en un groupby sur l'ordre d'origine des lignes"""
+    returned = batch['Quantity'].to_numpy() < 0
+    total_price = batch['TotalPrice'].to_numpy()
+    lines = pd.DataFrame({
+        'first': batch['InvoiceDate'].to_numpy(),
+        'last': batch['InvoiceDate'].to_numpy(),
+        'lines': 1,
+        'revenue': total_price,
+        'returned_lines': returned.astype(np.int64),
+        'returned_value': np.where(returned, -total_price, 0.0),
+    })
+    partials = lines.groupby(customer_id.to_numpy()).agg({
+        'first': 'min', 'last': 'max', 'lines': 'sum', 'revenue': 'sum',
+        'returned_lines': 'sum', 'returned_value': 'sum',
+    })
+
+    # Pays de la première ligne du client (la plus ancienne, puis la première du lot)
+    first_rows = pd.DataFrame({'Customer ID': customer_id.to_numpy(), 'date': batch['InvoiceDate'].to_numpy()}) \
+        .sort_values('date', kind='stable').drop_duplicates('Customer ID')
+    partials['country'] = pd.Series(batch['Country'].to_numpy()[first_rows.index.to_numpy()],
+                                    index=first_rows['Customer ID'].to_numpy()).astype(str)
+    partials.index.name = 'Customer ID'
+    return partials
+
+
+def _seen(keys, probe):
+    """Masque des clés de `probe` présentes dans l'index trié `keys` (recherche dichotomique, O(lot × log n))"""
+    if len(keys) == 0:
+        return np.zeros(len(probe), dtype=bool)
+    pos = np.searchsorted(keys, probe).clip(max=len(keys) - 1)
+    return keys[pos] == probe
+
+
+def _count_new(state, key, customers, keys):
+    """Nombre de clés jamais vues par client. Les clés nouvelles sont insérées dans l'index trié
+    et mises de côté pour la sauvegarde."""
+    keys, first = np.unique(keys, return_index=True)
+    new = ~_seen(state[key], keys)
+    keys = keys[new]
+    state[key] = np.insert(state[key], np.searchsorted(state[key], keys), keys)
+    state["pending"][key].append(keys)
+    return pd.Series(customers[first[new]]).value_counts()
+
+
+def fold_customer_features(state, batch):
+    """Intègre un lot de transactions nettoyées : compteurs mis à jour pour les seuls clients du lot,
+    couples (client, facture) et (client, mois) sondés dans les index triés, sans relire l'historique.
+    L'état est mis à jour sur place et renvoyé.
+
+    Une facture à cheval sur deux lots n'est comptée qu'une fois, mais les lignes, le CA et les retours
+    d'un lot sont toujours ajoutés : un lot déjà intégré (même contenu) est refusé (ValueError)."""
+    if batch.empty:
+        return state
+
+    fingerprint = batch_fingerprint(batch)
+    if fingerprint in state["batches"]:
+        raise ValueError("Lot déjà intégré dans l'état des features (même contenu) : refusé pour ne pas "
+                         "compter deux fois ses lignes et son CA")
+
+    customer_id = batch['Customer ID'].astype('int64')
+    customers = customer_id.to_numpy()
+    month_keys = (customers << _MONTH_BITS) | month_ordinals(batch['InvoiceDate']).astype(np.int64)
+
+    partials = _batch_partials(batch, customer_id)
+    new_invoices = _count_new(state, "invoices", customers, _pair_keys(customers, invoice_codes(batch['Invoice'])))
+    new_months = _count_new(state, "months", customers, month_keys)
+    partials['invoices'] = new_invoices.reindex(partials.index, fill_value=0)
+    partials['active_months'] = new_months.reindex(partials.index, fill_value=0)
+
+    customers = state["customers"]
+    if customers.empty:
+        customers = partials[COUNTER_COLUMNS]
+    else:
+        # Seuls les clients du lot sont relus ; le pays est celui du premier achat le plus ancien
+        known = customers.reindex(partials.index)
+        keep_known = (known['first'] <= partials['first']).to_numpy()
+        merged = pd.DataFrame({
+            'first': known['first'].where(keep_known, partials['first']),
+            'last': known['last'].where(known['last'] >= partials['last'], partials['last']),
+            **{col: (known[col].fillna(0) + partials[col]).astype(partials[col].dtype) for col in SUM_COLUMNS},
+            'country': known['country'].where(keep_known, partials['country']),
+        })[COUNTER_COLUMNS]
+        customers = pd.concat([customers[~customers.index.isin(partials.index)], merged])
+
+    state["customers"] = customers
+    state["batches"].add(fingerprint)
+    state["pending"]["batches"].append(fingerprint)
+    return state
+
+
+def features_table(state):
+    """Table de features par client (une ligne par Customer ID, triée), déduite des compteurs"""
+    features = state["customers"].sort_index()
+    features['aov'] = features['revenue'] / features['invoices'].clip(lower=1)
+    features['tenure_days'] = (features['last'] - features['first']).dt.days
+    features['cohort'] = month_ordinals(features['first']).astype(np.int32)
+    return features[FEATURE_COLUMNS]
+
+
+def customer_features(df):
+    """Table de features calculée en une passe sur des transactions (sans état persistant)"""
+    return features_table(fold_customer_features(empty_features_state(), df))
+
+
+def rfm_from_features(features):
+    """Table RFM scorée, au même format que df_rfm_resultat.csv, sans regrouper les transactions"""
+    # Même date de référence que le notebook : dernière facture connue + 1 jour
+    reference_date = features['last'].max() + pd.Timedelta(days=1)
+    df_rfm = pd.DataFrame({
+        'Customer ID': features.index.to_numpy(),
+        'Recency_Jours': (reference_date - features['last']).dt.days.to_numpy(),
+        'Frequence_Nb_Commandes': features['invoices'].to_numpy(),
+        'Monetaire_Total_Depense': features['revenue'].to_numpy(),
+        'Date_Premier_Achat': features['first'].to_numpy(),
+    })
+    return score_rfm(df_rfm)[RFM_COLUMNS]
+
+
+# ============================
+# 📌 PERSISTANCE
+# ============================
+def _read_keys(state_dir, name):
+    """Clés déjà vues : un fichier trié par sauvegarde, jamais réécrits, fusionnés en un index trié"""
+    paths = sorted(glob.glob(os.path.join(state_dir, name, "*.parquet")))
+    if not paths:
+        return empty_features_state()[name]
+    parts = [pd.read_parquet(path) for path in paths]
+    if name == "invoices":
+        keys = np.concatenate([_pair_keys(part['customer'].to_numpy(), part['invoice'].to_numpy()) for part in parts])
+    else:
+        keys = np.concatenate([part['key'].to_numpy(dtype=np.int64) for part in parts])
+    # Suites déjà triées : le tri stable (timsort) ne fait que les fusionner
+    return np.sort(keys, kind='stable')
+
+
+def _key_frame(keys):
+    """Clés à écrire : deux colonnes int64 pour les couples (client, facture), une pour les mois"""
+    if keys.dtype == _PAIR_DTYPE:
+        pairs = keys.view('>i8').reshape(-1, 2).astype(np.int64)
+        return pd.DataFrame({'customer': pairs[:, 0], 'invoice': pairs[:, 1]})
+    return pd.DataFrame({'key': keys})
+
+
+def save_features_state(state, state_dir=FEATURES_STATE_DIR, reset=False):
+    """Réécrit les compteurs (une ligne par client) et ajoute les seules clés vues depuis la dernière sauvegarde.
+    reset : repart d'un dossier vide (état reconstruit par un build complet)"""
+    if reset and os.path.exists(state_dir):
+        shutil.rmtree(state_dir)
+    os.makedirs(state_dir, exist_ok=True)
+    state["customers"].to_parquet(os.path.join(state_dir, "customers.parquet"))
+    for name in ("invoices", "months"):
+        pending = [part for part in state["pending"][name] if len(part)]
+        if pending:
+            part_dir = os.path.join(state_dir, name)
+            os.makedirs(part_dir, exist_ok=True)
+            part_path = os.path.join(part_dir, f"part-{len(os.listdir(part_dir)):05d}.parquet")
+            _key_frame(np.sort(np.concatenate(pending))).to_parquet(part_path, index=False)
+    with open(os.path.join(state_dir, "batches.txt"), "a") as f:
+        f.writelines(f"{fingerprint}\n" for fingerprint in state["pending"]["batches"])
+    state["pending"] = {"invoices": [], "months": [], "batches": []}
+
+
+def load_features_state(state_dir=FEATURES_STATE_DIR):
+    state = empty_features_state()
+    if not os.path.exists(os.path.join(state_dir, "customers.parquet")):
+        return state
+    state["customers"] = pd.read_parquet(os.path.join(state_dir, "customers.parquet"))
+    for name in ("invoices", "months"):
+        state[name] = _read_keys(state_dir, name)
+    batches_path = os.path.join(state_dir, "batches.txt")
+    if os.path.exists(batches_path):
+        with open(batches_path) as f:
+            state["batches"] = {line.strip() for line in f if line.strip()}
+    return state
+
+
+def write_features(features, path=FEATURES_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    features.to_parquet(path)
+
+
+def update_features(batch, state_dir=FEATURES_STATE_DIR, features_path=FEATURES_PATH):
+    """Charge l'état, intègre le lot, sauvegarde et réécrit la table de features"""
+    state = fold_customer_features(load_features_state(state_dir), batch)
+    save_features_state(state, state_dir)
+    features = features_table(state)
+    if features_path:
+        write_features(features, features_path)
+    return features
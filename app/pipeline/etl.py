@@ -0,0 +1,207 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+RAW_XLSX = "data/raw/online_retail_II.xlsx"
+RAW_CACHE = "data/raw/online_retail_II.parquet"
+CLEAN_PATH = "data/processed/online_retail_clean.parquet"
+PARTITIONS_DIR = "data/processed/online_retail_partitions"
+RFM_PATH = "data/processed/df_rfm_resultat.csv"
+
+RFM_COLUMNS = [
+    'Customer ID',
+    'Monetaire_Total_Depense',
+    'Frequence_Nb_Commandes',
+    'Date_Premier_Achat',
+    'R_Score',
+    'F_Score',
+    'M_Score',
+    'RFM_Somme',
+    'RFM_Pourcentage'
+]
+
+
+# ============================
+# 📌 LECTURE DU FICHIER BRUT
+# ============================
+def read_raw(xlsx_path=RAW_XLSX, cache_path=RAW_CACHE, refresh=False):
+    """Lit les deux feuilles de l'Excel une seule fois, puis sert le cache parquet"""
+    cache_ok = (
+        not refresh
+        and os.path.exists(cache_path)
+        and (not os.path.exists(xlsx_path) or os.path.getmtime(cache_path) >= os.path.getmtime(xlsx_path))
+    )
+    if cache_ok:
+        return pd.read_parquet(cache_path)
+
+    # sheet_name=None : un seul passage dans le classeur pour toutes les feuilles
+    sheets = pd.read_excel(xlsx_path, sheet_name=None)
+    df = pd.concat(sheets.values(), ignore_index=True)
+
+    # Types homogènes pour que le parquet soit écrivable (l'Excel mélange int et str)
+    df['Invoice'] = df['Invoice'].astype(str)
+    df['StockCode'] = df['StockCode'].astype(str)
+    df['Description'] = df['Description'].where(df['Description'].isna(), df['Description'].astype(str))
+
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    df.to_parquet(cache_path, index=False)
+    return df
+
+
+# ============================
+# 📌 NETTOYAGE
+# ============================
+def clean_transactions(df):
+    """Mêmes étapes de nettoyage que le notebook d'exploration"""
+    df = df.drop_duplicates()
+    df = df.dropna(subset=['Customer ID'])
+    df = df.assign(InvoiceDate=pd.to_datetime(df["InvoiceDate"], errors="coerce"))
+    df = df[df['Price'] > 0].copy()
+
+    df["Description"] = df["Description"].astype(str).str.strip()
+    df['TotalPrice'] = df['Price'] * df['Quantity']
+    df['Invoice'] = df['Invoice'].astype(str)
+    df['StockCode'] = df['StockCode'].astype(str)
+    return df
+
+
+# ============================
+# 📌 COHORTES (vectorisé)
+# ============================
+def month_ordinals(dates):
+    """Ordinal de mois (identique à Period('M').ordinal) calculé sans objets Period"""
+    return (dates.dt.year.to_numpy(dtype=np.int64) - 1970) * 12 + dates.dt.month.to_numpy(dtype=np.int64) - 1
+
+
+def add_cohorts(df):
+    """Ajoute MonthYear, Cohort, InvoiceMonth et CohortIndex sur des entiers"""
+    invoice_month = month_ordinals(df['InvoiceDate'])
+    cohort = pd.Series(invoice_month, index=df.index).groupby(df['Customer ID']).transform('min').to_numpy()
+
+    month_period = pd.PeriodIndex.from_ordinals(invoice_month, freq='M')
+    df['MonthYear'] = month_period
+    df['Cohort'] = pd.PeriodIndex.from_ordinals(cohort, freq='M')
+    df['InvoiceMonth'] = month_period
+    df['CohortIndex'] = invoice_month - cohort
+    return df
+
+
+# ============================
+# 📌 RFM (vectorisé)
+# ============================
+def compute_rfm(df):
+    """Métriques RFM brutes : la récence est calculée après le groupby, sans lambda"""
+    customer_id = df['Customer ID'].astype(int)
+    reference_date = df['InvoiceDate'].max() + pd.Timedelta(days=1)
+
+    df_rfm = df.groupby(customer_id).agg(
+        Derniere_Date=('InvoiceDate', 'max'),
+        Frequence_Nb_Commandes=('Invoice', 'nunique'),
+        Monetaire_Total_Depense=('TotalPrice', 'sum'),
+        Date_Premier_Achat=('InvoiceDate', 'min')
+    )
+    df_rfm.insert(0, 'Recency_Jours', (reference_date - df_rfm['Derniere_Date']).dt.days)
+    df_rfm = df_rfm.drop(columns='Derniere_Date')
+    df_rfm.index.name = 'Customer ID'
+    return df_rfm.reset_index()
+
+
+def score_rfm(df_rfm):
+    """Scores R/F/M par quintiles (mêmes règles qcut que le notebook)"""
+    df_rfm['R_Score'] = pd.qcut(
+        df_rfm['Recency_Jours'],
+        5,
+        labels=[1, 2, 3, 4, 5],
+        duplicates='drop'
+    ).astype(int)
+
+    df_rfm['F_Score'] = pd.qcut(
+        df_rfm['Frequence_Nb_Commandes'].rank(method='first'),
+        5,
+        labels=[1, 2, 3, 4, 5],
+        duplicates='drop'
+    ).astype(int)
+
+    df_rfm['M_Score'] = pd.qcut(
+        df_rfm['Monetaire_Total_Depense'].rank(method='first'),
+        5,
+        labels=[1, 2, 3, 4, 5],
+        duplicates='drop'
+    ).astype(int)
+
+    df_rfm['RFM_Somme'] = (
+        df_rfm['R_Score'] +
+        df_rfm['F_Score'] +
+        df_rfm['M_Score']
+    )
+    df_rfm['RFM_Pourcentage'] = ((df_rfm['RFM_Somme'] * 100) / 3).round().astype(int)
+    return df_rfm
+
+
+# ============================
+# 📌 ÉCRITURE DES ARTEFACTS
+# ============================
+def write_clean_parquet(df, path=CLEAN_PATH):
+    """Écrit le parquet propre trié par date, avec un row group par mois"""
+    df = df.sort_values('InvoiceDate', kind='stable').reset_index(drop=True)
+    months = month_ordinals(df['InvoiceDate'])
+    bounds = np.flatnonzero(np.diff(months)) + 1
+    starts = np.concatenate([[0], bounds])
+    ends = np.concatenate([bounds, [len(df)]])
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with pq.ParquetWriter(path, table.schema) as writer:
+        for start, end in zip(starts, ends):
+            writer.write_table(table.slice(start, end - start))
+    return df
+
+
+def write_partitions(df, root=PARTITIONS_DIR):
+    """Écrit une copie partitionnée par mois (dossiers Partition=AAAA-MM)"""
+    part = df.assign(Partition=df['InvoiceDate'].dt.strftime('%Y-%m'))
+    table = pa.Table.from_pandas(part, preserve_index=False)
+    pq.write_to_dataset(table, root_path=root, partition_cols=['Partition'],
+                        existing_data_behavior='delete_matching')
+
+
+def run_pipeline(xlsx_path=RAW_XLSX, cache_path=RAW_CACHE, clean_path=CLEAN_PATH,
+                 rfm_path=RFM_PATH, partitions_dir=PARTITIONS_DIR, state_dir=None, refresh=False,
+                 features_path=None):
+    """Reconstruit tous les artefacts du dashboard et renvoie la durée de chaque étape"""
+    timings = {}
+
+    def _step(name, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        timings[name] = time.perf_counter() - start
+        return result
+
+    raw = _step("lecture", read_raw, xlsx_path, cache_path, refresh)
+    df = _step("nettoyage", clean_transactions, raw)
+    df = _step("cohortes", add_cohorts, df)
+    df_sorted = _step("parquet", write_clean_parquet, df, clean_path)
+    if partitions_dir:
+        _step("partitions", write_partitions, df_sorted, partitions_dir)
+
+    # Feature store client : un seul groupby, d'où se déduit aussi la table RFM.
+    # Il part de l'ordre d'origine : mêmes sommes flottantes que le notebook
+    from .customer_features import (empty_features_state, features_table, fold_customer_features,
+                                    rfm_from_features, save_features_state, write_features)
+    features_state = _step("features", fold_customer_features, empty_features_state(), df)
+    features = features_table(features_state)
+    if features_path:
+        write_features(features, features_path)
+    if state_dir:
+        # Réinitialise l'état incrémental (features et RFM) pour que les prochains lots repartent de ce build
+        save_features_state(features_state, state_dir, reset=True)
+
+    df_rfm = _step("rfm", rfm_from_features, features)
+    os.makedirs(os.path.dirname(rfm_path) or ".", exist_ok=True)
+    df_rfm.to_csv(rfm_path, index=False)
+
+    return timings
@@ -0,0 +1,51 @@
+from .customer_features import (
+    FEATURES_PATH,
+    FEATURES_STATE_DIR,
+    empty_features_state,
+    features_table,
+    fold_customer_features,
+    load_features_state,
+    rfm_from_features,
+    save_features_state,
+    update_features,
+)
+
+# Un seul état incrémental : celui du feature store client (compteurs par client + index des couples
+# (client, facture) déjà vus). La table RFM s'en déduit, elle n'a plus d'état propre.
+STATE_DIR = FEATURES_STATE_DIR
+
+
+# ============================
+# 📌 ÉTAT CUMULÉ PAR CLIENT
+# ============================
+def empty_rfm_state():
+    return empty_features_state()
+
+
+def fold_transactions(state, batch):
+    """Intègre un lot de transactions nettoyées (voir fold_customer_features : O(lot), lot rejoué refusé)"""
+    return fold_customer_features(state, batch)
+
+
+def rfm_table(state):
+    """Table RFM scorée, au même format que df_rfm_resultat.csv"""
+    return rfm_from_features(features_table(state))
+
+
+# ============================
+# 📌 PERSISTANCE
+# ============================
+def save_rfm_state(state, state_dir=STATE_DIR):
+    save_features_state(state, state_dir)
+
+
+def load_rfm_state(state_dir=STATE_DIR):
+    return load_features_state(state_dir)
+
+
+def update_rfm(batch, state_dir=STATE_DIR, rfm_path=None, features_path=FEATURES_PATH):
+    """Intègre le lot dans l'état partagé, réécrit la table de features et renvoie (ou écrit) la table RFM"""
+    df_rfm = rfm_from_features(update_features(batch, state_dir, features_path))
+    if rfm_path:
+        df_rfm.to_csv(rfm_path, index=False)
+    return df_rfm
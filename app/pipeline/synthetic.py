@@ -0,0 +1,270 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .etl import month_ordinals
+from .customer_features import rfm_from_features
+
+SYNTHETIC_DIR = "data/processed/synthetic_partitions"
+
+# Période couverte par défaut : même fenêtre que Online Retail II (déc. 2009 -> déc. 2011)
+START_MONTH = "2009-12"
+N_MONTHS = 25
+CHUNK_ROWS = 1_000_000
+FIRST_CUSTOMER_ID = 12346
+CUSTOMERS_PER_ROW = 1 / 170
+# Lignes moyennes par facture ; les retours (factures « C ») sont plus courts
+ORDER_LINES = 20
+RETURN_LINES = 2.5
+# Part des factures qui sont des retours (~2 % des lignes, comme le fichier réel)
+RETURN_RATE = 0.15
+
+COUNTRIES = ["United Kingdom", "Germany", "France", "EIRE", "Spain", "Netherlands",
+             "Belgium", "Switzerland", "Portugal", "Australia"]
+COUNTRY_WEIGHTS = np.array([0.90, 0.02, 0.018, 0.017, 0.008, 0.008, 0.007, 0.006, 0.006, 0.01])
+PACK_SIZES = np.array([1, 2, 3, 4, 6, 8, 10, 12, 24, 48])
+PACK_WEIGHTS = np.array([0.22, 0.14, 0.08, 0.10, 0.14, 0.04, 0.04, 0.16, 0.06, 0.02])
+WORDS = np.array(["WHITE", "RED", "PINK", "BLUE", "VINTAGE", "HEART", "GLASS", "METAL", "WOODEN",
+                  "CHRISTMAS", "PARTY", "BAG", "LANTERN", "CANDLE", "HOLDER", "MUG", "SIGN", "BOX",
+                  "SET", "JUMBO", "PAPER", "CAKE", "TEA", "GARDEN", "STAR", "RETRO", "LUNCH", "CARD"])
+
+
+# ============================
+# 📌 PARAMÈTRES DE LA POPULATION
+# ============================
+def seasonality(months):
+    """Facteur d'activité par mois : pic d'automne (septembre -> novembre), creux en début d'année"""
+    calendar_month = months % 12 + 1
+    return 1 + 0.9 * np.exp(-0.5 * ((calendar_month - 11) / 1.3) ** 2) - 0.15 * (calendar_month <= 2)
+
+
+def _n_customers(n_rows):
+    return max(int(n_rows * CUSTOMERS_PER_ROW), 1_000)
+
+
+def _catalog(rng, n_products):
+    """Produits : code, libellé, prix unitaire et popularité (loi de Zipf)"""
+    codes = rng.choice(np.arange(10000, 99999), n_products, replace=False).astype(str)
+    suffix = np.where(rng.random(n_products) < 0.3, rng.choice(list("ABCDEFGHLMNPSW"), n_products), "")
+    words = rng.choice(WORDS, (n_products, 3))
+    descriptions = np.char.add(np.char.add(np.char.add(words[:, 0], " "), np.char.add(words[:, 1], " ")), words[:, 2])
+    popularity = 1 / np.arange(1, n_products + 1) ** 0.9
+    description_codes, description_labels = pd.factorize(descriptions)
+    return {
+        "code": pd.Index(np.char.add(codes, suffix)),
+        "description_code": description_codes,
+        "description": description_labels,
+        "price": np.round(rng.lognormal(0.9, 0.8, n_products), 2).clip(0.1, 300),
+        "p": rng.permutation(popularity / popularity.sum()),
+    }
+
+
+def _customers(rng, n_customers, n_months):
+    """Clients : mois d'acquisition, durée de vie (churn géométrique), intensité d'achat, pays"""
+    acquisition_weights = seasonality(np.arange(n_months)) * np.linspace(1.6, 0.7, n_months)
+    acquisition = rng.choice(n_months, n_customers, p=acquisition_weights / acquisition_weights.sum())
+    # Rétention mensuelle propre à chaque client : beaucoup d'acheteurs uniques, un noyau fidèle
+    survival = rng.beta(3.0, 1.2, n_customers)
+    lifetime = rng.geometric(1 - survival)
+    return {
+        "acquisition": acquisition,
+        "last_month": np.minimum(acquisition + lifetime - 1, n_months - 1),
+        "intensity": rng.lognormal(0, 0.9, n_customers),
+        "country": rng.choice(len(COUNTRIES), n_customers, p=COUNTRY_WEIGHTS / COUNTRY_WEIGHTS.sum()),
+    }
+
+
+# ============================
+# 📌 GÉNÉRATION PAR MOIS
+# ============================
+def _month_orders(rng, customers, month, order_rate, season):
+    """Commandes du mois : clients actifs, nombre de commandes (≥ 1 le mois d'acquisition)"""
+    active = np.flatnonzero((customers["acquisition"] <= month) & (customers["last_month"] >= month))
+    n_orders = rng.poisson(order_rate * customers["intensity"][active] * season)
+    n_orders = np.where(customers["acquisition"][active] == month, np.maximum(n_orders, 1), n_orders)
+    return np.repeat(active, n_orders)
+
+
+def _order_times(rng, month_start, n_days, n_orders):
+    """Horodatages (minute) des commandes, triés : jours ouvrés, 7h-20h, dimanche plus calme"""
+    weekday = (month_start.astype(np.int64) + np.arange(n_days)) % 7  # 0 = jeudi
+    # Pas de vente le samedi, comme la boutique d'origine
+    day_weights = np.select([weekday == 2, weekday == 3], [0.0, 0.5], 1.0)
+    days = rng.choice(n_days, n_orders, p=day_weights / day_weights.sum())
+    minutes = days * 1440 + rng.integers(7 * 60, 20 * 60, n_orders)
+    return np.sort(month_start.astype("datetime64[m]") + minutes.astype("timedelta64[m]"))
+
+
+def _lines(rng, catalog, order_customer, order_time, invoice, is_return, customers):
+    """Lignes de facture d'un bloc de commandes"""
+    n_lines = np.where(is_return, rng.geometric(1 / RETURN_LINES, len(order_customer)),
+                       rng.geometric(1 / ORDER_LINES, len(order_customer)))
+    rows = np.repeat(np.arange(len(order_customer)), n_lines)
+
+    product = rng.choice(len(catalog["code"]), len(rows), p=catalog["p"])
+    quantity = rng.choice(PACK_SIZES, len(rows), p=PACK_WEIGHTS / PACK_WEIGHTS.sum())
+    quantity = np.where(is_return[rows], -quantity, quantity)
+    price = catalog["price"][product]
+    customer = order_customer[rows]
+    # Texte en catégories (codes entiers) : pas de chaînes Python par ligne, parquet en dictionnaire
+    invoices = np.where(is_return, np.char.add("C", invoice.astype(str)), invoice.astype(str))
+    return pd.DataFrame({
+        "Invoice": pd.Categorical.from_codes(rows, categories=invoices),
+        "StockCode": pd.Categorical.from_codes(product, categories=catalog["code"]),
+        "Description": pd.Categorical.from_codes(catalog["description_code"][product],
+                                                 categories=catalog["description"]),
+        "Quantity": quantity.astype(np.int64),
+        "InvoiceDate": order_time[rows].astype("datetime64[ns]"),
+        "Price": price,
+        "Customer ID": (FIRST_CUSTOMER_ID + customer).astype(np.float64),
+        "Country": pd.Categorical.from_codes(customers["country"][customer], categories=COUNTRIES),
+        "TotalPrice": price * quantity,
+        "_customer": customer,
+    })
+
+
+def _with_periods(chunk, customers, first_month):
+    """Colonnes de cohortes du parquet propre (MonthYear, Cohort, InvoiceMonth, CohortIndex)"""
+    invoice_month = month_ordinals(chunk["InvoiceDate"])
+    cohort = first_month + customers["acquisition"][chunk["_customer"].to_numpy()]
+    month_period = pd.PeriodIndex.from_ordinals(invoice_month, freq="M")
+    return chunk.drop(columns="_customer").assign(
+        MonthYear=month_period,
+        Cohort=pd.PeriodIndex.from_ordinals(cohort, freq="M"),
+        InvoiceMonth=month_period,
+        CohortIndex=(invoice_month - cohort).astype(np.int64),
+    )
+
+
+def generate_transactions(n_rows, seed=0, start_month=START_MONTH, n_months=N_MONTHS,
+                          chunk_rows=CHUNK_ROWS, return_rate=RETURN_RATE):
+    """Flux de blocs de transactions au schéma du parquet nettoyé, mois après mois (dates croissantes).
+    Mémoire bornée par chunk_rows + l'état des clients ; environ n_rows lignes au total."""
+    rng = np.random.default_rng(np.random.SeedSequence(seed))
+    n_customers = _n_customers(n_rows)
+    catalog = _catalog(rng, min(max(n_rows // 250, 500), 5_000))
+    customers = _customers(rng, n_customers, n_months)
+
+    # Calibre le taux de commandes pour viser n_rows lignes
+    months = np.arange(n_months)
+    season = seasonality(months)
+    active = (customers["acquisition"][:, None] <= months) & (customers["last_month"][:, None] >= months)
+    expected_orders = (active * customers["intensity"][:, None] * season).sum()
+    lines_per_order = (1 - return_rate) * ORDER_LINES + return_rate * RETURN_LINES
+    order_rate = n_rows / lines_per_order / expected_orders
+
+    first = pd.Period(start_month, freq="M")
+    next_invoice = 489434
+    for month in months:
+        period = first + int(month)
+        month_start = np.datetime64(period.start_time.date(), "D")
+        order_customer = _month_orders(rng, customers, month, order_rate, season[month])
+        rng.shuffle(order_customer)
+        order_time = _order_times(rng, month_start, period.days_in_month, len(order_customer))
+        invoice = next_invoice + np.arange(len(order_customer))
+        next_invoice += len(order_customer)
+        # Les retours sont de petites factures « C » d'un client déjà acquis
+        is_return = (rng.random(len(order_customer)) < return_rate) & (customers["acquisition"][order_customer] < month)
+
+        orders_per_chunk = max(int(chunk_rows / lines_per_order), 1)
+        for lo in range(0, len(order_customer), orders_per_chunk):
+            block = slice(lo, lo + orders_per_chunk)
+            chunk = _lines(rng, catalog, order_customer[block], order_time[block],
+                           invoice[block], is_return[block], customers)
+            yield _with_periods(chunk, customers, first.ordinal)
+
+
+# ============================
+# 📌 ÉCRITURE EN FLUX
+# ============================
+def _empty_totals(n_customers):
+    """Agrégats RFM par client (indices du générateur), en tableaux de taille fixe"""
+    return {
+        "first": np.full(n_customers, np.iinfo(np.int64).max),
+        "last": np.full(n_customers, np.iinfo(np.int64).min),
+        "invoices": np.zeros(n_customers, dtype=np.int64),
+        "monetary": np.zeros(n_customers),
+    }
+
+
+def _fold_chunk(totals, chunk):
+    """Cumule un bloc dans les agrégats. Une facture n'est jamais coupée entre deux blocs :
+    compter les factures du bloc suffit (pas besoin de l'index des factures du feature store)"""
+    customer = (chunk["Customer ID"].to_numpy() - FIRST_CUSTOMER_ID).astype(np.int64)
+    dates = chunk["InvoiceDate"].to_numpy().astype(np.int64)
+    np.minimum.at(totals["first"], customer, dates)
+    np.maximum.at(totals["last"], customer, dates)
+    np.add.at(totals["monetary"], customer, chunk["TotalPrice"].to_numpy())
+    first_line = ~chunk["Invoice"].duplicated().to_numpy()
+    np.add.at(totals["invoices"], customer[first_line], 1)
+
+
+def _rfm_from_totals(totals):
+    """Table RFM scorée (format df_rfm_resultat.csv) à partir des agrégats cumulés"""
+    seen = np.flatnonzero(totals["invoices"] > 0)
+    customers = pd.DataFrame({
+        'last': totals["last"][seen].astype("datetime64[ns]"),
+        'invoices': totals["invoices"][seen],
+        'revenue': totals["monetary"][seen],
+        'first': totals["first"][seen].astype("datetime64[ns]"),
+    }, index=pd.Index(FIRST_CUSTOMER_ID + seen, name='Customer ID'))
+    return rfm_from_features(customers)
+
+
+def _fixed_schema(chunk):
+    """Schéma commun à tous les blocs : index de dictionnaire en int32 quelle que soit la taille du bloc"""
+    schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+    for i, field in enumerate(schema):
+        if pa.types.is_dictionary(field.type):
+            schema = schema.set(i, field.with_type(pa.dictionary(pa.int32(), pa.string())))
+    return schema
+
+
+def write_synthetic(n_rows, out=SYNTHETIC_DIR, seed=0, single_file=False, rfm_path=None,
+                    chunk_rows=CHUNK_ROWS, **options):
+    """Écrit le jeu synthétique en flux : dossiers Partition=AAAA-MM (un fichier par mois, un
+    seul ouvert à la fois) ou un seul parquet (row group par bloc). Renvoie des statistiques."""
+    schema = None
+    writer = None
+    writer_key = None
+    totals = _empty_totals(_n_customers(n_rows)) if rfm_path else None
+    stats = {"rows": 0, "chunks": 0, "returns": 0, "files": 0}
+
+    def _open(path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        stats["files"] += 1
+        return pq.ParquetWriter(path, schema)
+
+    try:
+        for chunk in generate_transactions(n_rows, seed=seed, chunk_rows=chunk_rows, **options):
+            if schema is None:
+                schema = _fixed_schema(chunk)
+            table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+
+            # Les blocs arrivent par mois croissant : on ferme une partition avant d'ouvrir la suivante
+            key = "all" if single_file else chunk["InvoiceDate"].iloc[0].strftime("%Y-%m")
+            if key != writer_key:
+                if writer is not None:
+                    writer.close()
+                path = out if single_file else os.path.join(out, f"Partition={key}", "part-0.parquet")
+                writer, writer_key = _open(path), key
+            writer.write_table(table)
+
+            if totals is not None:
+                _fold_chunk(totals, chunk)
+            stats["rows"] += len(chunk)
+            stats["chunks"] += 1
+            stats["returns"] += int((chunk["Quantity"].to_numpy() < 0).sum())
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if totals is not None:
+        os.makedirs(os.path.dirname(rfm_path) or ".", exist_ok=True)
+        _rfm_from_totals(totals).to_csv(rfm_path, index=False)
+    return stats
+
+
@@ -0,0 +1,174 @@
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from olap_cube import CUBE_DIMENSIONS, PRICE_EDGES, cube_categories, segment_codes, select_cells
+from parallel_agg import map_partitions, merge_sums, month_partitions, use_parallel
+
+TOP_K = 10
+# Volume vendu minimal pour entrer dans le classement des taux de retour
+MIN_SOLD = 50
+
+PRODUCT_DIMENSIONS = CUBE_DIMENSIONS + ['product']
+
+
+# ============================
+# 📌 CUBE PRODUITS
+# ============================
+def _product_part(df, customer_segments, countries, segments, stock_codes):
+    """Cellules d'une partition + comptages (produit, description) pour les libellés"""
+    total_price = df["TotalPrice"].to_numpy()
+    quantity = df["Quantity"].to_numpy()
+    product = pd.Categorical(df["StockCode"], categories=stock_codes).codes.astype(np.int32)
+
+    keys = pd.DataFrame({
+        'day': df["InvoiceDate"].to_numpy().astype("datetime64[D]").astype(np.int32),
+        'country': pd.Categorical(df["Country"], categories=countries).codes,
+        'segment': segment_codes(df, customer_segments, segments),
+        'sign': np.sign(quantity).astype(np.int8),
+        'bucket': np.searchsorted(PRICE_EDGES, total_price, side='right').astype(np.int8),
+        'product': product,
+    })
+    grouped = keys.groupby(PRODUCT_DIMENSIONS, sort=True)
+    cell_id = grouped.ngroup().to_numpy()
+    n_cells = grouped.ngroups
+
+    cells = grouped.size().reset_index()[PRODUCT_DIMENSIONS]
+    cells['quantity'] = np.bincount(cell_id, weights=quantity, minlength=n_cells).astype(np.int64)
+    cells['revenue'] = np.bincount(cell_id, weights=total_price, minlength=n_cells)
+    return {"cells": cells, "labels": description_counts(product, df["Description"])}
+
+
+def build_product_cube(df, customer_segments=None, parallel=None):
+    """Quantités et CA par (jour, pays, segment RFM, sens, tranche de prix, produit).
+    Les produits sont les codes entiers de StockCode ; mêmes dimensions que le cube des KPIs,
+    donc mêmes filtres servables (select_cells). Partitions de mois en parallèle sur un gros historique."""
+    countries, segments = cube_categories(df, customer_segments)
+    stock_codes = df["StockCode"].astype("category").cat.categories
+    build = partial(_product_part, customer_segments=customer_segments, countries=countries,
+                    segments=segments, stock_codes=stock_codes)
+    if use_parallel(len(df), parallel):
+        columns = ["InvoiceDate", "Country", "CustomerID", "Quantity", "TotalPrice", "StockCode", "Description"]
+        # Descriptions en dictionnaire commun : leurs codes se comparent d'une partition à l'autre
+        frame = df[columns].assign(Description=df["Description"].astype("category"))
+        parts = map_partitions(build, month_partitions(frame)) or [build(df)]
+    else:
+        parts = [build(df)]
+
+    return {
+        "cells": pd.concat([part["cells"] for part in parts], ignore_index=True),
+        "countries": list(countries),
+        "segments": list(segments),
+        "stock_codes": np.asarray(stock_codes, dtype=object),
+        "descriptions": descriptions_from_counts(merge_sums([part["labels"] for part in parts]), len(stock_codes)),
+    }
+
+
+def description_counts(product, descriptions):
+    """Nombre de lignes par (code produit, description), indexé par les libellés de description"""
+    descriptions = descriptions.astype("category")
+    codes = descriptions.cat.codes.to_numpy()
+    known = codes >= 0
+    counts = pd.DataFrame({'product': product[known], 'description': codes[known]}).value_counts()
+    names = np.asarray(descriptions.cat.categories, dtype=object)
+    return counts.set_axis(pd.MultiIndex.from_arrays(
+        [counts.index.get_level_values('product'), names[counts.index.get_level_values('description')]],
+        names=['product', 'description']))
+
+
+def descriptions_from_counts(counts, n_products):
+    """Libellé affiché de chaque code produit : sa description la plus fréquente"""
+    labels = (
+        counts.rename('n').reset_index()
+        .sort_values(['n', 'description'], ascending=[False, True], kind='stable', na_position='last')
+        .drop_duplicates('product').set_index('product')['description']
+    )
+    labels = labels.reindex(np.arange(n_products))
+    return np.where(labels.isna(), None, labels.to_numpy(dtype=object))
+
+
+def product_descriptions(product, descriptions, n_products):
+    """Libellé affiché de chaque code produit : sa description la plus fréquente"""
+    return descriptions_from_counts(description_counts(product, descriptions), n_products)
+
+
+# ============================
+# 📌 TOTAUX PAR PRODUIT
+# ============================
+def _totals(n_products, product, quantity, revenue):
+    """Ventes nettes, volumes vendus / retournés et CA par code produit (bincount, sans tri)"""
+    sold = quantity > 0
+
+    def _sum(rows, weights):
+        return np.bincount(product[rows], weights=weights[rows], minlength=n_products)
+
+    everything = slice(None)
+    return {
+        "net": _sum(everything, quantity).astype(np.int64),
+        "sold": _sum(sold, quantity).astype(np.int64),
+        "returned": -_sum(~sold, quantity).astype(np.int64),
+        "revenue": _sum(everything, revenue),
+    }
+
+
+def query_products(cube, start_date, end_date, country="Tous", threshold=0.0,
+                   returns_mode="Inclure", segment="Tous"):
+    """Totaux par produit depuis le cube, ou None si le seuil n'est pas une borne de tranche"""
+    mask = select_cells(cube, start_date, end_date, country, threshold, returns_mode, segment)
+    if mask is None:
+        return None
+    cells = cube["cells"]
+    quantity = cells['quantity'].to_numpy()[mask]
+    revenue = cells['revenue'].to_numpy()[mask]
+    if returns_mode == "Neutraliser":
+        revenue = np.where(quantity < 0, 0.0, revenue)
+    return _totals(len(cube["stock_codes"]), cells['product'].to_numpy()[mask], quantity, revenue)
+
+
+def products_from_rows(cube, df_f):
+    """Repli exact sur les lignes filtrées (mêmes codes produits que le cube)"""
+    codes = pd.Categorical(df_f["StockCode"], categories=cube["stock_codes"]).codes
+    keep = codes >= 0
+    return _totals(len(cube["stock_codes"]), codes[keep],
+                   df_f["Quantity"].to_numpy()[keep], df_f["TotalPrice"].to_numpy()[keep])
+
+
+# ============================
+# 📌 CLASSEMENTS (top-k partiel)
+# ============================
+def top_k(values, k=TOP_K, largest=True, valid=None):
+    """Indices des k plus grandes (ou plus petites) valeurs, triés : argpartition puis tri de k éléments"""
+    candidates = np.flatnonzero(valid) if valid is not None else np.arange(len(values))
+    scores = values[candidates] if largest else -values[candidates]
+    if len(candidates) > k:
+        part = np.argpartition(-scores, k - 1)[:k]
+        candidates, scores = candidates[part], scores[part]
+    return candidates[np.argsort(-scores, kind="stable")]
+
+
+def _board(cube, rows, columns):
+    return pd.DataFrame(dict({
+        "StockCode": cube["stock_codes"][rows],
+        "Description": cube["descriptions"][rows],
+    }, **{name: values[rows] for name, values in columns.items()}))
+
+
+def product_leaderboards(cube, totals, k=TOP_K, by="quantity", min_sold=MIN_SOLD):
+    """Top ventes (quantité nette ou CA), top retours et taux de retour les plus élevés"""
+    if by == "revenue":
+        sales = top_k(totals["revenue"], k, valid=totals["revenue"] > 0)
+    else:
+        sales = top_k(totals["net"], k, valid=totals["net"] > 0)
+    returns = top_k(totals["returned"], k, valid=totals["returned"] > 0)
+
+    eligible = totals["sold"] >= min_sold
+    rate = np.divide(totals["returned"], totals["sold"], out=np.zeros(len(eligible)), where=eligible)
+    worst = top_k(rate, k, valid=eligible & (rate > 0))
+
+    return {
+        "sales": _board(cube, sales, {"Quantité": totals["net"], "CA": totals["revenue"]}),
+        "returns": _board(cube, returns, {"Quantité retournée": totals["returned"]}),
+        "return_rate": _board(cube, worst, {"Vendus": totals["sold"], "Retournés": totals["returned"],
+                                            "Taux de retour": rate}),
+    }
@@ -0,0 +1,136 @@
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+
+from registry import registry_stats
+from render_cache import render_stats
+
+# Profilage de chaque rerun (aussi activable par ?debug=1 dans l'URL)
+PROFILE = os.environ.get("RETAIL_PROFILE", "0") == "1"
+# Journal structuré des étapes, une ligne JSON par étape
+PROFILE_LOG = os.environ.get("RETAIL_PROFILE_LOG", "logs/profile.jsonl")
+
+# Un rerun Streamlit = un thread : chaque session a son propre profil en cours
+_LOCAL = threading.local()
+_LOG_LOCK = threading.Lock()
+
+
+# ============================
+# 📌 RERUN EN COURS
+# ============================
+def _cache_counters():
+    registry = registry_stats()
+    renders = render_stats()
+    return {
+        "registry_hits": registry["hits"],
+        "registry_misses": registry["misses"],
+        "render_hits": renders["hits"],
+        "render_misses": renders["misses"],
+    }
+
+
+def start_run(page, enabled=True, trace_memory=True):
+    """Ouvre le profil d'un rerun ; sans effet (et sans coût) si enabled est faux"""
+    if not enabled:
+        _LOCAL.run = None
+        return None
+    own_tracer = trace_memory and not tracemalloc.is_tracing()
+    if own_tracer:
+        tracemalloc.start()
+    _LOCAL.run = {
+        "run": uuid.uuid4().hex[:12],
+        "page": page,
+        "started": time.time(),
+        "start": time.perf_counter(),
+        "events": [],
+        "depth": 0,
+        "own_tracer": own_tracer,
+    }
+    return _LOCAL.run
+
+
+def current_run():
+    return getattr(_LOCAL, "run", None)
+
+
+@contextmanager
+def stage(name):
+    """Chronomètre une étape du rerun : temps, variation mémoire (tracemalloc), hits/misses des caches.
+    La mémoire et les caches sont globaux au processus : avec plusieurs sessions, les deltas se mélangent."""
+    run = current_run()
+    if run is None:
+        yield
+        return
+
+    counters = _cache_counters()
+    memory = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+    depth = run["depth"]
+    run["depth"] += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        run["depth"] = depth
+        event = {
+            "stage": name,
+            "depth": depth,
+            "offset": start - run["start"],
+            "seconds": seconds,
+            "memory_mb": None,
+        }
+        if memory is not None and tracemalloc.is_tracing():
+            event["memory_mb"] = (tracemalloc.get_traced_memory()[0] - memory) / 1024 ** 2
+        after = _cache_counters()
+        event.update({key: after[key] - counters[key] for key in after})
+        run["events"].append(event)
+
+
+def profiled(name=None):
+    """Décorateur : chaque appel de la fonction est une étape du rerun"""
+    def decorator(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ============================
+# 📌 FIN DU RERUN + JOURNAL
+# ============================
+def finish_run(log_path=PROFILE_LOG):
+    """Ferme le profil du rerun, l'écrit dans le journal JSONL et le renvoie (None si inactif)"""
+    run = current_run()
+    if run is None:
+        return None
+    _LOCAL.run = None
+    run["seconds"] = time.perf_counter() - run["start"]
+    if run["own_tracer"]:
+        run["peak_mb"] = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        tracemalloc.stop()
+
+    # Ordre d'exécution (les étapes imbriquées se terminent avant leur parent)
+    run["events"].sort(key=lambda e: e["offset"])
+    if log_path:
+        write_events(run, log_path)
+    return run
+
+
+def write_events(run, log_path=PROFILE_LOG):
+    """Ajoute les étapes d'un rerun au journal (une ligne JSON par étape)"""
+    base = {"run": run["run"], "page": run["page"], "time": run["started"]}
+    lines = [json.dumps(dict(base, **event)) for event in run["events"]]
+    lines.append(json.dumps(dict(base, stage="total", depth=-1, offset=0.0, seconds=run["seconds"],
+                                 peak_mb=run.get("peak_mb"))))
+    os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+    with _LOG_LOCK, open(log_path, "a", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
@@ -0,0 +1,215 @@
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+# Copy-on-write : les vues renvoyées aux pages partagent les données du registre,
+# une écriture côté page copie la colonne touchée au lieu de modifier l'original.
+pd.set_option("mode.copy_on_write", True)
+
+# Budget mémoire des tables dérivées (index, cubes, pivots...), en Mo
+MEMORY_BUDGET = int(os.environ.get("RETAIL_CACHE_BUDGET_MB", 512)) * 1024 ** 2
+
+_LOCK = threading.RLock()
+_SOURCES = {}
+_DERIVED = OrderedDict()
+# Constructions en cours, par clé : les autres sessions attendent la même construction au lieu de la refaire
+_BUILDING = {}
+# Chargements de sources en cours, par nom : même principe que _BUILDING
+_LOADING = {}
+_STATS = {"hits": 0, "misses": 0, "reloads": 0, "evictions": 0}
+
+
+# Tableaux d'une matrice creuse (CSR / CSC, COO)
+_SPARSE_ARRAYS = ("data", "indices", "indptr", "row", "col")
+
+
+# ============================
+# 📌 OUTILS
+# ============================
+def _signature(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def nbytes(obj):
+    """Empreinte mémoire approximative d'une table dérivée"""
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True, index=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        if obj.dtype == object:
+            # Le tableau ne contient que des pointeurs : on ajoute les objets (chaînes des paniers...)
+            return obj.nbytes + sum(map(sys.getsizeof, obj.ravel()))
+        return obj.nbytes
+    if sp.issparse(obj):
+        # Matrice creuse (paniers) : tableaux de valeurs et d'indices, pas l'en-tête de l'objet
+        return sum(getattr(obj, name).nbytes for name in _SPARSE_ARRAYS if hasattr(obj, name))
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(nbytes(v) for v in obj.values())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + sum(nbytes(v) for v in obj)
+    return sys.getsizeof(obj)
+
+
+def _view(obj):
+    """Vue sans copie : nouveau conteneur, mêmes données (protégées par le copy-on-write).
+    Les dictionnaires (index, cubes) sont recopiés en surface pour que leurs tables soient aussi des vues."""
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return obj.copy(deep=False)
+    if isinstance(obj, dict):
+        return {key: _view(value) for key, value in obj.items()}
+    return obj
+
+
+# ============================
+# 📌 SOURCES (fichiers)
+# ============================
+def register_source(name, path, loader):
+    """Déclare un fichier source ; sans effet si la même source est déjà déclarée"""
+    with _LOCK:
+        source = _SOURCES.get(name)
+        if source is None or source["path"] != path or source["loader"] is not loader:
+            _SOURCES[name] = {"path": path, "loader": loader, "signature": None,
+                              "hash": None, "version": 0, "data": None}
+
+
+def _refresh(name):
+    """Recharge la source si le fichier a changé (mtime/taille, puis contenu).
+    Le verrou n'est pas tenu pendant le hachage et le chargement : les autres sources et tables
+    restent servies ; une session qui demande une source en chargement attend ce chargement.
+    Renvoie (données, version, rechargée ?)"""
+    while True:
+        with _LOCK:
+            source = _SOURCES[name]
+            signature = _signature(source["path"])
+            if source["data"] is not None and signature == source["signature"]:
+                return source["data"], source["version"], False
+
+            loading = _LOADING.get(name)
+            if loading is None:
+                loading = _LOADING[name] = threading.Event()
+                path, loader, data, known_hash = source["path"], source["loader"], source["data"], source["hash"]
+                break
+        loading.wait()
+
+    try:
+        content_hash = _file_hash(path)
+        # Fichier touché mais contenu identique : on garde les données
+        reloaded = data is None or content_hash != known_hash
+        if reloaded:
+            data = loader(path)
+    except BaseException:
+        with _LOCK:
+            del _LOADING[name]
+        loading.set()
+        raise
+
+    with _LOCK:
+        source["signature"] = signature
+        if reloaded:
+            source.update(data=data, hash=content_hash, version=source["version"] + 1)
+            _STATS["reloads"] += 1
+        version = source["version"]
+        del _LOADING[name]
+    loading.set()
+    return data, version, reloaded
+
+
+def get_dataset(name):
+    """Vue en lecture seule (sans copie) d'une source déclarée, rechargée si le fichier a changé"""
+    data, _, reloaded = _refresh(name)
+    with _LOCK:
+        _STATS["misses" if reloaded else "hits"] += 1
+    return _view(data)
+
+
+def source_version(name):
+    return _refresh(name)[1]
+
+
+# ============================
+# 📌 TABLES DÉRIVÉES (LRU)
+# ============================
+def get_derived(key, builder, depends_on=()):
+    """Table calculée à partir de sources ; reconstruite si une source a changé,
+    évincée (LRU) quand le budget mémoire est dépassé.
+    Le verrou n'est pas tenu pendant `builder()` : les autres clés restent servies ; une session qui
+    demande une clé en construction attend cette construction puis relit le cache."""
+    while True:
+        # Hors verrou : une source à recharger ne bloque pas les autres clés
+        versions = {name: source_version(name) for name in depends_on}
+        with _LOCK:
+            entry = _DERIVED.get(key)
+            if entry is not None and entry["versions"] == versions:
+                _DERIVED.move_to_end(key)
+                _STATS["hits"] += 1
+                return _view(entry["value"])
+
+            building = _BUILDING.get(key)
+            if building is None:
+                building = _BUILDING[key] = threading.Event()
+                _STATS["misses"] += 1
+                break
+        building.wait()
+
+    try:
+        value = builder()
+    except BaseException:
+        with _LOCK:
+            del _BUILDING[key]
+        building.set()
+        raise
+
+    with _LOCK:
+        _DERIVED[key] = {"value": value, "versions": versions, "nbytes": nbytes(value)}
+        _DERIVED.move_to_end(key)
+        _evict(keep=key)
+        del _BUILDING[key]
+    building.set()
+    return _view(value)
+
+
+def _evict(keep):
+    total = sum(entry["nbytes"] for entry in _DERIVED.values())
+    for key in list(_DERIVED):
+        if total <= MEMORY_BUDGET:
+            break
+        if key == keep:
+            continue
+        total -= _DERIVED.pop(key)["nbytes"]
+        _STATS["evictions"] += 1
+
+
+def invalidate(name=None):
+    """Oublie une source (ou tout le registre) ; les tables dérivées seront reconstruites"""
+    with _LOCK:
+        names = [name] if name else list(_SOURCES)
+        for n in names:
+            if n in _SOURCES:
+                _SOURCES[n].update(data=None, signature=None, hash=None)
+        if name is None:
+            _DERIVED.clear()
+
+
+def registry_stats():
+    """Compteurs du registre + occupation mémoire des tables dérivées"""
+    with _LOCK:
+        return dict(_STATS,
+                    derived=len(_DERIVED),
+                    derived_mb=sum(e["nbytes"] for e in _DERIVED.values()) / 1024 ** 2,
+                    budget_mb=MEMORY_BUDGET / 1024 ** 2)
@@ -0,0 +1,134 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import matplotlib
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+# Budget mémoire des PNG gardés en cache, en Mo
+RENDER_BUDGET = int(os.environ.get("RETAIL_RENDER_BUDGET_MB", 64)) * 1024 ** 2
+# Résolutions : affichage (celle de st.pyplot) et export haute définition
+SCREEN_DPI = 200
+EXPORT_DPI = 300
+# Export paresseux : le PNG haute définition n'est rasterisé qu'à la demande
+LAZY_EXPORT = os.environ.get("RETAIL_LAZY_EXPORT", "1") == "1"
+
+_LOCK = threading.RLock()
+_RENDERS = OrderedDict()
+_STATS = {"hits": 0, "misses": 0, "exports": 0, "evictions": 0}
+
+
+# ============================
+# 📌 CLÉS DE CACHE
+# ============================
+def _update_digest(digest, obj):
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        digest.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+        names = obj.columns if isinstance(obj, pd.DataFrame) else [obj.name]
+        digest.update(repr(list(names)).encode())
+    elif isinstance(obj, np.ndarray):
+        digest.update(np.ascontiguousarray(obj).tobytes())
+        digest.update(repr((obj.dtype.str, obj.shape)).encode())
+    elif isinstance(obj, (list, tuple)):
+        for item in obj:
+            _update_digest(digest, item)
+    elif isinstance(obj, dict):
+        for key in sorted(obj, key=repr):
+            digest.update(repr(key).encode())
+            _update_digest(digest, obj[key])
+    else:
+        digest.update(repr(obj).encode())
+    digest.update(b"|")
+
+
+def data_hash(*objs):
+    """Empreinte des données d'un graphique (tables, tableaux, scalaires)"""
+    digest = hashlib.blake2b(digest_size=16)
+    for obj in objs:
+        _update_digest(digest, obj)
+    return digest.hexdigest()
+
+
+# ============================
+# 📌 RENDU
+# ============================
+def figure_png(fig, dpi, transparent=True):
+    """PNG d'une figure, puis fermeture de la figure (libère la mémoire de pyplot)"""
+    buf = io.BytesIO()
+    try:
+        fig.savefig(buf, format="png", bbox_inches="tight", dpi=dpi, transparent=transparent)
+    finally:
+        plt.close(fig)
+    return buf.getvalue()
+
+
+def _entry_nbytes(entry):
+    return len(entry["png"]) + len(entry["export"] or b"")
+
+
+def _evict(keep):
+    total = sum(_entry_nbytes(e) for e in _RENDERS.values())
+    for key in list(_RENDERS):
+        if total <= RENDER_BUDGET:
+            break
+        if key == keep:
+            continue
+        total -= _entry_nbytes(_RENDERS.pop(key))
+        _STATS["evictions"] += 1
+
+
+def render(name, builder, data_key, style=(), transparent=True):
+    """PNG d'affichage d'un graphique, recalculé seulement si les données ou le style changent.
+    builder() construit la figure matplotlib ; elle est fermée aussitôt rasterisée.
+    Le cache ne garde que des PNG (comptés dans le budget), jamais builder ni les données qu'il capture."""
+    key = (name, data_key, style)
+    with _LOCK:
+        entry = _RENDERS.get(key)
+        if entry is not None:
+            _RENDERS.move_to_end(key)
+            _STATS["hits"] += 1
+            return key, entry["png"]
+
+        _STATS["misses"] += 1
+        with matplotlib.rc_context():
+            png = figure_png(builder(), SCREEN_DPI, transparent)
+        _RENDERS[key] = {"png": png, "export": None, "transparent": transparent}
+        _evict(keep=key)
+        return key, png
+
+
+def cached_export(key):
+    """PNG haute définition déjà calculé, sinon None"""
+    with _LOCK:
+        entry = _RENDERS.get(key)
+        return None if entry is None else entry["export"]
+
+
+def export_png(key, builder, dpi=EXPORT_DPI, transparent=True):
+    """PNG haute définition, rasterisé à la première demande puis gardé en cache.
+    builder est celui du rerun en cours (même figure que `key`) : rien n'est retenu entre deux reruns."""
+    with _LOCK:
+        entry = _RENDERS.get(key)
+        if entry is not None and entry["export"] is not None:
+            return entry["export"]
+        _STATS["exports"] += 1
+        with matplotlib.rc_context():
+            export = figure_png(builder(), dpi, entry["transparent"] if entry is not None else transparent)
+        # Entrée évincée entre-temps : le PNG est servi sans être gardé
+        if entry is not None:
+            entry["export"] = export
+            _evict(keep=key)
+        return export
+
+
+def render_stats():
+    """Compteurs du cache de rendu + occupation mémoire"""
+    with _LOCK:
+        return dict(_STATS,
+                    renders=len(_RENDERS),
+                    render_mb=sum(_entry_nbytes(e) for e in _RENDERS.values()) / 1024 ** 2,
+                    budget_mb=RENDER_BUDGET / 1024 ** 2)
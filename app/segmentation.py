@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+# Table des segments RFM : seuil minimum de RFM_Pourcentage (inclus) et priorité marketing.
+# Modifier cette table (ou en passer une autre) suffit à changer la segmentation partout.
+SEGMENT_THRESHOLDS = pd.DataFrame({
+    "Segment": ["Perdus", "À Risque", "Potentiels", "Fidèles", "Champions"],
+    "Seuil": [-np.inf, 120, 200, 300, 400],
+    "Priorite": [5, 4, 3, 2, 1],
+})
+
+
+def _sorted_table(thresholds):
+    return thresholds.sort_values("Seuil", kind="stable").reset_index(drop=True)
+
+
+def segment_codes(scores, thresholds=SEGMENT_THRESHOLDS):
+    """Position de chaque score dans la table des seuils.
+    Un score manquant tombe dans le segment du seuil le plus bas (« Perdus », comme le else de l'ancien
+    assign_segment) ; -1 seulement pour un score sous le plus bas seuil d'une table sans -inf."""
+    table = _sorted_table(thresholds)
+    scores = np.asarray(scores, dtype=np.float64)
+    codes = np.searchsorted(table["Seuil"].to_numpy(dtype=np.float64), scores, side="right") - 1
+    return np.where(np.isnan(scores), 0, codes), table
+
+
+def assign_segments(scores, thresholds=SEGMENT_THRESHOLDS):
+    """Segments (Categorical, par ordre de priorité) pour un tableau de scores"""
+    codes, table = segment_codes(scores, thresholds)
+    order = table["Priorite"].to_numpy().argsort(kind="stable")
+    remap = np.empty(len(table), dtype=np.int64)
+    remap[order] = np.arange(len(table))
+    codes = np.where(codes >= 0, remap[np.clip(codes, 0, None)], -1)
+    return pd.Categorical.from_codes(codes, categories=table["Segment"].to_numpy()[order])
+
+
+def add_segments(df, score_col="RFM_Pourcentage", segment_col="Segment",
+                 priority_col="Priorite", thresholds=SEGMENT_THRESHOLDS):
+    """Ajoute les colonnes segment (catégorielle) et priorité en une passe vectorisée"""
+    segments = assign_segments(df[score_col].to_numpy(), thresholds)
+    df[segment_col] = segments
+    if priority_col:
+        mapping = thresholds.set_index("Segment")["Priorite"]
+        # Sans segment (code -1), pas de priorité : libellé et priorité restent cohérents
+        priorities = mapping.reindex(segments.categories).to_numpy()
+        known = segments.codes >= 0
+        priority = priorities[segments.codes]
+        df[priority_col] = priority if known.all() else np.where(known, priority, np.nan)
+    return df
@@ -0,0 +1,121 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# ============================
+# 📌 RÉGLAGES
+# ============================
+# Erreur relative visée (écart-type) des comptages approchés, et bascule « tout exact »
+DEFAULT_ERROR = float(os.environ.get("RETAIL_DISTINCT_ERROR", 0.02))
+EXACT_BY_DEFAULT = os.environ.get("RETAIL_EXACT_COUNTS", "0") == "1"
+
+
+def precision_for_error(error):
+    """Nombre de bits de registres pour une erreur relative donnée (≈ 1.04 / √m)"""
+    m = (1.04 / error) ** 2
+    return int(np.clip(np.ceil(np.log2(m)), 4, 18))
+
+
+DEFAULT_PRECISION = precision_for_error(DEFAULT_ERROR)
+
+
+# ============================
+# 📌 HYPERLOGLOG (vectorisé)
+# ============================
+def hash_values(values):
+    """Hash 64 bits stable (identique d'un processus à l'autre)"""
+    return pd.util.hash_array(np.asarray(values))
+
+
+def registers_and_ranks(values, precision=DEFAULT_PRECISION):
+    """Registre (p bits de poids fort) et rang (zéros de poids faible + 1) de chaque valeur"""
+    hashes = hash_values(values)
+    registers = (hashes >> np.uint64(64 - precision)).astype(np.int32)
+
+    low = hashes & np.uint64((1 << (64 - precision)) - 1)
+    lowest_bit = low & (~low + np.uint64(1))
+    with np.errstate(divide="ignore"):
+        ranks = np.log2(lowest_bit.astype(np.float64)) + 1
+    ranks = np.where(low == 0, 64 - precision + 1, ranks).astype(np.int8)
+    return registers, ranks
+
+
+def sketch_table(keys, values, precision=DEFAULT_PRECISION):
+    """Sketches creux par groupe : une ligne (clés..., reg, rho) par registre non vide.
+    keys : DataFrame des colonnes de regroupement, aligné sur values"""
+    registers, ranks = registers_and_ranks(values, precision)
+    table = keys.reset_index(drop=True).assign(reg=registers, rho=ranks)
+    return table.groupby(list(keys.columns) + ['reg'], as_index=False, observed=True)['rho'].max()
+
+
+def dense_registers(sketch, precision=DEFAULT_PRECISION):
+    """Fusionne des lignes de sketch (max par registre) en un tableau dense"""
+    registers = np.zeros(1 << precision, dtype=np.int8)
+    np.maximum.at(registers, sketch['reg'].to_numpy(), sketch['rho'].to_numpy())
+    return registers
+
+
+def estimate(registers, precision=DEFAULT_PRECISION):
+    """Estimation HyperLogLog (avec correction petits effectifs) ; accepte un tableau
+    (m,) ou (n, m) pour estimer plusieurs sketches d'un coup"""
+    registers = np.atleast_2d(registers).astype(np.float64)
+    m = 1 << precision
+    alpha = 0.7213 / (1 + 1.079 / m)
+
+    raw = alpha * m * m / np.sum(np.exp2(-registers), axis=1)
+    zeros = np.sum(registers == 0, axis=1)
+    with np.errstate(divide="ignore"):
+        linear = m * np.log(m / np.maximum(zeros, 1))
+    result = np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+    return result if result.shape[0] > 1 else float(result[0])
+
+
+def estimate_by(sketch, by, precision=DEFAULT_PRECISION):
+    """Estimation par groupe (ex. par mois, ou par (Cohort, CohortIndex)) après fusion des registres"""
+    by = [by] if isinstance(by, str) else list(by)
+    merged = sketch.groupby(by + ['reg'], observed=True)['rho'].max()
+    groups = merged.index.droplevel('reg')
+    labels = groups.unique()
+    positions = labels.get_indexer(groups)
+    dense = np.zeros((len(labels), 1 << precision), dtype=np.int8)
+    dense[positions, merged.index.get_level_values('reg')] = merged.to_numpy()
+    return pd.Series(np.atleast_1d(estimate(dense, precision)), index=labels)
+
+
+# ============================
+# 📌 COMPTAGES DISTINCTS
+# ============================
+def count_distinct(values, exact=None, error=DEFAULT_ERROR):
+    """Nombre de valeurs distinctes : exact (nunique) ou approché (HyperLogLog)"""
+    if exact is None:
+        exact = EXACT_BY_DEFAULT
+    if exact:
+        return pd.Series(values).nunique()
+    precision = precision_for_error(error)
+    registers, ranks = registers_and_ranks(values, precision)
+    dense = np.zeros(1 << precision, dtype=np.int8)
+    np.maximum.at(dense, registers, ranks)
+    return int(round(estimate(dense, precision)))
+
+
+def distinct_sketches(df, column, by, error=DEFAULT_ERROR):
+    """Sketches pré-calculés de `column` par combinaison de `by` (mois, pays, cohorte...),
+    fusionnables au moment de la requête"""
+    return {
+        "table": sketch_table(df[list(by)], df[column].to_numpy(), precision_for_error(error)),
+        "precision": precision_for_error(error),
+    }
+
+
+def count_from_sketches(sketches, **filters):
+    """Fusionne les sketches qui passent les filtres (valeur ou liste de valeurs) et estime"""
+    table = sketches["table"]
+    mask = np.ones(len(table), dtype=bool)
+    for column, value in filters.items():
+        values = value if isinstance(value, (list, tuple, set, np.ndarray)) else [value]
+        mask &= table[column].isin(values).to_numpy()
+    if not mask.any():
+        return 0
+    precision = sketches["precision"]
+    return int(round(estimate(dense_registers(table[mask], precision), precision)))
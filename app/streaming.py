@@ -0,0 +1,107 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_store import DATA_PATH, RENAME_COLUMNS, STREAM_BATCH_ROWS, iter_transactions
+from cohort_state import empty_cohort_state, fold_cohort_transactions
+from density import build_density_bins, merge_density_bins
+from clv_models import daily_purchases
+from parallel_agg import merge_sums
+from pipeline.customer_features import empty_features_state, features_table, fold_customer_features, invoice_codes
+
+# Mode hors mémoire : les pages lisent des agrégats calculés bloc par bloc au lieu du frame complet
+STREAMING = os.environ.get("RETAIL_STREAMING", "0") == "1"
+BATCH_ROWS = int(os.environ.get("RETAIL_STREAM_BATCH_ROWS", STREAM_BATCH_ROWS))
+
+STREAM_COLUMNS = ('InvoiceNo', 'Quantity', 'InvoiceDate', 'CustomerID', 'Country', 'TotalPrice',
+                  'CohortIndex', 'Month')
+
+
+# ============================
+# 📌 KPIs PAR BLOCS
+# ============================
+def empty_overview_state():
+    """CA par mois et par âge de cohorte, clients distincts, factures distinctes par mois, nombre de lignes"""
+    return {
+        "revenue_by_month": pd.Series(dtype=np.float64),
+        "revenue_by_age": pd.Series(dtype=np.float64),
+        "customers": np.empty(0, dtype=np.int64),
+        # mois -> codes triés (int64) des factures vues : seules les factures distinctes du bloc sont fusionnées
+        "invoices": {},
+        "n_tx": 0,
+    }
+
+
+def fold_overview(state, batch):
+    """Intègre un bloc : sommes ajoutées, ensembles réunis"""
+    invoices = pd.Series(invoice_codes(batch["InvoiceNo"]))
+    for month, codes in invoices.groupby(batch["Month"].to_numpy()):
+        seen = state["invoices"].get(int(month), np.empty(0, dtype=np.int64))
+        state["invoices"][int(month)] = np.union1d(seen, codes.to_numpy())
+    return {
+        "revenue_by_month": merge_sums([state["revenue_by_month"], batch.groupby("Month")["TotalPrice"].sum()]),
+        "revenue_by_age": merge_sums([state["revenue_by_age"], batch.groupby("CohortIndex")["TotalPrice"].sum()]),
+        "customers": np.union1d(state["customers"], batch["CustomerID"].to_numpy().astype(np.int64)),
+        "invoices": state["invoices"],
+        "n_tx": state["n_tx"] + len(batch),
+    }
+
+
+def overview_from_state(state):
+    """Même format que overview_from_rows, sur tout l'historique, plus le CA d'acquisition / de rétention"""
+    by_month = state["revenue_by_month"].rename_axis("Month").rename("TotalPrice")
+    by_age = state["revenue_by_age"]
+    return {
+        "total_revenue": by_month.sum(),
+        "n_customers": len(state["customers"]),
+        "n_tx": state["n_tx"],
+        "revenue_by_month": by_month,
+        # Ordinal de trimestre = ordinal de mois // 3
+        "revenue_by_quarter": by_month.groupby(by_month.index // 3).sum().rename_axis("Quarter"),
+        "revenue_acquisition": by_age[by_age.index == 0].sum(),
+        "revenue_retention": by_age[by_age.index > 0].sum(),
+        "north_star": np.mean([len(invoices) for invoices in state["invoices"].values()]) if state["invoices"] else np.nan,
+    }
+
+
+# ============================
+# 📌 PASSE UNIQUE SUR LE PARQUET
+# ============================
+def stream_summary(path=DATA_PATH, batch_rows=BATCH_ROWS):
+    """Une lecture du parquet par blocs : KPIs et tendance, cellules de cohortes, histogrammes de densité,
+    features clients (agrégats RFM) et achats par jour (modèles CLV). L'état retenu grandit avec le nombre
+    de clients et de factures, jamais avec le nombre de lignes."""
+    overview = empty_overview_state()
+    cohorts = empty_cohort_state()
+    features = empty_features_state()
+    density = None
+    # Achats par (client, jour) de chaque bloc, fusionnés une seule fois à la fin
+    daily = []
+    n_batches = 0
+
+    pipeline_names = {v: k for k, v in RENAME_COLUMNS.items()}
+    for batch in iter_transactions(path, STREAM_COLUMNS, batch_rows):
+        overview = fold_overview(overview, batch)
+        cohorts = fold_cohort_transactions(cohorts, batch)
+        features = fold_customer_features(features, batch.rename(columns=pipeline_names))
+        bins = build_density_bins(batch)
+        density = bins if density is None else merge_density_bins(density, bins)
+        daily.append(daily_purchases(batch))
+        n_batches += 1
+
+    return {
+        "overview": overview_from_state(overview),
+        "n_invoices": len(np.unique(np.concatenate([np.empty(0, dtype=np.int64), *overview["invoices"].values()]))),
+        "cohort_cells": cohorts["cells"],
+        "features": features_table(features),
+        "density_bins": density if density is not None else build_density_bins(
+            pd.DataFrame({"TotalPrice": pd.Series(dtype=np.float64), "CohortIndex": pd.Series(dtype=np.int16)})),
+        "daily": merge_sums(daily).astype(np.float64),
+        "batches": n_batches,
+    }
+
+
+def preview_transactions(path=DATA_PATH, columns=None, n_rows=100):
+    """Premières lignes du parquet, sans lire le reste"""
+    return next(iter_transactions(path, columns, n_rows), pd.DataFrame())
@@ -1,3 +1,5 @@
+import os
+
 import streamlit as st
 import pandas as pd
 import numpy as np
@@ -5,55 +7,249 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import plotly.express as px
 from datetime import datetime
-from io import BytesIO
-import io
 
-@st.cache_data
-def load_data():
+from data_store import DATA_PATH, PAGE_COLUMNS, RENAME_COLUMNS, read_transactions
+from cohort_state import cohort_cells, retention_pivot
+from filters import build_filter_index
+from olap_cube import build_cube
+from products import build_product_cube
+from basket import MIN_SUPPORT, build_basket, mine_pairs, segment_rows
+from segmentation import assign_segments, add_segments
+from registry import register_source, get_dataset, get_derived
+from sketches import DEFAULT_ERROR, EXACT_BY_DEFAULT, distinct_sketches, estimate_by, precision_for_error
+from density import build_density_bins, kde_from_bins
+from clv_engine import customer_clv_table, features_clv_table, segment_aggregates
+from clv_montecarlo import N_BOOTSTRAP, bootstrap_means
+from clv_models import fit_clv_models, rfm_summary, summary_from_daily
+from render_cache import LAZY_EXPORT, cached_export, data_hash, export_png, render
+from profiling import PROFILE, finish_run, profiled, start_run
+from pipeline.customer_features import FEATURES_PATH, customer_features
+from parallel_agg import customer_partitions, map_partitions, merge_disjoint, use_parallel
+from streaming import STREAMING, stream_summary
+
+RFM_PATH = "data/processed/df_rfm_resultat.csv"
+# Colonnes des transactions nécessaires au feature store client
+FEATURE_SOURCE_COLUMNS = ('InvoiceNo', 'Quantity', 'InvoiceDate', 'CustomerID', 'Country', 'TotalPrice')
+# Colonnes lues dans le parquet : union des projections des pages (panier inclus) et du feature store.
+# Les autres colonnes du fichier ne sont jamais chargées.
+TRANSACTION_COLUMNS = tuple(dict.fromkeys(
+    [*PAGE_COLUMNS["overview"], *PAGE_COLUMNS["cohortes"], *FEATURE_SOURCE_COLUMNS]))
+# Mode hors mémoire : les tables dérivées dépendent du résumé par blocs, jamais du frame complet
+TRANSACTIONS_SOURCE = "transactions_summary" if STREAMING else "transactions"
+
+
+def _read_transactions(path):
+    return read_transactions(path, TRANSACTION_COLUMNS)
+
+
+def _read_rfm(path):
+    df = pd.read_csv(path)
+    df['Customer ID'] = df['Customer ID'].astype(int)
+    df['Date_Premier_Achat'] = pd.to_datetime(df['Date_Premier_Achat'])
+    return df
+
+
+register_source("transactions", DATA_PATH, _read_transactions)
+register_source(RFM_PATH, RFM_PATH, _read_rfm)
+register_source(FEATURES_PATH, FEATURES_PATH, pd.read_parquet)
+register_source("transactions_summary", DATA_PATH, stream_summary)
+
+
+@profiled()
+def load_data(columns=None):
+    """Charge les transactions depuis le registre partagé (vue sans copie, projetée sur `columns`).
+    Le registre ne lit que TRANSACTION_COLUMNS : une projection hors de cette liste perd ses colonnes.
+    Les colonnes dérivées (Month, Quarter, Cohort) sont calculées une fois au chargement :
+    un rerun ne copie rien et la mémoire ne grossit pas avec le nombre de sessions."""
     try:
-        df = pd.read_parquet("data/processed/online_retail_clean.parquet")
-       
-        # Renommer les colonnes si nécessaire
-        if 'Customer ID' in df.columns:
-            df = df.rename(columns={'Customer ID': 'CustomerID'})
-        if 'Price' in df.columns:
-            df = df.rename(columns={'Price': 'UnitPrice'})
-        if 'Invoice' in df.columns:
-            df = df.rename(columns={'Invoice': 'InvoiceNo'})
-    
-        
-        # Créer des segments RFM factices si nécessaire
-        if 'RFM_Segment' not in df.columns:
-            df['RFM_Segment'] = 'Aucun segment'
-        
+        df = get_dataset("transactions")
+        if columns is not None:
+            df = df[[c for c in columns if c in df.columns]]
         return df
-        
+
     except Exception as e:
         st.error(f"Erreur lors du chargement des données: {str(e)}")
         return pd.DataFrame()
 
-def compute_avg_purchase_frequency(df):
+
+@profiled()
+def load_stream_summary():
+    """Agrégats du mode hors mémoire (KPIs, cohortes, densité, features, achats par jour).
+    Une lecture du parquet par blocs, refaite seulement si le fichier change."""
+    return get_dataset("transactions_summary")
+
+
+def load_customer_segments():
+    """Segment RFM de chaque client (Series indexée par Customer ID)"""
+    def build():
+        df_rfm = add_rfm_segment(load_rfm())
+        return df_rfm.set_index('Customer ID')['Segment']
+    return get_derived("customer_segments", build, depends_on=(RFM_PATH,))
+
+
+def _features_up_to_date():
+    """Le parquet de features matérialisé par le pipeline est-il plus récent que les transactions ?"""
+    if not os.path.exists(FEATURES_PATH):
+        return False
+    return not os.path.exists(DATA_PATH) or os.path.getmtime(FEATURES_PATH) >= os.path.getmtime(DATA_PATH)
+
+
+@profiled()
+def load_customer_features():
+    """Features par client (achats, factures, CA, retours, panier, ancienneté, mois actifs, cohorte, pays).
+    Lues dans le parquet du pipeline s'il est à jour, sinon calculées une fois sur les transactions."""
+    if _features_up_to_date():
+        return get_dataset(FEATURES_PATH)
+    if STREAMING:
+        return load_stream_summary()["features"]
+
+    def build():
+        # Le feature store travaille sur les noms du parquet propre
+        df = load_data(FEATURE_SOURCE_COLUMNS).rename(columns={v: k for k, v in RENAME_COLUMNS.items()})
+        if use_parallel(len(df)):
+            # Partitions par client : chaque table partielle est déjà complète, il suffit de les recoller
+            return merge_disjoint(map_partitions(customer_features, customer_partitions(df)))
+        return customer_features(df)
+    return get_derived("customer_features", build, depends_on=("transactions",))
+
+
+@profiled()
+def load_filter_index(columns=None):
+    """Index de filtrage partagé (tri par date + bitmaps pays / segments RFM)"""
+    if load_data(columns).empty:
+        return None
+
+    def build():
+        return build_filter_index(load_data(columns), load_customer_segments())
+    return get_derived(("filter_index", columns), build, depends_on=("transactions", RFM_PATH))
+
+
+@profiled()
+def load_overview_cube(columns=None, error=DEFAULT_ERROR):
+    """Cube pré-agrégé des KPIs de la vue d'ensemble (partagé entre sessions)"""
+    def build():
+        filter_index = load_filter_index(columns)
+        return build_cube(filter_index["frame"], load_customer_segments(), precision_for_error(error))
+    return get_derived(("overview_cube", columns, error), build, depends_on=("transactions", RFM_PATH))
+
+
+@profiled()
+def load_product_cube(columns=None):
+    """Quantités / CA par produit (codes StockCode) pré-agrégés sur les dimensions des filtres"""
+    def build():
+        filter_index = load_filter_index(columns)
+        return build_product_cube(filter_index["frame"], load_customer_segments())
+    return get_derived(("product_cube", columns), build, depends_on=("transactions", RFM_PATH))
+
+
+@profiled()
+def load_basket(columns=None):
+    """Matrice creuse factures × produits des ventes (une fois par processus)"""
+    def build():
+        return build_basket(load_data(columns), load_customer_segments())
+    return get_derived(("basket", columns), build, depends_on=("transactions", RFM_PATH))
+
+
+@profiled()
+def load_basket_pairs(columns=None, segment=None, min_support=MIN_SUPPORT):
+    """Paires « achetés ensemble » (support / confiance / lift) de tout le catalogue ou d'un segment RFM"""
+    def build():
+        return mine_pairs(segment_rows(load_basket(columns), segment), min_support)
+    return get_derived(("basket_pairs", columns, segment, min_support), build,
+                       depends_on=("transactions", RFM_PATH))
+
+
+def load_distinct_sketches(columns, column, by, error=DEFAULT_ERROR):
+    """Sketches HyperLogLog de `column` par `by`, calculés une fois par processus"""
+    def build():
+        return distinct_sketches(load_data(columns), column, list(by), error)
+    return get_derived(("distinct_sketches", columns, column, by, error), build, depends_on=("transactions",))
+
+
+@profiled()
+def load_density_bins(columns=None):
+    """Histogrammes de TotalPrice par âge de cohorte, calculés une fois sur toutes les lignes"""
+    if STREAMING:
+        return load_stream_summary()["density_bins"]
+
+    def build():
+        return build_density_bins(load_data(columns))
+    return get_derived(("density_bins", columns), build, depends_on=("transactions",))
+
+
+def load_density_curve(columns, age, bw_adjust=1.0):
+    """Courbe de densité d'un âge de cohorte, mise en cache par (âge, largeur de bande)"""
+    def build():
+        return kde_from_bins(load_density_bins(columns), age, bw_adjust)
+    return get_derived(("density_curve", columns, age, bw_adjust), build, depends_on=(TRANSACTIONS_SOURCE,))
+
+
+@profiled()
+def load_clv_aggregates(segment_col="Segment_RFM"):
+    """Sommes par segment RFM pour le moteur de scénarios CLV (ancienneté au jour près)"""
+    today = pd.Timestamp.today().normalize()
+
+    def build():
+        df_rfm = add_segments(load_rfm(), segment_col=segment_col, priority_col=None)
+        return segment_aggregates(df_rfm, segment_col, today)
+    return get_derived(("clv_aggregates", segment_col, today), build, depends_on=(RFM_PATH,))
+
+
+@profiled()
+def load_clv_bootstrap(segment_col="Segment_RFM", n_bootstrap=N_BOOTSTRAP, seed=0):
+    """Répliques bootstrap (panier, fréquence) par segment, tirées une fois par graine"""
+    def build():
+        df_rfm = add_segments(load_rfm(), segment_col=segment_col, priority_col=None)
+        return bootstrap_means(df_rfm, segment_col, n_bootstrap, seed)
+    return get_derived(("clv_bootstrap", segment_col, n_bootstrap, seed), build, depends_on=(RFM_PATH,))
+
+
+@profiled()
+def load_clv_model():
+    """Résumé (fréquence, récence, T, panier) par client + paramètres BG/NBD / Gamma-Gamma.
+    L'ajustement est relu depuis le disque tant que les transactions ne changent pas."""
+    def build():
+        if STREAMING:
+            summary = summary_from_daily(load_stream_summary()["daily"])
+        else:
+            summary = rfm_summary(load_data(["CustomerID", "InvoiceDate", "TotalPrice"]))
+        return {"summary": summary, "params": fit_clv_models(summary)}
+    return get_derived("clv_model", build, depends_on=(TRANSACTIONS_SOURCE,))
+
+
+def exact_counts_toggle():
+    """Bascule de la sidebar : comptages distincts exacts ou approchés"""
+    return st.sidebar.toggle(
+        "Comptages exacts",
+        value=EXACT_BY_DEFAULT,
+        help="Désactivé : clients / commandes uniques estimés par HyperLogLog (plus rapide).",
+    )
+
+@profiled()
+def compute_customer_table(df):
+    """Table CLV par client (un seul groupby), ou None si les colonnes manquent"""
+    if not {'CustomerID', 'InvoiceDate', 'TotalPrice'}.issubset(df.columns):
+        return None
+    return customer_clv_table(df)
+
+@profiled()
+def load_customer_table():
+    """Table CLV par client sur tout l'historique, lue dans le feature store"""
+    return features_clv_table(load_customer_features())
+
+def compute_avg_purchase_frequency(df, customers=None):
     """Calcule la fréquence moyenne d'achat"""
-    if 'CustomerID' not in df.columns or 'InvoiceDate' not in df.columns:
+    customers = compute_customer_table(df) if customers is None else customers
+    if customers is None or customers.empty:
         return 12  # Valeur par défaut
-    try:
-        df_dates = df.groupby("CustomerID")["InvoiceDate"].agg(["min", "max", "count"])
-        df_dates["active_months"] = ((df_dates["max"] - df_dates["min"]) / np.timedelta64(30, "D")).clip(lower=1)
-        df_dates["freq"] = df_dates["count"] / df_dates["active_months"]
-        return df_dates["freq"].mean()
-    except:
-        return 12  # Valeur par défaut en cas d'erreur
+    return customers["freq"].mean()
 
-def compute_customer_lifespan(df):
+def compute_customer_lifespan(df, customers=None):
     """Calcule la durée de vie moyenne des clients en années"""
-    if 'CustomerID' not in df.columns or 'InvoiceDate' not in df.columns:
+    customers = compute_customer_table(df) if customers is None else customers
+    if customers is None or customers.empty:
         return 3  # Valeur par défaut
-    try:
-        span = df.groupby("CustomerID")["InvoiceDate"].agg(["min", "max"])
-        lifespan_days = (span["max"] - span["min"]).dt.days.clip(lower=1)
-        return lifespan_days.mean() / 365
-    except:
-        return 3  # Valeur par défaut en cas d'erreur
+    return customers["lifespan"].mean()
 
 def calculate_clv(df, r, d, aov, freq, lifespan, marge=30.0):
     """Calcule la CLV avec marge brute"""
@@ -67,15 +263,29 @@ def calculate_clv(df, r, d, aov, freq, lifespan, marge=30.0):
         return 0
     
 #Calcul de la tables des pivots pour afficher la heatmap
-@st.cache_data
-def compute_cohort_matrix(df):
-    cohort_counts = df.groupby(['Cohort', 'CohortIndex'])['CustomerID'].nunique()
-    cohort_counts_df = cohort_counts.to_frame().rename(columns={'CustomerID' : 'Total Customers'}).sort_values(by='Total Customers', ascending=False)
-    cohort_counts_df['retention_rate'] = cohort_counts_df['Total Customers'] / cohort_counts_df.groupby(['Cohort'])['Total Customers'].transform('max')
-    cohorts_pivot = cohort_counts_df.pivot_table(index='Cohort', columns='CohortIndex', values='retention_rate') 
-    return cohorts_pivot
-
-def plot_retention_heatmap(cohorts_pivot):
+@profiled()
+def compute_cohort_matrix(df, exact=True, error=DEFAULT_ERROR):
+    if not exact:
+        # Effectifs estimés par HyperLogLog sur chaque cellule (cohorte, mois)
+        sketches = distinct_sketches(df, 'CustomerID', ['Cohort', 'CohortIndex'], error)
+        counts = estimate_by(sketches["table"], ['Cohort', 'CohortIndex'], sketches["precision"]).round()
+        return retention_pivot(counts)
+    # Effectifs tenus par cellule (cohorte, mois) : le pivot se déduit des cellules, pas des lignes
+    return retention_pivot(cohort_cells(df))
+
+
+@profiled()
+def load_cohort_matrix(columns, exact=True, error=DEFAULT_ERROR):
+    """Pivot de rétention partagé entre sessions.
+    Remplace st.cache_data, qui hachait tout le frame en argument et recopiait le résultat à chaque rerun."""
+    def build():
+        if STREAMING:
+            # Cellules cumulées bloc par bloc : effectifs exacts, sans estimation
+            return retention_pivot(load_stream_summary()["cohort_cells"])
+        return compute_cohort_matrix(load_data(columns), exact, error)
+    return get_derived(("cohort_matrix", columns, exact, error), build, depends_on=(TRANSACTIONS_SOURCE,))
+
+def _retention_heatmap_figure(cohorts_pivot):
     fig, ax = plt.subplots(figsize=(20, 10))
 
     with plt.style.context('dark_background'):
@@ -98,9 +308,17 @@ def plot_retention_heatmap(cohorts_pivot):
         cbar = ax.collections[0].colorbar
         cbar.ax.tick_params(colors='white')
 
-    st.pyplot(fig, transparent=True, use_container_width=True)
+    return fig
+
 
-    add_download_button(fig, filename="heatmap_retention.png")
+@profiled()
+def plot_retention_heatmap(cohorts_pivot):
+    show_figure(
+        "heatmap_retention",
+        lambda: _retention_heatmap_figure(cohorts_pivot),
+        data_hash(cohorts_pivot),
+        filename="heatmap_retention.png",
+    )
 
     with st.expander("où investir, où réduire les dépenses", expanded=False):
         col1, col2 = st.columns(2)
@@ -122,14 +340,42 @@ def plot_retention_heatmap(cohorts_pivot):
                 """
             )
 
+def _density_figure(grid, ages, curves):
+    colors = sns.color_palette('viridis', len(ages))
+    fig, ax = plt.subplots(figsize=(10, 6))
+
+    with plt.style.context('dark_background'):
+        fig.patch.set_alpha(0.0)
+        ax.patch.set_alpha(0.0)
+
+        for age, curve, color in zip(ages, curves, colors):
+            ax.fill_between(grid, curve, color=color, alpha=0.3, linewidth=0)
+            ax.plot(grid, curve, color=color, linewidth=1.5, label=str(age))
+
+        ax.legend(title='CohortIndex', frameon=False)
+        ax.set_xlim(grid[0], grid[-1])
+        ax.set_ylim(bottom=0)
+        ax.set_title('courbes de densité de CA par age de cohorte', fontsize=16, color='white')
+        ax.set_xlabel('Total du CA', fontsize=14)
+        ax.set_ylabel('Densité', fontsize=14)
+        ax.tick_params(colors='white')
+        ax.xaxis.label.set_color('white')
+        ax.yaxis.label.set_color('white')
+        if ax.legend_:
+            plt.setp(ax.get_legend().get_texts(), color='white')
+            ax.get_legend().get_title().set_color('white')
+
+    return fig
+
+
 # Ce graphe sert à analyser le panier type des clients en fonction de leur âge de cohorte 
 # on pourra observer qu'un client ancien a un panier moyen plus élevé qu'un clien récent
-def densite(df):
+@profiled()
+def densite(columns=None):
     st.subheader("Analyse de la densité")
-    
-    subset = subset = df[(df['TotalPrice'] > 0) & (df['TotalPrice'] < 75)]
 
-    all_ages = sorted(subset['CohortIndex'].unique()) #on recupère tous les âges de cohortes (0 à 24)
+    bins = load_density_bins(columns)
+    all_ages = list(bins["ages"]) #on recupère tous les âges de cohortes (0 à 24)
 
     with st.expander("🔽 Filtres", expanded=True):
         selected_cohorts = st.multiselect(
@@ -137,46 +383,26 @@ def densite(df):
             options=all_ages,
             default=all_ages[:5] # On en limite 5 par défaut pour la lisibilité
         )
+        bw_adjust = st.select_slider(
+            "Lissage (largeur de bande)",
+            options=[0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0],
+            value=1.0,
+        )
 
     if not selected_cohorts:
         st.warning("Sélectionnez au moins un âge.")
         return
-    
-    plot_data = subset[subset['CohortIndex'].isin(selected_cohorts)]
-
-    if len(plot_data) > 10000:
-        plot_data = plot_data.sample(n=10000, random_state=42)
-
-    fig, ax = plt.subplots(figsize=(10, 6))
 
-    with plt.style.context('dark_background'):
-        fig.patch.set_alpha(0.0)
-        ax.patch.set_alpha(0.0)
+    # KDE sur 100 % des lignes : histogramme par âge + convolution FFT (plus d'échantillon)
+    ages = sorted(selected_cohorts)
+    curves = [load_density_curve(columns, age, bw_adjust) for age in ages]
 
-        sns.kdeplot(
-            data=plot_data,
-            x='TotalPrice',    
-            hue='CohortIndex',   
-            fill=True,         
-            common_norm=False,  
-            palette='viridis',
-            alpha=0.3,
-            linewidth=1.5,
-            ax=ax,
-            warn_singular=False
-        ) 
-        ax.set_title('courbes de densité de CA par age de cohorte', fontsize=16, color='white')
-        ax.set_xlabel('Total du CA', fontsize=14)
-        ax.set_ylabel('Densité', fontsize=14)
-        ax.tick_params(colors='white')
-        ax.xaxis.label.set_color('white')
-        ax.yaxis.label.set_color('white')
-        if ax.legend_:
-            plt.setp(ax.get_legend().get_texts(), color='white')
-
-    st.pyplot(fig, transparent=True, use_container_width=True)
-
-    add_download_button(fig, filename="densite_ca_par_age.png")
+    show_figure(
+        "densite_ca_par_age",
+        lambda: _density_figure(bins["grid"], ages, curves),
+        data_hash(bins["grid"], ages, curves),
+        filename="densite_ca_par_age.png",
+    )
 
     with st.expander("Interprétation", expanded=False):
         col1, col2 = st.columns(2)
@@ -211,6 +437,7 @@ def densite(df):
                 """
             )
 
+@profiled()
 def plot_retention_curves(cohorts_pivot):
     st.subheader("📉 Courbes de Rétention par Cohorte")
     
@@ -228,6 +455,7 @@ def plot_retention_curves(cohorts_pivot):
     fig.update_layout(yaxis_tickformat=".0%") # Axe Y en %
     st.plotly_chart(fig, use_container_width=True)
 
+@profiled()
 def plot_average_retention(cohorts_pivot):
     st.subheader("⚖️ Rétention Moyenne Globale")
     
@@ -252,47 +480,31 @@ def plot_average_retention(cohorts_pivot):
 # ============================
 # 📌 CHARGEMENT DES DONNÉES
 # ============================
-def load_rfm(path="data/processed/df_rfm_resultat.csv"):
-    df = pd.read_csv(path)
-    df['Customer ID'] = df['Customer ID'].astype(int)
-    df['Date_Premier_Achat'] = pd.to_datetime(df['Date_Premier_Achat'])
-    return df
+@profiled()
+def load_rfm(path=RFM_PATH):
+    # Servie par le registre : lue une fois par processus, relue si le fichier change
+    register_source(path, path, _read_rfm)
+    return get_dataset(path)
 
 
 # ============================
 # 📌 SEGMENTATION RFM
 # ============================
 def assign_segment(score):
-    if score >= 400:
-        return "Champions"
-    elif 300 <= score <= 399:
-        return "Fidèles"
-    elif 200 <= score <= 299:
-        return "Potentiels"
-    elif 120 <= score <= 199:
-        return "À Risque"
-    else:
-        return "Perdus"
+    return str(assign_segments([score])[0])
 
 
 def add_rfm_segment(df):
-    df['Segment'] = df['RFM_Pourcentage'].apply(assign_segment)
-    priority_mapping = {
-        "Champions": 1,
-        "Fidèles": 2,
-        "Potentiels": 3,
-        "À Risque": 4,
-        "Perdus": 5
-    }
-    df['Priorite'] = df['Segment'].map(priority_mapping)
-    return df
+    # Segments et priorités posés en une passe vectorisée (table SEGMENT_THRESHOLDS)
+    return add_segments(df, score_col='RFM_Pourcentage', segment_col='Segment', priority_col='Priorite')
 
 
 # ============================
 # 📌 AGRÉGATS PAR SEGMENT
 # ============================
+@profiled()
 def compute_segment_table(df, taux_marge):
-    seg = df.groupby(['Segment', 'Priorite'], as_index=False).agg(
+    seg = df.groupby(['Segment', 'Priorite'], as_index=False, observed=True).agg(
         Volume_clients=('Customer ID', 'nunique'),
         CA=('Monetaire_Total_Depense', 'sum'),
         Panier_moyen=('Monetaire_Total_Depense', 'mean')
@@ -301,6 +513,7 @@ def compute_segment_table(df, taux_marge):
     return seg.sort_values('Priorite')
 
 
+@profiled()
 def format_segment_table(seg, df):
     display_df = seg[['Segment', 'Volume_clients', 'CA', 'Marge', 'Panier_moyen', 'Priorite']].copy()
 
@@ -383,24 +596,67 @@ def plot_scenario_chart(ca_base, ca_incremental):
     return fig
 
 
-def export_figure_png(fig):
-    buffer = BytesIO()
-    fig.savefig(buffer, format="png", bbox_inches="tight")
-    buffer.seek(0)
-    return buffer
+@profiled()
+def show_figure(name, builder, data_key, style=(), filename="graphique.png", transparent=True, lazy=None):
+    """Affiche une figure matplotlib depuis le cache de rendu + son bouton de téléchargement.
+    La figure n'est reconstruite que si data_key (empreinte des données) ou style changent."""
+    key, png = render(name, builder, data_key, style, transparent)
+    st.image(png, use_container_width=True)
+    add_download_button(key, builder, filename=filename, lazy=lazy, transparent=transparent)
+
+
+@profiled()
+def add_download_button(render_key, builder, filename="graphique.png", lazy=None, transparent=True):
+    """Ajoute un bouton de téléchargement PNG haute définition (dpi=300) pour une figure du cache.
+    En mode paresseux, le PNG n'est rasterisé qu'au clic sur « Préparer » (via le builder du rerun)."""
+    if lazy is None:
+        lazy = LAZY_EXPORT
+
+    data = cached_export(render_key)
+    if data is None:
+        if lazy and not st.button("🖼️ Préparer le PNG haute définition", key=f"prepare_{filename}"):
+            return
+        data = export_png(render_key, builder, transparent=transparent)
 
-def add_download_button(fig, filename="graphique.png"):
-    """Ajoute un bouton de téléchargement pour une figure Matplotlib"""
-    # 1. Sauvegarder l'image dans un buffer (mémoire vive)
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png", bbox_inches='tight', dpi=300, transparent=True)
-    buf.seek(0)
-    
-    # 2. Créer le bouton Streamlit
     st.download_button(
         label="📸 Télécharger ce graphique (PNG)",
-        data=buf,
+        data=data,
         file_name=filename,
         mime="image/png",
         key=filename # Clé unique importante si plusieurs boutons sur la page
-    )
\ No newline at end of file
+    )
+
+
+# ============================
+# 📌 PROFILAGE DES RERUNS
+# ============================
+def debug_mode():
+    """Panneau de profilage : ?debug=1 dans l'URL ou RETAIL_PROFILE=1"""
+    return PROFILE or st.query_params.get("debug") == "1"
+
+
+def begin_profile(page):
+    """Début du rerun d'une page : les étapes décorées (@profiled) et les blocs stage() sont mesurés"""
+    return start_run(page, enabled=debug_mode())
+
+
+def end_profile():
+    """Fin du rerun : journalise les étapes et affiche le panneau de profilage"""
+    run = finish_run()
+    if run is None:
+        return
+    events = pd.DataFrame(run["events"])
+    with st.expander(f"🛠️ Profilage du rerun ({run['seconds'] * 1000:,.0f} ms)", expanded=False):
+        if events.empty:
+            st.write("Aucune étape mesurée.")
+            return
+        table = pd.DataFrame({
+            "Étape": [" " * d + s for d, s in zip(events["depth"], events["stage"])],
+            "Temps (ms)": (events["seconds"] * 1000).round(1),
+            "Δ mémoire (Mo)": events["memory_mb"].astype(float).round(2),
+            "Registre hit/miss": events["registry_hits"].astype(str) + " / " + events["registry_misses"].astype(str),
+            "Rendu hit/miss": events["render_hits"].astype(str) + " / " + events["render_misses"].astype(str),
+        })
+        st.dataframe(table, hide_index=True, use_container_width=True)
+        if "peak_mb" in run:
+            st.caption(f"Pic mémoire Python du rerun : {run['peak_mb']:,.1f} Mo — rerun {run['run']}")
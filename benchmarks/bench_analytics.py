@@ -0,0 +1,235 @@
+"""Benchmarks des fonctions d'analyse du dashboard, sans lancer Streamlit.
+
+    python benchmarks/bench_analytics.py --rows 100000 1000000
+    python benchmarks/bench_analytics.py --rows 1000000 --save-baseline
+    python benchmarks/bench_analytics.py --rows 1000000 --baseline benchmarks/baseline.json
+    python benchmarks/bench_analytics.py --rows 10000000 --workers 1 2 4 --only-parallel
+
+Chaque fonction est jouée une fois sous tracemalloc (pic mémoire), puis chronométrée
+(meilleur de --repeat passages). Les résultats sont écrits en JSON ; avec --baseline,
+toute fonction plus lente que la référence au-delà de --tolerance est signalée (code retour 1).
+Avec --workers, les agrégations partitionnées sont aussi jouées pour chaque nombre de processus
+(même découpage en partitions que le dashboard), avec l'accélération par rapport à 1 processus.
+"""
+import argparse
+import datetime
+import json
+import os
+import pickle
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "app"))
+
+from data_store import read_transactions  # noqa: E402
+from filters import build_filter_index, apply_filters  # noqa: E402
+from olap_cube import build_cube, query_overview  # noqa: E402
+from products import build_product_cube, query_products, product_leaderboards  # noqa: E402
+from basket import build_basket, mine_pairs  # noqa: E402
+from cohort_state import cohort_cells  # noqa: E402
+from clv_engine import customer_clv_table  # noqa: E402
+from olap_cube import overview_from_rows  # noqa: E402
+from parallel_agg import customer_partitions, map_partitions, merge_disjoint, month_partitions, set_workers  # noqa: E402
+from pipeline.customer_features import customer_features  # noqa: E402
+from pipeline.synthetic import write_synthetic  # noqa: E402
+from utils import (  # noqa: E402
+    compute_cohort_matrix,
+    compute_avg_purchase_frequency,
+    compute_customer_lifespan,
+    add_rfm_segment,
+    compute_segment_table,
+    format_segment_table,
+)
+
+RESULTS_PATH = os.path.join(ROOT, "benchmarks", "results", "latest.json")
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline.json")
+# En dessous de cet écart absolu, une différence de temps est du bruit
+NOISE_FLOOR = 0.005
+
+
+# ============================
+# 📌 DONNÉES SYNTHÉTIQUES
+# ============================
+def prepare_dataset(n_rows, workdir, seed=0):
+    """Parquet propre + table RFM segmentée, écrits par le générateur synthétique du pipeline"""
+    path = os.path.join(workdir, f"transactions_{n_rows}.parquet")
+    rfm_path = os.path.join(workdir, f"rfm_{n_rows}.csv")
+    write_synthetic(n_rows, path, seed=seed, single_file=True, rfm_path=rfm_path)
+    return path, add_rfm_segment(pd.read_csv(rfm_path))
+
+
+# ============================
+# 📌 MESURES
+# ============================
+def measure(func, repeat):
+    """Meilleur temps sur `repeat` passages + pic mémoire (tracemalloc) d'un passage.
+    Le passage tracé sert aussi d'échauffement (imports paresseux, caches de pandas)."""
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {"seconds": min(times), "median_seconds": float(np.median(times)), "peak_mb": peak / 1024 ** 2}
+
+
+def benchmarks(path, df_rfm):
+    """(nom, fonction) de chaque étape chronométrée, dans l'ordre d'une session du dashboard"""
+    df = read_transactions(path)
+    segments = df_rfm.set_index("Customer ID")["Segment"]
+    index = build_filter_index(df, segments)
+    cube = build_cube(index["frame"], segments)
+    product_cube = build_product_cube(index["frame"], segments)
+    basket = build_basket(df, segments)
+    seg = compute_segment_table(df_rfm, 0.3)
+    end = df["InvoiceDate"].max().date()
+    start = (df["InvoiceDate"].max() - pd.DateOffset(months=6)).date()
+
+    return [
+        ("load_data", lambda: read_transactions(path)),
+        ("compute_cohort_matrix", lambda: compute_cohort_matrix(df)),
+        ("compute_cohort_matrix_approx", lambda: compute_cohort_matrix(df, exact=False)),
+        ("compute_avg_purchase_frequency", lambda: compute_avg_purchase_frequency(df)),
+        ("compute_customer_lifespan", lambda: compute_customer_lifespan(df)),
+        ("compute_segment_table", lambda: compute_segment_table(df_rfm, 0.3)),
+        ("format_segment_table", lambda: format_segment_table(seg, df_rfm)),
+        ("build_filter_index", lambda: build_filter_index(df, segments)),
+        ("filter_chain", lambda: apply_filters(index, start, end, "United Kingdom", 0.0, "Exclure")),
+        ("build_cube", lambda: build_cube(index["frame"], segments)),
+        ("query_overview", lambda: query_overview(cube, start, end, "United Kingdom", 0.0, "Exclure")),
+        ("build_product_cube", lambda: build_product_cube(index["frame"], segments)),
+        ("top_products", lambda: product_leaderboards(
+            product_cube, query_products(product_cube, start, end, "United Kingdom", 0.0, "Exclure"))),
+        ("build_basket", lambda: build_basket(df, segments)),
+        ("mine_pairs", lambda: mine_pairs(basket["matrix"])),
+    ]
+
+
+def parallel_benchmarks(path, df_rfm, n_workers):
+    """Agrégations partitionnées avec n_workers processus (1 = une seule partition, en série)"""
+    set_workers(n_workers)
+    parallel = n_workers > 1
+    if parallel:
+        # Pool démarré avant le passage sous tracemalloc : des processus forkés pendant le traçage le garderaient
+        map_partitions(int, [0] * n_workers)
+    df = read_transactions(path)
+    segments = df_rfm.set_index("Customer ID")["Segment"]
+    frame = build_filter_index(df, segments)["frame"]
+    # Le feature store travaille sur les noms du parquet propre
+    features_df = df[["InvoiceNo", "Quantity", "InvoiceDate", "CustomerID", "Country", "TotalPrice"]].rename(
+        columns={"InvoiceNo": "Invoice", "CustomerID": "Customer ID"})
+
+    return [
+        ("build_cube", lambda: build_cube(frame, segments, parallel=parallel)),
+        ("build_product_cube", lambda: build_product_cube(frame, segments, parallel=parallel)),
+        ("overview_from_rows", lambda: overview_from_rows(frame, parallel=parallel)),
+        ("cohort_cells", lambda: cohort_cells(df, parallel=parallel)),
+        ("customer_clv_table", lambda: customer_clv_table(df, parallel=parallel)),
+        ("customer_features", lambda: merge_disjoint(
+            map_partitions(customer_features, customer_partitions(features_df), parallel))),
+        # Coût d'envoi des partitions aux processus (sérialisation seule)
+        ("pickle_partitions", lambda: [pickle.dumps(p, protocol=pickle.HIGHEST_PROTOCOL)
+                                       for p in month_partitions(frame)]),
+    ]
+
+
+def run(rows, repeat, seed=0, workers=None, only_parallel=False):
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for n_rows in rows:
+            path, df_rfm = prepare_dataset(n_rows, workdir, seed)
+            for name, func in ([] if only_parallel else benchmarks(path, df_rfm)):
+                result = dict(name=name, rows=n_rows, **measure(func, repeat))
+                results.append(result)
+                print(f"{n_rows:>11,} {name:<32} {result['seconds']:9.4f} s {result['peak_mb']:9.1f} Mo")
+
+            serial = {}
+            for n_workers in workers or []:
+                for name, func in parallel_benchmarks(path, df_rfm, n_workers):
+                    result = dict(name=f"{name}[workers={n_workers}]", rows=n_rows, workers=n_workers,
+                                  **measure(func, repeat))
+                    serial.setdefault(name, result["seconds"])
+                    result["speedup"] = serial[name] / result["seconds"]
+                    results.append(result)
+                    print(f"{n_rows:>11,} {result['name']:<32} {result['seconds']:9.4f} s "
+                          f"{result['peak_mb']:9.1f} Mo  x{result['speedup']:.2f}")
+    return results
+
+
+# ============================
+# 📌 COMPARAISON À LA RÉFÉRENCE
+# ============================
+def compare(results, baseline, tolerance):
+    """Lignes plus lentes que la référence (au-delà de la tolérance et du bruit)"""
+    reference = {(r["name"], r["rows"]): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        ref = reference.get((result["name"], result["rows"]))
+        if ref is None:
+            continue
+        slower = result["seconds"] - ref["seconds"]
+        if slower > NOISE_FLOOR and result["seconds"] > ref["seconds"] * (1 + tolerance):
+            regressions.append(dict(result, baseline_seconds=ref["seconds"],
+                                    ratio=result["seconds"] / ref["seconds"]))
+    return regressions
+
+
+def write_results(results, path):
+    payload = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks des fonctions d'analyse")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000],
+                        help="Tailles des jeux synthétiques (ex. 100000 1000000 10000000)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=RESULTS_PATH)
+    parser.add_argument("--baseline", help="Fichier de référence à comparer")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Ralentissement toléré (0.25 = +25 %%)")
+    parser.add_argument("--workers", type=int, nargs="+",
+                        help="Nombres de processus à comparer sur les agrégations partitionnées (ex. 1 2 4)")
+    parser.add_argument("--only-parallel", action="store_true", help="Ne joue que les cas --workers")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Écrit aussi les résultats dans {BASELINE_PATH}")
+    args = parser.parse_args(argv)
+
+    results = run(args.rows, args.repeat, args.seed, args.workers, args.only_parallel)
+    write_results(results, args.out)
+    if args.save_baseline:
+        write_results(results, BASELINE_PATH)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for r in regressions:
+            print(f"RÉGRESSION {r['name']} ({r['rows']:,} lignes) : "
+                  f"{r['baseline_seconds']:.4f} s -> {r['seconds']:.4f} s (x{r['ratio']:.2f})")
+        if regressions:
+            return 1
+        print("Aucune régression par rapport à la référence.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
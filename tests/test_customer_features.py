@@ -0,0 +1,75 @@
+"""Feature store client : l'état incrémental doit redonner la table d'un calcul complet."""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "app"))
+
+from pipeline.customer_features import (  # noqa: E402
+    customer_features,
+    empty_features_state,
+    features_table,
+    fold_customer_features,
+    load_features_state,
+    save_features_state,
+)
+from pipeline.etl import month_ordinals  # noqa: E402
+from pipeline.synthetic import generate_transactions  # noqa: E402
+
+N_ROWS = 30_000
+N_BATCHES = 5
+
+
+@pytest.fixture(scope="module")
+def transactions():
+    return pd.concat(list(generate_transactions(N_ROWS, seed=0)), ignore_index=True)
+
+
+def _shuffled_batches(df, n_batches, seed=0):
+    """Lots de lignes tirées au hasard, dans le désordre : factures coupées et historique en retard"""
+    rows = np.random.default_rng(seed).permutation(len(df))
+    return [df.iloc[np.sort(part)] for part in np.array_split(rows, n_batches)]
+
+
+def test_full_fold_matches_groupby(transactions):
+    features = customer_features(transactions)
+    grouped = transactions.groupby(transactions['Customer ID'].astype('int64'))
+
+    assert features.index.tolist() == sorted(grouped.groups)
+    assert (features['invoices'] == grouped['Invoice'].nunique()).all()
+    assert (features['lines'] == grouped.size()).all()
+    assert (features['first'] == grouped['InvoiceDate'].min()).all()
+    assert (features['last'] == grouped['InvoiceDate'].max()).all()
+    assert np.allclose(features['revenue'], grouped['TotalPrice'].sum())
+    months = pd.Series(month_ordinals(transactions['InvoiceDate']), index=transactions.index)
+    assert (features['active_months'] == months.groupby(transactions['Customer ID'].astype('int64')).nunique()).all()
+
+
+def test_incremental_matches_full_rebuild(transactions, tmp_path):
+    state_dir = str(tmp_path / "state")
+    save_features_state(empty_features_state(), state_dir, reset=True)
+    for batch in _shuffled_batches(transactions, N_BATCHES):
+        # Rechargé depuis le disque à chaque lot, comme la commande features-update
+        state = fold_customer_features(load_features_state(state_dir), batch)
+        save_features_state(state, state_dir)
+
+    pd.testing.assert_frame_equal(features_table(load_features_state(state_dir)), customer_features(transactions))
+
+
+def test_replayed_batch_refused(transactions, tmp_path):
+    batch = _shuffled_batches(transactions, N_BATCHES)[0]
+    state = fold_customer_features(empty_features_state(), batch)
+    before = features_table(state)
+    with pytest.raises(ValueError):
+        fold_customer_features(state, batch)
+    pd.testing.assert_frame_equal(features_table(state), before)
+
+    # L'empreinte du lot survit à la sauvegarde
+    state_dir = str(tmp_path / "state")
+    save_features_state(state, state_dir, reset=True)
+    with pytest.raises(ValueError):
+        fold_customer_features(load_features_state(state_dir), batch.copy())
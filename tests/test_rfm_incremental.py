@@ -0,0 +1,44 @@
+"""RFM incrémental : l'état partagé du feature store doit redonner la table RFM d'un recalcul complet."""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "app"))
+
+from pipeline.etl import RFM_COLUMNS, compute_rfm, score_rfm  # noqa: E402
+from pipeline.rfm_incremental import update_rfm  # noqa: E402
+from pipeline.synthetic import generate_transactions  # noqa: E402
+
+N_ROWS = 30_000
+N_BATCHES = 4
+
+
+@pytest.fixture(scope="module")
+def transactions():
+    return pd.concat(list(generate_transactions(N_ROWS, seed=1)), ignore_index=True)
+
+
+def test_update_rfm_matches_full_rebuild(transactions, tmp_path):
+    expected = score_rfm(compute_rfm(transactions))[RFM_COLUMNS]
+
+    # Lots de lignes au hasard, dans le désordre : factures à cheval sur deux lots, clients vus en retard
+    rows = np.random.default_rng(0).permutation(len(transactions))
+    state_dir = str(tmp_path / "state")
+    rfm_path = str(tmp_path / "rfm.csv")
+    for part in np.array_split(rows, N_BATCHES):
+        df_rfm = update_rfm(transactions.iloc[np.sort(part)], state_dir, rfm_path, features_path=None)
+
+    pd.testing.assert_frame_equal(df_rfm, expected)
+    assert len(pd.read_csv(rfm_path)) == len(expected)
+
+
+def test_update_rfm_refuses_replayed_batch(transactions, tmp_path):
+    state_dir = str(tmp_path / "state")
+    batch = transactions.iloc[:5_000]
+    update_rfm(batch, state_dir, features_path=None)
+    with pytest.raises(ValueError):
+        update_rfm(batch, state_dir, features_path=None)
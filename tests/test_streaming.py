@@ -0,0 +1,79 @@
+"""Mode hors mémoire : le résumé lu par blocs doit égaler les calculs sur le frame complet."""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "app"))
+
+from clv_models import daily_purchases  # noqa: E402
+from cohort_state import cohort_cells  # noqa: E402
+from data_store import RENAME_COLUMNS, read_transactions  # noqa: E402
+from density import build_density_bins  # noqa: E402
+from olap_cube import overview_from_rows  # noqa: E402
+from pipeline.customer_features import customer_features  # noqa: E402
+from pipeline.synthetic import write_synthetic  # noqa: E402
+from streaming import stream_summary  # noqa: E402
+
+N_ROWS = 30_000
+# Plusieurs blocs, qui coupent des factures et des mois
+BATCH_ROWS = 4_000
+
+
+@pytest.fixture(scope="module")
+def parquet_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("data") / "transactions.parquet")
+    write_synthetic(N_ROWS, path, seed=3, single_file=True)
+    return path
+
+
+@pytest.fixture(scope="module")
+def summary(parquet_path):
+    return stream_summary(parquet_path, BATCH_ROWS)
+
+
+@pytest.fixture(scope="module")
+def transactions(parquet_path):
+    return read_transactions(parquet_path)
+
+
+def test_summary_reads_several_batches(summary, transactions):
+    # Les blocs s'arrêtent aussi aux row groups du parquet : au moins un bloc par BATCH_ROWS lignes
+    assert summary["batches"] >= len(transactions) // BATCH_ROWS > 1
+
+
+def test_overview_matches_in_memory(summary, transactions):
+    overview = summary["overview"]
+    expected = overview_from_rows(transactions, parallel=False)
+
+    assert overview["n_tx"] == expected["n_tx"]
+    assert overview["n_customers"] == expected["n_customers"]
+    assert overview["total_revenue"] == pytest.approx(expected["total_revenue"])
+    assert overview["north_star"] == pytest.approx(expected["north_star"])
+    assert summary["n_invoices"] == transactions["InvoiceNo"].nunique()
+    pd.testing.assert_series_equal(overview["revenue_by_month"], expected["revenue_by_month"],
+                                   check_names=False, check_index_type=False)
+    pd.testing.assert_series_equal(overview["revenue_by_quarter"], expected["revenue_by_quarter"],
+                                   check_names=False, check_index_type=False)
+
+
+def test_cohorts_and_features_match_in_memory(summary, transactions):
+    pd.testing.assert_series_equal(summary["cohort_cells"].sort_index(),
+                                   cohort_cells(transactions, parallel=False).sort_index(),
+                                   check_names=False, check_dtype=False, check_index_type=False)
+
+    pipeline_names = {v: k for k, v in RENAME_COLUMNS.items()}
+    pd.testing.assert_frame_equal(summary["features"], customer_features(transactions.rename(columns=pipeline_names)))
+
+
+def test_density_and_daily_match_in_memory(summary, transactions):
+    bins = build_density_bins(transactions)
+    for key in ("ages", "counts", "n"):
+        assert np.array_equal(summary["density_bins"][key], bins[key])
+    assert np.allclose(summary["density_bins"]["sum"], bins["sum"])
+
+    daily = daily_purchases(transactions)
+    pd.testing.assert_series_equal(summary["daily"], daily, check_names=False, check_index_type=False)